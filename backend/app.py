@@ -16,6 +16,9 @@ from routes.dashboard_routes import dashboard_bp
 
 # Importar database
 from models.database import init_db
+from models.migrations import versao_do_banco, versao_mais_recente
+from cli import db_cli
+from utils.sql_instrumentation import registrar_instrumentacao
 
 # Criar aplicação Flask
 app = Flask(__name__)
@@ -29,10 +32,14 @@ CORS(app, resources={
     r"/api/*": {
         "origins": ["*"],
         "methods": ["GET", "POST", "PUT", "DELETE", "OPTIONS"],
-        "allow_headers": ["Content-Type", "Authorization"]
+        "allow_headers": ["Content-Type", "Authorization"],
+        "expose_headers": ["X-Proximo-Cursor"]
     }
 })
 
+# Métricas SQL por requisição (header Server-Timing e log de queries lentas)
+registrar_instrumentacao(app)
+
 # Registrar blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(ingredientes_bp, url_prefix='/api/ingredientes')
@@ -41,6 +48,9 @@ app.register_blueprint(inventario_bp, url_prefix='/api/inventario')
 app.register_blueprint(cardapio_bp, url_prefix='/api/cardapio')
 app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
 
+# Registrar comandos de linha de comando (flask db upgrade)
+app.cli.add_command(db_cli)
+
 # Rota raiz
 @app.route('/')
 def index():
@@ -71,12 +81,16 @@ def not_found(error):
 def internal_error(error):
     return jsonify({'error': 'Erro interno do servidor'}), 500
 
-# Inicializar banco de dados
-with app.app_context():
-    init_db()
-    print("✓ Banco de dados inicializado")
+# Verificar versão do schema (as migrações rodam via `flask db upgrade` no deploy)
+versao_banco = versao_do_banco()
+if versao_banco < versao_mais_recente():
+    print(f"⚠ Schema do banco na versão {versao_banco}, esperado {versao_mais_recente()}. "
+          f"Execute `flask db upgrade`.")
 
 if __name__ == '__main__':
+    # Em desenvolvimento, aplicar migrações pendentes automaticamente
+    init_db()
+    
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('DEBUG', 'False').lower() == 'true'
     
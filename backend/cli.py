@@ -0,0 +1,105 @@
+import click
+from flask.cli import AppGroup
+from models.database import get_db, iniciar_transacao_exclusiva
+from models.rollups import reconstruir_rollups
+from models.estoque_historico import registrar_snapshots
+from models.alertas_estoque import reconstruir_alertas
+from models.estoque import conferir_livro
+from models.busca import reconstruir_indices_busca
+from models.custos import CUSTO_FIFO, reconstruir_camadas
+from models.previsao_consumo import previsao_disponivel, recalcular_previsoes
+from models.migrations import aplicar_migracoes, migracoes_pendentes, versao_do_banco, versao_mais_recente
+
+db_cli = AppGroup('db', help='Comandos de manutenção do banco de dados')
+
+
+@db_cli.command('upgrade')
+@click.option('--versao', type=int, default=None, help='Migrar apenas até esta versão')
+def db_upgrade(versao):
+    """Aplica as migrações pendentes (executar uma vez por deploy)"""
+    aplicadas = aplicar_migracoes(ate_versao=versao)
+    if aplicadas:
+        click.echo(f"✓ {len(aplicadas)} migrações aplicadas (versão {aplicadas[-1][0]})")
+    else:
+        click.echo(f"✓ Banco de dados já está na versão {versao_do_banco()}")
+
+
+@db_cli.command('status')
+def db_status():
+    """Mostra a versão do schema e as migrações pendentes"""
+    click.echo(f"Versão do banco: {versao_do_banco()}")
+    click.echo(f"Versão do código: {versao_mais_recente()}")
+    for versao, descricao in migracoes_pendentes():
+        click.echo(f"  pendente {versao:03d}: {descricao}")
+
+
+@db_cli.command('rebuild-rollups')
+def db_rebuild_rollups():
+    """Recalcula as tabelas de rollup de vendas a partir da tabela vendas"""
+    with get_db() as conn:
+        cursor = conn.cursor()
+        reconstruir_rollups(cursor)
+        cursor.execute('SELECT COUNT(*) AS total FROM vendas_diarias_prato')
+        total = cursor.fetchone()['total']
+    click.echo(f"✓ Rollups reconstruídos ({total} linhas dia × prato)")
+
+
+@db_cli.command('rebuild-forecasts')
+def db_rebuild_forecasts():
+    """Reajusta os modelos de previsão de consumo (agendar diariamente)"""
+    if not previsao_disponivel():
+        raise click.ClickException('numpy não instalado')
+    with get_db() as conn:
+        total = recalcular_previsoes(conn.cursor())
+    click.echo(f"✓ Previsões recalculadas ({total} ingredientes)")
+
+
+@db_cli.command('snapshot-stock')
+def db_snapshot_stock():
+    """Grava o estoque de fechamento dos dias pendentes (agendar diariamente)"""
+    with get_db(serializar=False) as conn:
+        # Livro e estoque lidos na mesma transação, sem escritas no meio
+        iniciar_transacao_exclusiva(conn)
+        dias = registrar_snapshots(conn.cursor())
+    click.echo(f"✓ Snapshots de estoque gravados ({dias} dias)")
+
+
+@db_cli.command('rebuild-alerts')
+def db_rebuild_alerts():
+    """Sincroniza os alertas de estoque baixo com o estoque atual"""
+    with get_db() as conn:
+        abertos = reconstruir_alertas(conn.cursor())
+    click.echo(f"✓ Alertas de estoque sincronizados ({abertos} abertos)")
+
+
+@db_cli.command('rebuild-search')
+def db_rebuild_search():
+    """Reindexa a busca textual de ingredientes e fichas técnicas"""
+    with get_db() as conn:
+        reconstruir_indices_busca(conn.cursor())
+    click.echo("✓ Índices de busca reconstruídos")
+
+
+@db_cli.command('rebuild-cost-layers')
+def db_rebuild_cost_layers():
+    """Recria as camadas FIFO a partir do estoque atual (ao ativar CUSTO_FIFO)"""
+    with get_db() as conn:
+        camadas = reconstruir_camadas(conn.cursor())
+    click.echo(f"✓ Camadas de custo recriadas ({camadas} abertas)")
+    if not CUSTO_FIFO:
+        click.echo("  CUSTO_FIFO desligado: as camadas não serão mantidas pelas movimentações")
+
+
+@db_cli.command('check-stock')
+def db_check_stock():
+    """Confere o estoque de cada ingrediente com a soma das movimentações"""
+    with get_db(readonly=True) as conn:
+        divergentes = conferir_livro(conn.cursor())
+    for item in divergentes:
+        click.echo(
+            f"  {item['id']:>5} {item['nome']}: estoque {item['estoque_atual']:g}, "
+            f"movimentações {item['saldo_livro']:g} (diferença {item['diferenca']:+g})"
+        )
+    if divergentes:
+        raise click.ClickException(f"{len(divergentes)} ingredientes fora do livro de movimentações")
+    click.echo("✓ Estoque confere com o livro de movimentações")
@@ -0,0 +1,180 @@
+import json
+import os
+import queue
+import threading
+import urllib.request
+from flask import has_request_context
+from models.database import apos_commit
+from models.eventos import publicar
+from utils.periodos import agora_timestamp
+
+# URL que recebe um POST JSON a cada entrada/saída do estoque baixo (opcional)
+ALERTA_ESTOQUE_WEBHOOK = os.environ.get('ALERTA_ESTOQUE_WEBHOOK', '')
+WEBHOOK_TIMEOUT_S = 5
+
+# Notificações aguardando envio ao webhook; excedentes são descartadas
+WEBHOOK_FILA_MAX = 1000
+
+_fila_webhook = queue.Queue(maxsize=WEBHOOK_FILA_MAX)
+_thread_webhook = None
+_pid_webhook = None
+_lock = threading.Lock()
+
+
+def criar_tabela_alertas(cursor):
+    """Cria a tabela de alertas de estoque baixo (um registro por cruzamento do mínimo)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS alertas_estoque (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingrediente_id INTEGER NOT NULL,
+            inicio TIMESTAMP NOT NULL,
+            fim TIMESTAMP,
+            estoque_inicio REAL NOT NULL,
+            estoque_minimo REAL NOT NULL,
+            estoque_fim REAL,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id)
+        )
+    ''')
+    # No máximo um alerta aberto por ingrediente; o conjunto aberto é pequeno
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_alertas_estoque_abertos
+        ON alertas_estoque(ingrediente_id) WHERE fim IS NULL
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_alertas_estoque_inicio ON alertas_estoque(inicio)')
+
+
+def reconstruir_alertas(cursor):
+    """Sincroniza os alertas abertos com o estoque atual (varredura completa)
+
+    Usado na migração e pelo comando `flask db rebuild-alerts`; nas
+    escritas normais o conjunto é mantido por registrar_estoque_alterado.
+    Retorna o número de alertas abertos.
+    """
+    agora = agora_timestamp()
+    cursor.execute('''
+        UPDATE alertas_estoque
+        SET fim = ?,
+            estoque_fim = (SELECT estoque_atual FROM ingredientes i WHERE i.id = alertas_estoque.ingrediente_id)
+        WHERE fim IS NULL AND ingrediente_id NOT IN (
+            SELECT id FROM ingredientes WHERE ativo = 1 AND estoque_atual <= estoque_minimo
+        )
+    ''', (agora,))
+    cursor.execute('''
+        INSERT INTO alertas_estoque (ingrediente_id, inicio, estoque_inicio, estoque_minimo)
+        SELECT i.id, ?, i.estoque_atual, i.estoque_minimo
+        FROM ingredientes i
+        WHERE i.ativo = 1 AND i.estoque_atual <= i.estoque_minimo
+        AND NOT EXISTS (
+            SELECT 1 FROM alertas_estoque a WHERE a.ingrediente_id = i.id AND a.fim IS NULL
+        )
+    ''', (agora,))
+    cursor.execute('SELECT COUNT(*) AS total FROM alertas_estoque WHERE fim IS NULL')
+    return cursor.fetchone()['total']
+
+
+def registrar_estoque_alterado(cursor, ingrediente_ids):
+    """Atualiza os alertas e publica os deltas dos ingredientes alterados
+
+    Chamado pelas escritas de estoque na própria transação, depois de
+    alterar os ingredientes. Compara o estoque novo com os alertas abertos
+    desses ingredientes: cada cruzamento do mínimo abre ou encerra um
+    alerta, gera um evento `estoque_baixo` no stream do dashboard e, se
+    configurado, uma notificação ao webhook. Todos os ingredientes vão em
+    um único evento `estoque`.
+    """
+    ids = sorted(set(ingrediente_ids))
+    if not ids:
+        return []
+    marcadores = ', '.join('?' * len(ids))
+
+    cursor.execute(f'''
+        SELECT id, nome, estoque_atual, estoque_minimo, ativo FROM ingredientes
+        WHERE id IN ({marcadores})
+    ''', ids)
+    ingredientes = cursor.fetchall()
+
+    cursor.execute(f'''
+        SELECT ingrediente_id, inicio FROM alertas_estoque
+        WHERE fim IS NULL AND ingrediente_id IN ({marcadores})
+    ''', ids)
+    abertos = {row['ingrediente_id']: row['inicio'] for row in cursor.fetchall()}
+
+    agora = agora_timestamp()
+    itens = []
+    transicoes = []
+    for row in ingredientes:
+        item = {
+            'ingrediente_id': row['id'],
+            'nome': row['nome'],
+            'estoque_atual': row['estoque_atual'],
+            'estoque_minimo': row['estoque_minimo']
+        }
+        itens.append(item)
+
+        baixo = bool(row['ativo']) and row['estoque_atual'] <= row['estoque_minimo']
+        if baixo == (row['id'] in abertos):
+            continue
+
+        if baixo:
+            # Concorrente já abriu o alerta: o índice único descarta este
+            cursor.execute('''
+                INSERT OR IGNORE INTO alertas_estoque (ingrediente_id, inicio, estoque_inicio, estoque_minimo)
+                VALUES (?, ?, ?, ?)
+            ''', (row['id'], agora, row['estoque_atual'], row['estoque_minimo']))
+            transicao = {**item, 'baixo': True, 'desde': agora}
+        else:
+            cursor.execute('''
+                UPDATE alertas_estoque SET fim = ?, estoque_fim = ?
+                WHERE ingrediente_id = ? AND fim IS NULL
+            ''', (agora, row['estoque_atual'], row['id']))
+            transicao = {**item, 'baixo': False, 'desde': str(abertos[row['id']]), 'ate': agora}
+
+        transicoes.append(transicao)
+        publicar(cursor, 'estoque_baixo', transicao)
+
+    publicar(cursor, 'estoque', {'ingredientes': itens})
+
+    if transicoes and ALERTA_ESTOQUE_WEBHOOK and has_request_context():
+        # Somente após o COMMIT; nada é enviado se a transação fizer rollback
+        def _notificar():
+            for transicao in transicoes:
+                _enfileirar_webhook(transicao)
+        apos_commit(_notificar)
+
+    return transicoes
+
+
+def _enfileirar_webhook(transicao):
+    global _thread_webhook, _pid_webhook
+    try:
+        _fila_webhook.put_nowait(transicao)
+    except queue.Full:
+        print("⚠️  Fila do webhook de estoque cheia; notificação descartada")
+        return
+
+    with _lock:
+        # A thread não sobrevive ao fork do gunicorn: recriada por processo
+        if _thread_webhook is None or _pid_webhook != os.getpid() or not _thread_webhook.is_alive():
+            _pid_webhook = os.getpid()
+            _thread_webhook = threading.Thread(target=_enviar_webhooks, name='silvess-webhook', daemon=True)
+            _thread_webhook.start()
+
+
+def _enviar_webhooks():
+    while True:
+        transicao = _fila_webhook.get()
+        corpo = json.dumps({
+            'evento': 'estoque_baixo' if transicao['baixo'] else 'estoque_normalizado',
+            **transicao
+        }, ensure_ascii=False, default=str).encode('utf-8')
+        requisicao = urllib.request.Request(
+            ALERTA_ESTOQUE_WEBHOOK,
+            data=corpo,
+            headers={'Content-Type': 'application/json'},
+            method='POST'
+        )
+        try:
+            with urllib.request.urlopen(requisicao, timeout=WEBHOOK_TIMEOUT_S):
+                pass
+        except Exception as e:
+            print(f"⚠️  Falha ao notificar webhook de estoque: {e}")
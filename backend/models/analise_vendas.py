@@ -0,0 +1,522 @@
+import importlib.util
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from models.database import get_db, cursor_em_lotes
+
+# NumPy só é importado na primeira consulta (ver _importar_numpy): workers
+# que não servem análises não pagam a importação
+np = None
+
+# Snapshot colunar das vendas mantido em memória por worker
+ANALISE_VENDAS = os.environ.get('ANALISE_VENDAS', 'True').lower() == 'true'
+
+# Dias de vendas mantidos no snapshot (0 = todo o histórico). Vendas mais
+# antigas saem do snapshot na virada do dia; relatórios que começam antes
+# da janela usam os rollups.
+ANALISE_VENDAS_DIAS = int(os.environ.get('ANALISE_VENDAS_DIAS', 730))
+
+# Ids ausentes (transações ainda abertas em outro worker) são reconsultados
+# por até LACUNA_MAX_S segundos; depois disso a lacuna é dada como rollback
+LACUNA_MAX_S = 60
+LACUNAS_MAX = 500
+
+# Linhas lidas por vez ao carregar o snapshot
+TAMANHO_LOTE_CARGA = 50000
+
+SEGUNDOS_DIA = 86400
+
+# Colunas do snapshot e seus tipos
+COLUNAS = {
+    'id': 'int64',
+    'segundo': 'int64',      # data_venda em segundos desde 1970-01-01
+    'dia': 'int32',          # dias desde 1970-01-01
+    'hora': 'int8',
+    'dia_semana': 'int8',    # 0 = segunda-feira
+    'ficha': 'int32',
+    'categoria': 'int32',    # código em Consulta.categorias (categoria gravada na venda)
+    'mesa': 'int32',         # 0 = sem mesa
+    'quantidade': 'int32',
+    'valor': 'float64',
+    # Índices para filtrar períodos por fatia (busca binária), mesmo com
+    # vendas anexadas fora de ordem: máximo acumulado do início até a linha
+    # e mínimo acumulado da linha até o fim
+    'segundo_max': 'int64',
+    'segundo_min': 'int64'
+}
+
+# Colunas usadas nos filtros
+COLUNAS_FILTRO = ('segundo', 'ficha', 'categoria', 'mesa', 'dia_semana', 'hora')
+
+# Chaves aceitas por agrupar()
+AGRUPAMENTOS = ('prato', 'categoria', 'dia', 'hora', 'dia_semana', 'mesa')
+
+DIAS_SEMANA = ('segunda', 'terça', 'quarta', 'quinta', 'sexta', 'sábado', 'domingo')
+
+
+def analise_disponivel():
+    """Indica se o motor colunar pode ser usado neste worker"""
+    return ANALISE_VENDAS and (np is not None or importlib.util.find_spec('numpy') is not None)
+
+
+def _importar_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def inicio_janela():
+    """Primeiro dia ('YYYY-MM-DD') mantido no snapshot, ou None sem limite"""
+    if not ANALISE_VENDAS_DIAS:
+        return None
+    return (datetime.utcnow().date() - timedelta(days=ANALISE_VENDAS_DIAS)).isoformat()
+
+
+def segundos(timestamp):
+    """Converte 'YYYY-MM-DD[ HH:MM:SS]' em segundos desde 1970-01-01"""
+    return int(np.datetime64(timestamp[:19].replace(' ', 'T'), 's').astype(np.int64))
+
+
+def _rotulo_dia(dia):
+    return str(np.datetime64(int(dia), 'D'))
+
+
+class _Fichas:
+    """Dimensão de fichas técnicas indexada por id (nome, categoria e custo)"""
+
+    def __init__(self, linhas):
+        tamanho = max((row['id'] for row in linhas), default=0) + 1
+        self.nomes = [None] * tamanho
+        self.categorias = []
+        self.categoria = np.zeros(tamanho, dtype=np.int32)
+        self.custo = np.zeros(tamanho, dtype=np.float64)
+
+        codigos = {}
+        for row in linhas:
+            categoria = row['categoria']
+            if categoria not in codigos:
+                codigos[categoria] = len(self.categorias)
+                self.categorias.append(categoria)
+            self.nomes[row['id']] = row['nome_prato']
+            self.categoria[row['id']] = codigos[categoria]
+            self.custo[row['id']] = row['custo_total'] or 0
+
+
+class SnapshotVendas:
+    """Vendas em colunas NumPy, atualizadas de forma incremental pelo id
+
+    As colunas crescem por duplicação de capacidade; leitores trabalham sobre
+    fatias [:n] capturadas sob o lock, que continuam válidas mesmo depois de
+    novos anexos ou realocações. Só as vendas a partir de inicio_janela()
+    são mantidas: na virada do dia as mais antigas são descartadas.
+    """
+
+    def __init__(self):
+        self._dados = {nome: np.empty(1024, dtype=tipo) for nome, tipo in COLUNAS.items()}
+        self._n = 0
+        self._ultimo_id = 0
+        self._lacunas = {}  # id -> instante em que a lacuna foi detectada
+        self._janela = None
+        # Categorias das vendas (gravadas em cada venda, como nos rollups);
+        # a lista só cresce, então códigos já lidos continuam válidos
+        self._categorias = []
+        self._codigos_categoria = {}
+        self._fichas = None
+        self._versao_fichas = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._n
+
+    def _garantir_capacidade(self, extra):
+        capacidade = len(self._dados['id'])
+        if self._n + extra <= capacidade:
+            return
+        while capacidade < self._n + extra:
+            capacidade *= 2
+        for nome, coluna in self._dados.items():
+            nova = np.empty(capacidade, dtype=coluna.dtype)
+            nova[:self._n] = coluna[:self._n]
+            self._dados[nome] = nova
+
+    def _compactar(self, inicio):
+        """Descarta as vendas anteriores a `inicio` (segundos) em colunas novas
+
+        As colunas antigas não são alteradas: continuam válidas para os
+        leitores que já capturaram suas fatias.
+        """
+        d = self._dados
+        manter = np.flatnonzero(d['segundo'][:self._n] >= inicio)
+        n = len(manter)
+        capacidade = 1024
+        while capacidade < n:
+            capacidade *= 2
+        novos = {}
+        for nome, coluna in d.items():
+            nova = np.empty(capacidade, dtype=coluna.dtype)
+            nova[:n] = coluna[:self._n][manter]
+            novos[nome] = nova
+        seg = novos['segundo'][:n]
+        novos['segundo_max'][:n] = np.maximum.accumulate(seg) if n else seg
+        novos['segundo_min'][:n] = np.minimum.accumulate(seg[::-1])[::-1] if n else seg
+        self._dados = novos
+        self._n = n
+
+    def _codigo_categoria(self, categoria):
+        categoria = categoria or None
+        codigo = self._codigos_categoria.get(categoria)
+        if codigo is None:
+            codigo = self._codigos_categoria[categoria] = len(self._categorias)
+            self._categorias.append(categoria)
+        return codigo
+
+    def _anexar(self, linhas):
+        if not linhas:
+            return
+        total = len(linhas)
+        self._garantir_capacidade(total)
+        inicio, fim = self._n, self._n + total
+
+        ids = np.fromiter((row['id'] for row in linhas), dtype=np.int64, count=total)
+        seg = np.array(
+            [row['data_venda'][:19].replace(' ', 'T') for row in linhas], dtype='datetime64[s]'
+        ).astype(np.int64)
+        dia = seg // SEGUNDOS_DIA
+
+        d = self._dados
+        d['id'][inicio:fim] = ids
+        d['segundo'][inicio:fim] = seg
+        maximo = np.maximum.accumulate(seg)
+        if inicio:
+            np.maximum(maximo, d['segundo_max'][inicio - 1], out=maximo)
+        d['segundo_max'][inicio:fim] = maximo
+        d['segundo_min'][inicio:fim] = np.minimum.accumulate(seg[::-1])[::-1]
+        if inicio:
+            # Linhas antigas com mínimo acima do novo menor valor formam um sufixo
+            minimo = d['segundo_min'][:inicio]
+            menor = seg.min()
+            minimo[np.searchsorted(minimo, menor, side='right'):] = menor
+        d['dia'][inicio:fim] = dia
+        d['hora'][inicio:fim] = (seg % SEGUNDOS_DIA) // 3600
+        # 1970-01-01 foi uma quinta-feira
+        d['dia_semana'][inicio:fim] = (dia + 3) % 7
+        d['ficha'][inicio:fim] = np.fromiter((row['ficha_tecnica_id'] for row in linhas), dtype=np.int32, count=total)
+        d['categoria'][inicio:fim] = np.fromiter(
+            (self._codigo_categoria(row['categoria']) for row in linhas), dtype=np.int32, count=total
+        )
+        d['mesa'][inicio:fim] = np.fromiter((row['mesa_id'] or 0 for row in linhas), dtype=np.int32, count=total)
+        d['quantidade'][inicio:fim] = np.fromiter((row['quantidade'] for row in linhas), dtype=np.int32, count=total)
+        d['valor'][inicio:fim] = np.fromiter((row['valor_total'] or 0 for row in linhas), dtype=np.float64, count=total)
+        self._n = fim
+
+        # Ids pulados podem ser transações de outro worker ainda não confirmadas
+        agora = time.monotonic()
+        maior_id = int(ids.max())
+        janela = np.arange(max(self._ultimo_id + 1, maior_id - LACUNAS_MAX), maior_id)
+        for lacuna in np.setdiff1d(janela, ids):
+            self._lacunas[int(lacuna)] = agora
+        if self._lacunas:
+            for id_venda in np.intersect1d(ids, np.fromiter(self._lacunas, dtype=np.int64)):
+                self._lacunas.pop(int(id_venda), None)
+        self._ultimo_id = max(self._ultimo_id, maior_id)
+
+    def atualizar(self, conn):
+        """Anexa as vendas novas desde a última atualização"""
+        with self._lock:
+            agora = time.monotonic()
+            self._lacunas = {
+                id_venda: instante for id_venda, instante in self._lacunas.items()
+                if agora - instante < LACUNA_MAX_S
+            }
+            lacunas = sorted(self._lacunas)
+
+            janela = inicio_janela()
+            if janela is not None and janela != self._janela:
+                if self._janela is not None:
+                    self._compactar(segundos(janela))
+                self._janela = janela
+
+            query = '''
+                SELECT id, data_venda, ficha_tecnica_id, categoria, mesa_id, quantidade, valor_total
+                FROM vendas
+                WHERE (id > ?
+            '''
+            params = [self._ultimo_id]
+            if lacunas:
+                query += f' OR id IN ({", ".join("?" * len(lacunas))})'
+                params.extend(lacunas)
+            query += ')'
+            if janela is not None:
+                query += ' AND data_venda >= ?'
+                params.append(janela)
+
+            cursor = cursor_em_lotes(conn)
+            cursor.execute(query + ' ORDER BY id', params)
+            while True:
+                lote = cursor.fetchmany(TAMANHO_LOTE_CARGA)
+                if not lote:
+                    break
+                self._anexar(lote)
+            cursor.close()
+
+            # Dimensão de fichas recarregada quando a versão da tabela muda
+            cursor = conn.cursor()
+            cursor.execute("SELECT versao FROM versoes_tabelas WHERE tabela = 'fichas_tecnicas'")
+            versao = cursor.fetchone()['versao']
+            if self._fichas is None or versao != self._versao_fichas:
+                cursor.execute('SELECT id, nome_prato, categoria, custo_total FROM fichas_tecnicas')
+                self._fichas = _Fichas(cursor.fetchall())
+                self._versao_fichas = versao
+
+    def colunas(self):
+        """Retorna (fatias das colunas, dimensão de fichas, categorias, início da janela) para leitura"""
+        with self._lock:
+            n = self._n
+            colunas = {nome: coluna[:n] for nome, coluna in self._dados.items()}
+            return colunas, self._fichas, self._categorias, self._janela
+
+
+class Consulta:
+    """Filtro sobre o snapshot, com agregações vetorizadas"""
+
+    def __init__(self, colunas, fichas, categorias, fatia=None, mascara=None, janela=None):
+        self._c = colunas
+        self.fichas = fichas
+        # Rótulos da coluna 'categoria' (categoria da ficha no momento da venda)
+        self.categorias = categorias
+        # Primeiro dia presente no snapshot (None: todo o histórico)
+        self.janela = janela
+        # Vendas selecionadas: linhas da fatia em que a máscara (relativa à fatia) é verdadeira
+        self.fatia = fatia if fatia is not None else slice(0, len(colunas['id']))
+        self.mascara = mascara
+        self._filtradas = {}
+
+    def _fatia_do_periodo(self, inicio, fim):
+        """Fatia que contém todas as vendas de [inicio, fim), por busca binária"""
+        primeira, ultima = self.fatia.start, self.fatia.stop
+        if inicio:
+            # Antes desta posição, todas as vendas são anteriores a `inicio`
+            primeira = max(primeira, int(np.searchsorted(self._c['segundo_max'], segundos(inicio), side='left')))
+        if fim:
+            # A partir desta posição, todas as vendas são posteriores a `fim`
+            ultima = min(ultima, int(np.searchsorted(self._c['segundo_min'], segundos(fim), side='left')))
+        return slice(primeira, max(primeira, ultima))
+
+    def filtrar(self, inicio=None, fim=None, ficha_id=None, categoria=None, mesa_id=None,
+                dia_semana=None, hora=None):
+        """Nova consulta restrita aos filtros informados (intervalo semiaberto [inicio, fim))"""
+        if inicio and self.janela and inicio[:10] < self.janela:
+            raise ValueError(f'Análises cobrem as vendas a partir de {self.janela}')
+        fatia = self._fatia_do_periodo(inicio, fim)
+        c = {nome: coluna[fatia] for nome, coluna in self._c.items() if nome in COLUNAS_FILTRO}
+
+        mascara = np.ones(fatia.stop - fatia.start, dtype=bool)
+        if self.mascara is not None:
+            deslocamento = fatia.start - self.fatia.start
+            mascara &= self.mascara[deslocamento:deslocamento + len(mascara)]
+        if inicio:
+            mascara &= c['segundo'] >= segundos(inicio)
+        if fim:
+            mascara &= c['segundo'] < segundos(fim)
+        if ficha_id is not None:
+            mascara &= c['ficha'] == int(ficha_id)
+        if categoria is not None:
+            codigo = self.categorias.index(categoria) if categoria in self.categorias else -1
+            mascara &= c['categoria'] == codigo
+        if mesa_id is not None:
+            mascara &= c['mesa'] == int(mesa_id)
+        if dia_semana is not None:
+            mascara &= c['dia_semana'] == int(dia_semana)
+        if hora is not None:
+            mascara &= c['hora'] == int(hora)
+
+        # Sem linhas descartadas na fatia, as colunas são usadas sem cópia
+        return Consulta(self._c, self.fichas, self.categorias, fatia,
+                        None if mascara.all() else mascara, self.janela)
+
+    def coluna(self, nome):
+        """Valores de uma coluna nas vendas filtradas"""
+        valores = self._filtradas.get(nome)
+        if valores is None:
+            if nome == 'quantidade_f':
+                valores = self.coluna('quantidade').astype(np.float64)
+            elif nome == 'custo':
+                # Custo estimado de cada venda pelo custo_total atual da ficha
+                valores = self.coluna('quantidade_f') * self._dimensao(self.fichas.custo)[self.coluna('ficha')]
+            elif self.mascara is None:
+                valores = self._c[nome][self.fatia]
+            else:
+                valores = self._c[nome][self.fatia][self.mascara]
+            self._filtradas[nome] = valores
+        return valores
+
+    def _dimensao(self, valores):
+        """Estende um vetor da dimensão de fichas até o maior id vendido"""
+        fichas = self.coluna('ficha')
+        tamanho = int(fichas.max()) + 1 if len(fichas) else 0
+        if tamanho <= len(valores):
+            return valores
+        return np.concatenate([valores, np.zeros(tamanho - len(valores), dtype=valores.dtype)])
+
+    def totais(self):
+        """Totais das vendas filtradas"""
+        valor = self.coluna('valor')
+        total = len(valor)
+        soma = float(valor.sum())
+        return {
+            'total_vendas': total,
+            'quantidade_total': int(self.coluna('quantidade').sum()),
+            'valor_total': soma if total else None,
+            'ticket_medio': soma / total if total else None
+        }
+
+    def _somar(self, codigos, n, custo=True):
+        """bincount de vendas, quantidade, valor (e custo) por código de grupo"""
+        codigos = codigos.astype(np.intp, copy=False)
+        somas = {
+            'total_vendas': np.bincount(codigos, minlength=n),
+            'quantidade_total': np.bincount(codigos, weights=self.coluna('quantidade_f'), minlength=n),
+            'valor_total': np.bincount(codigos, weights=self.coluna('valor'), minlength=n)
+        }
+        if custo:
+            somas['custo_estimado'] = np.bincount(codigos, weights=self.coluna('custo'), minlength=n)
+        return somas
+
+    def _agregados(self, chave, custo=True):
+        """Somas por grupo e função que dá o rótulo de cada código"""
+        if chave == 'prato':
+            # Uma passada por ficha; o custo vem da quantidade somada de cada ficha
+            por_ficha = self._somar(self.coluna('ficha'), len(self.fichas.nomes), custo=False)
+            custo = self._dimensao(self.fichas.custo)
+            por_ficha['custo_estimado'] = por_ficha['quantidade_total'] * custo[:len(por_ficha['quantidade_total'])]
+            return por_ficha, lambda k: k
+        if chave == 'categoria':
+            # Categoria gravada na venda, a mesma usada pelos rollups
+            categorias = self.categorias
+            return self._somar(self.coluna('categoria'), len(categorias), custo), lambda k: categorias[k]
+        if chave == 'dia':
+            dias = self.coluna('dia')
+            base = int(dias.min()) if len(dias) else 0
+            n = int(dias.max()) - base + 1 if len(dias) else 0
+            return self._somar(dias - base, n, custo), lambda k: _rotulo_dia(base + k)
+        if chave == 'hora':
+            return self._somar(self.coluna('hora'), 24, custo), lambda k: k
+        if chave == 'dia_semana':
+            return self._somar(self.coluna('dia_semana'), 7, custo), lambda k: DIAS_SEMANA[k]
+        if chave == 'mesa':
+            mesas = self.coluna('mesa')
+            n = int(mesas.max()) + 1 if len(mesas) else 0
+            return self._somar(mesas, n, custo), lambda k: k or None
+        raise ValueError(f'agrupar deve ser um de: {", ".join(AGRUPAMENTOS)}')
+
+    def agrupar(self, chave, custo=True):
+        """Agrega as vendas filtradas por `chave` (ver AGRUPAMENTOS) com bincount
+
+        Cada grupo traz total de vendas, quantidade, valor, ticket médio e a
+        margem estimada pelo custo_total atual das fichas (custo=False dispensa
+        o custo por venda nos agrupamentos que não são por prato).
+        """
+        if not len(self.coluna('id')):
+            if chave not in AGRUPAMENTOS:
+                raise ValueError(f'agrupar deve ser um de: {", ".join(AGRUPAMENTOS)}')
+            return []
+        somas, rotulo = self._agregados(chave, custo)
+        contagem = somas['total_vendas']
+
+        grupos = []
+        for k in np.flatnonzero(contagem):
+            k = int(k)
+            valor = float(somas['valor_total'][k])
+            grupo = {chave: rotulo(k)}
+            if chave == 'prato':
+                # Ficha vendida depois da última carga da dimensão: sem nome nem categoria
+                conhecida = k < len(self.fichas.nomes)
+                grupo['nome_prato'] = self.fichas.nomes[k] if conhecida else None
+                grupo['categoria'] = self.fichas.categorias[self.fichas.categoria[k]] if conhecida else None
+            grupo.update({
+                'total_vendas': int(contagem[k]),
+                'quantidade_total': int(round(somas['quantidade_total'][k])),
+                'valor_total': valor,
+                'ticket_medio': valor / float(contagem[k])
+            })
+            if 'custo_estimado' in somas:
+                grupo['custo_estimado'] = float(somas['custo_estimado'][k])
+                grupo['margem'] = valor - grupo['custo_estimado']
+            grupos.append(grupo)
+        return grupos
+
+    def distribuicao(self, coluna='valor', faixas=10):
+        """Percentis e histograma de uma coluna nas vendas filtradas"""
+        valores = self.coluna(coluna)
+        if not len(valores):
+            return {'total_vendas': 0, 'percentis': {}, 'histograma': []}
+        p = np.percentile(valores, [25, 50, 75, 90, 99])
+        contagens, limites = np.histogram(valores, bins=faixas)
+        return {
+            'total_vendas': int(len(valores)),
+            'media': float(valores.mean()),
+            'percentis': dict(zip(('p25', 'p50', 'p75', 'p90', 'p99'), (float(v) for v in p))),
+            'histograma': [
+                {'de': float(limites[i]), 'ate': float(limites[i + 1]), 'vendas': int(contagens[i])}
+                for i in range(len(contagens))
+            ]
+        }
+
+
+_snapshot = None
+_snapshot_pid = None
+_snapshot_lock = threading.Lock()
+
+
+def consultar_vendas():
+    """Atualiza o snapshot deste worker e retorna uma Consulta sobre as vendas da janela"""
+    global _snapshot, _snapshot_pid
+    _importar_numpy()
+    with _snapshot_lock:
+        if _snapshot is None or _snapshot_pid != os.getpid():
+            _snapshot = SnapshotVendas()
+            _snapshot_pid = os.getpid()
+        snapshot = _snapshot
+
+    with get_db(readonly=True) as conn:
+        snapshot.atualizar(conn)
+
+    colunas, fichas, categorias, janela = snapshot.colunas()
+    return Consulta(colunas, fichas, categorias, janela=janela)
+
+
+def relatorio_vendas(inicio, fim):
+    """Relatório de vendas do período [inicio, fim) no formato de /relatorio/vendas"""
+    consulta = consultar_vendas().filtrar(inicio=inicio, fim=fim)
+    totais = consulta.totais()
+
+    def ordenar_por_valor(grupos):
+        return sorted(grupos, key=lambda g: g['valor_total'], reverse=True)
+
+    return {
+        'totais': {
+            'total_vendas': totais['total_vendas'],
+            'valor_total': totais['valor_total'],
+            'ticket_medio': totais['ticket_medio']
+        },
+        'vendas_por_prato': [
+            {'nome_prato': g['nome_prato'], 'categoria': g['categoria'],
+             'quantidade_total': g['quantidade_total'], 'valor_total': g['valor_total']}
+            for g in ordenar_por_valor(consulta.agrupar('prato'))
+        ],
+        'vendas_por_dia': [
+            {'data': g['dia'], 'total_vendas': g['total_vendas'], 'valor_total': g['valor_total']}
+            for g in consulta.agrupar('dia', custo=False)
+        ],
+        'vendas_por_categoria': [
+            {'categoria': g['categoria'], 'total_vendas': g['total_vendas'], 'valor_total': g['valor_total']}
+            for g in ordenar_por_valor(consulta.agrupar('categoria'))
+        ],
+        'vendas_por_hora': [
+            {'hora': g['hora'], 'total_vendas': g['total_vendas'], 'valor_total': g['valor_total']}
+            for g in consulta.agrupar('hora', custo=False)
+        ]
+    }
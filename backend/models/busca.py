@@ -0,0 +1,117 @@
+import re
+import unicodedata
+from models.database import DIALECT
+
+# Índices de busca: nome -> (tabela FTS5, tabela de conteúdo, colunas, pesos bm25)
+INDICES = {
+    'ingredientes': ('ingredientes_busca', 'ingredientes', ('nome', 'fornecedor'), (10.0, 1.0)),
+    'fichas': ('fichas_busca', 'fichas_tecnicas', ('nome_prato', 'descricao'), (10.0, 1.0))
+}
+
+# Sem acentos e sem diferenciar maiúsculas; prefixos de 2 e 3 letras indexados
+TOKENIZADOR = 'unicode61 remove_diacritics 2'
+
+# Equivalente do remove_diacritics para o PostgreSQL, sem depender da extensão unaccent
+_ACENTOS = 'áàâãäåéèêëíìîïóòôõöúùûüçñ'
+_SEM_ACENTOS = 'aaaaaaeeeeiiiiooooouuuucn'
+
+_RE_PALAVRA = re.compile(r'\w+')
+
+
+def criar_indices_busca(cursor):
+    """Cria os índices FTS5 e os triggers que os mantêm sincronizados (SQLite)
+
+    As tabelas FTS usam a própria tabela como conteúdo (content=), então só
+    guardam o índice invertido. Os triggers de UPDATE disparam apenas quando
+    as colunas indexadas mudam, sem custo nas atualizações de estoque.
+    No PostgreSQL não há FTS5: a busca usa LIKE sobre o texto sem acentos.
+    """
+    if DIALECT == 'postgres':
+        return
+
+    for tabela_fts, tabela, colunas, _ in INDICES.values():
+        lista = ', '.join(colunas)
+        novos = ', '.join(f'new.{c}' for c in colunas)
+        antigos = ', '.join(f'old.{c}' for c in colunas)
+
+        cursor.execute(f'''
+            CREATE VIRTUAL TABLE IF NOT EXISTS {tabela_fts} USING fts5(
+                {lista}, content='{tabela}', content_rowid='id',
+                tokenize='{TOKENIZADOR}', prefix='2 3'
+            )
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ai AFTER INSERT ON {tabela} BEGIN
+                INSERT INTO {tabela_fts} (rowid, {lista}) VALUES (new.id, {novos});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabela_fts}_ad AFTER DELETE ON {tabela} BEGIN
+                INSERT INTO {tabela_fts} ({tabela_fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos});
+            END
+        ''')
+        cursor.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS {tabela_fts}_au AFTER UPDATE OF {lista} ON {tabela} BEGIN
+                INSERT INTO {tabela_fts} ({tabela_fts}, rowid, {lista}) VALUES ('delete', old.id, {antigos});
+                INSERT INTO {tabela_fts} (rowid, {lista}) VALUES (new.id, {novos});
+            END
+        ''')
+        cursor.execute(f"INSERT INTO {tabela_fts} ({tabela_fts}) VALUES ('rebuild')")
+
+
+def reconstruir_indices_busca(cursor):
+    """Reindexa todo o conteúdo das tabelas de busca (SQLite)"""
+    if DIALECT == 'postgres':
+        return
+    for tabela_fts, _, _, _ in INDICES.values():
+        cursor.execute(f"INSERT INTO {tabela_fts} ({tabela_fts}) VALUES ('rebuild')")
+
+
+def _sem_acentos(texto):
+    decomposto = unicodedata.normalize('NFKD', texto.lower())
+    return ''.join(ch for ch in decomposto if not unicodedata.combining(ch))
+
+
+def juncao_busca(indice, termo):
+    """JOIN que filtra e ordena por relevância a tabela do índice pelo termo
+
+    Retorna (sql, params) para inserir logo após o FROM da tabela, ou
+    (None, None) se o termo não tem palavras. Cada palavra é buscada como
+    prefixo, sem acentos; todas precisam aparecer. A junção expõe
+    `busca.relevancia` (menor é melhor) para o ORDER BY.
+    """
+    palavras = _RE_PALAVRA.findall(_sem_acentos(termo or ''))
+    if not palavras:
+        return None, None
+
+    tabela_fts, tabela, colunas, pesos = INDICES[indice]
+
+    if DIALECT != 'postgres':
+        consulta = ' '.join(f'"{palavra}"*' for palavra in palavras)
+        return f'''
+            JOIN (
+                SELECT rowid AS id, bm25({tabela_fts}, {', '.join(map(str, pesos))}) AS relevancia
+                FROM {tabela_fts} WHERE {tabela_fts} MATCH ?
+            ) busca ON busca.id = {tabela}.id
+        ''', [consulta]
+
+    def sem_acentos(coluna):
+        return f"translate(lower(COALESCE({coluna}, '')), '{_ACENTOS}', '{_SEM_ACENTOS}')"
+
+    # Fallback: todas as palavras em alguma coluna; relevância pela coluna principal
+    principal = sem_acentos(colunas[0])
+    condicoes = []
+    params = [f'{palavras[0]}%', f'%{palavras[0]}%']
+    for palavra in palavras:
+        condicoes.append('(' + ' OR '.join(f'{sem_acentos(c)} LIKE ?' for c in colunas) + ')')
+        params.extend([f'%{palavra}%'] * len(colunas))
+    return f'''
+        JOIN (
+            SELECT id, CASE
+                WHEN {principal} LIKE ? THEN 0
+                WHEN {principal} LIKE ? THEN 1
+                ELSE 2
+            END AS relevancia
+            FROM {tabela} WHERE {' AND '.join(condicoes)}
+        ) busca ON busca.id = {tabela}.id
+    ''', params
@@ -0,0 +1,224 @@
+import os
+from utils.periodos import agora_timestamp
+
+# Mantém também camadas FIFO (lotes de entrada com saldo restante)
+CUSTO_FIFO = os.environ.get('CUSTO_FIFO', 'false').lower() == 'true'
+
+
+def custo_efetivo_sql(alias=None):
+    """Custo usado em fichas e relatórios: o médio ponderado, ou o de referência antes da primeira entrada"""
+    prefixo = f'{alias}.' if alias else ''
+    return f'COALESCE({prefixo}custo_medio, {prefixo}custo_unitario)'
+
+
+def criar_tabelas_custo(cursor):
+    """Cria o custo médio dos ingredientes, seu histórico e as camadas FIFO"""
+    cursor.execute('ALTER TABLE ingredientes ADD COLUMN custo_medio REAL')
+    # Uma linha por entrada com custo: o custo médio vigente a partir de `inicio`
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS custos_historico (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingrediente_id INTEGER NOT NULL,
+            inicio TIMESTAMP NOT NULL,
+            custo_medio REAL NOT NULL,
+            estoque REAL NOT NULL,
+            quantidade REAL,
+            custo_entrada REAL,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_custos_historico_ingrediente
+        ON custos_historico(ingrediente_id, inicio, id)
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS camadas_custo (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingrediente_id INTEGER NOT NULL,
+            entrada_em TIMESTAMP NOT NULL,
+            quantidade REAL NOT NULL,
+            restante REAL NOT NULL,
+            custo_unitario REAL NOT NULL,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id)
+        )
+    ''')
+    # Só as camadas com saldo são consultadas
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_camadas_custo_abertas
+        ON camadas_custo(ingrediente_id, id) WHERE restante > 0
+    ''')
+
+
+def iniciar_custos(cursor):
+    """Registra o custo de referência atual como ponto de partida do histórico
+
+    O custo médio fica NULL até a primeira entrada com custo: até lá vale
+    o de referência, editável em update_ingrediente.
+    """
+    cursor.execute('''
+        INSERT INTO custos_historico (ingrediente_id, inicio, custo_medio, estoque)
+        SELECT id, ?, custo_unitario, estoque_atual FROM ingredientes
+        WHERE custo_unitario IS NOT NULL
+    ''', (agora_timestamp(),))
+    reconstruir_camadas(cursor)
+
+
+def registrar_custo_referencia(cursor, ingrediente_id, custo):
+    """Grava no histórico um custo informado manualmente (cadastro ou edição)
+
+    O custo de referência só vale enquanto o ingrediente não tem custo
+    médio; depois da primeira entrada com custo ele é ignorado, e o médio
+    ponderado só muda em registrar_custos. Fica uma linha no histórico,
+    sem quantidade, apenas enquanto a referência estiver valendo.
+    """
+    cursor.execute('''
+        INSERT INTO custos_historico (ingrediente_id, inicio, custo_medio, estoque)
+        SELECT id, ?, ?, estoque_atual FROM ingredientes
+        WHERE id = ? AND custo_medio IS NULL
+    ''', (agora_timestamp(), custo, ingrediente_id))
+
+
+def reconstruir_camadas(cursor):
+    """Recria as camadas FIFO: uma camada com o estoque atual ao custo médio
+
+    Usado ao ativar CUSTO_FIFO (`flask db rebuild-cost-layers`), já que
+    com a opção desligada as camadas não são mantidas. Retorna o número
+    de camadas abertas.
+    """
+    cursor.execute('DELETE FROM camadas_custo')
+    cursor.execute(f'''
+        INSERT INTO camadas_custo (ingrediente_id, entrada_em, quantidade, restante, custo_unitario)
+        SELECT id, ?, estoque_atual, estoque_atual, {custo_efetivo_sql()}
+        FROM ingredientes
+        WHERE estoque_atual > 0 AND {custo_efetivo_sql()} IS NOT NULL
+    ''', (agora_timestamp(),))
+    cursor.execute('SELECT COUNT(*) AS total FROM camadas_custo')
+    return cursor.fetchone()['total']
+
+
+def _consumir_camadas(cursor, ingrediente_id, quantidade):
+    """Baixa `quantidade` das camadas mais antigas; retorna o custo consumido"""
+    cursor.execute('''
+        SELECT id, restante, custo_unitario FROM camadas_custo
+        WHERE ingrediente_id = ? AND restante > 0
+        ORDER BY id
+    ''', (ingrediente_id,))
+    falta = quantidade
+    custo = 0
+    baixas = []
+    for camada in cursor.fetchall():
+        if falta <= 0:
+            break
+        usado = min(falta, camada['restante'])
+        custo += usado * camada['custo_unitario']
+        baixas.append((camada['restante'] - usado, camada['id']))
+        falta -= usado
+    cursor.executemany('UPDATE camadas_custo SET restante = ? WHERE id = ?', baixas)
+    # Camadas esgotadas (estoque antigo sem camada): o que sobra não tem custo conhecido
+    consumido = quantidade - max(falta, 0)
+    return custo / consumido if consumido > 0 else None
+
+
+def registrar_custos(cursor, movimentos, saldos):
+    """Atualiza o custo médio ponderado com as movimentações de estoque
+
+    Chamado por movimentar_estoque na mesma transação, depois do UPDATE
+    que travou as linhas dos ingredientes. Cada entrada com custo
+    recalcula o médio em O(1) a partir do estoque anterior:
+
+        médio = (estoque × médio + quantidade × custo) / (estoque + quantidade)
+
+    e grava a linha de histórico; entradas sem custo entram ao médio
+    vigente, sem alterá-lo. Saídas não mudam o médio. Com CUSTO_FIFO as
+    entradas abrem camadas e as saídas baixam as mais antigas.
+
+    Retorna o custo unitário de cada movimento, na ordem recebida, para
+    gravar no livro (o pago na entrada; o médio ou FIFO na saída).
+    """
+    ids = sorted(saldos)
+    marcadores = ', '.join('?' * len(ids))
+    cursor.execute(f'''
+        SELECT id, custo_medio, {custo_efetivo_sql()} AS custo_efetivo FROM ingredientes
+        WHERE id IN ({marcadores})
+    ''', ids)
+    custos = {row['id']: dict(row) for row in cursor.fetchall()}
+    estoques = {ingrediente_id: anterior for ingrediente_id, (anterior, _) in saldos.items()}
+
+    agora = agora_timestamp()
+    historico = []
+    camadas = []
+    custos_movimentos = []
+    for ingrediente_id, tipo, quantidade, _, custo_unitario in movimentos:
+        custo = custos[ingrediente_id]
+        estoque = estoques[ingrediente_id]
+
+        if tipo == 'saida':
+            estoques[ingrediente_id] = estoque - quantidade
+            custo_saida = _consumir_camadas(cursor, ingrediente_id, quantidade) if CUSTO_FIFO else None
+            custos_movimentos.append(custo['custo_efetivo'] if custo_saida is None else custo_saida)
+            continue
+
+        estoques[ingrediente_id] = estoque + quantidade
+        if custo_unitario is None:
+            # Sem custo informado: entra ao médio vigente, que não muda
+            custo_unitario = custo['custo_efetivo']
+        else:
+            if custo['custo_medio'] is None or estoque <= 0:
+                medio = custo_unitario
+            else:
+                medio = (estoque * custo['custo_medio'] + quantidade * custo_unitario) / (estoque + quantidade)
+            custo['custo_medio'] = custo['custo_efetivo'] = medio
+            historico.append((
+                ingrediente_id, agora, medio, estoques[ingrediente_id], quantidade, custo_unitario
+            ))
+
+        custos_movimentos.append(custo_unitario)
+        if CUSTO_FIFO and custo_unitario is not None:
+            camadas.append((ingrediente_id, agora, quantidade, quantidade, custo_unitario))
+
+    if historico:
+        cursor.executemany('''
+            INSERT INTO custos_historico
+            (ingrediente_id, inicio, custo_medio, estoque, quantidade, custo_entrada)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', historico)
+        cursor.executemany('UPDATE ingredientes SET custo_medio = ? WHERE id = ?', [
+            (custos[ingrediente_id]['custo_medio'], ingrediente_id)
+            for ingrediente_id in sorted({linha[0] for linha in historico})
+        ])
+    if camadas:
+        cursor.executemany('''
+            INSERT INTO camadas_custo (ingrediente_id, entrada_em, quantidade, restante, custo_unitario)
+            VALUES (?, ?, ?, ?, ?)
+        ''', camadas)
+    return custos_movimentos
+
+
+def custo_em_sql(alias='i'):
+    """Subconsulta do custo médio vigente no instante do parâmetro (exclusivo)
+
+    Uma busca no índice (ingrediente_id, inicio) por ingrediente, sem
+    reprocessar o livro. Antes do primeiro registro vale o primeiro custo
+    conhecido e, sem histórico, o de referência.
+    """
+    return f'''COALESCE((
+        SELECT h.custo_medio FROM custos_historico h
+        WHERE h.ingrediente_id = {alias}.id AND h.inicio < ?
+        ORDER BY h.inicio DESC, h.id DESC
+        LIMIT 1
+    ), (
+        SELECT h.custo_medio FROM custos_historico h
+        WHERE h.ingrediente_id = {alias}.id
+        ORDER BY h.inicio, h.id
+        LIMIT 1
+    ), {alias}.custo_unitario)'''
+
+
+def camadas_abertas(cursor, ingrediente_id):
+    """Camadas FIFO com saldo de um ingrediente, da mais antiga para a mais nova"""
+    cursor.execute('''
+        SELECT id, entrada_em, quantidade, restante, custo_unitario FROM camadas_custo
+        WHERE ingrediente_id = ? AND restante > 0
+        ORDER BY id
+    ''', (ingrediente_id,))
+    return [dict(row) for row in cursor.fetchall()]
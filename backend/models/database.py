@@ -1,187 +1,366 @@
+import itertools
 import sqlite3
 import os
+import sys
+import queue
+import threading
+import time
 from contextlib import contextmanager
 
+if __name__ == '__main__':
+    # Permite executar `python models/database.py` a partir de backend/
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.sql_instrumentation import instrumentar
+
 DATABASE_PATH = os.environ.get('DATABASE_PATH', '/home/ubuntu/silvess/backend/silvess.db')
 
-def get_db_connection():
+# Em produção, DATABASE_URL=postgresql://... seleciona o backend PostgreSQL
+DATABASE_URL = os.environ.get('DATABASE_URL', '')
+DIALECT = 'postgres' if DATABASE_URL.startswith(('postgres://', 'postgresql://')) else 'sqlite'
+
+# Réplica de leitura opcional (PostgreSQL) usada por get_db(readonly=True)
+DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL', '')
+
+# Configurações do pool de conexões (por worker)
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 8))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 10))
+DB_BUSY_TIMEOUT_MS = int(os.environ.get('DB_BUSY_TIMEOUT_MS', 5000))
+
+# PRAGMAs aplicados a cada nova conexão
+SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 32768))
+SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 268435456))
+
+
+def _configurar_conexao(conn):
+    """Aplica os PRAGMAs de desempenho em uma conexão SQLite"""
+    conn.execute('PRAGMA journal_mode = WAL')
+    conn.execute('PRAGMA synchronous = NORMAL')
+    # Valor negativo = tamanho em KiB
+    conn.execute(f'PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}')
+    conn.execute(f'PRAGMA mmap_size = {SQLITE_MMAP_SIZE}')
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA foreign_keys = ON')
+    conn.execute(f'PRAGMA busy_timeout = {DB_BUSY_TIMEOUT_MS}')
+
+
+def get_db_connection(readonly=False):
     """Cria uma conexão com o banco de dados"""
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False)
     conn.row_factory = sqlite3.Row
+    _configurar_conexao(conn)
+    if readonly:
+        # Qualquer tentativa de escrita falha com SQLITE_READONLY
+        conn.execute('PRAGMA query_only = ON')
     return conn
 
+
+class ConnectionPool:
+    """Pool de conexões SQLite reutilizáveis dentro de um worker"""
+
+    def __init__(self, max_size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT, readonly=False):
+        self.max_size = max_size
+        self.timeout = timeout
+        self.readonly = readonly
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._criadas = 0
+        self._stats = {
+            'checkouts': 0,
+            'reutilizadas': 0,
+            'criadas': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'tempo_espera_ms': 0.0
+        }
+
+    def _verificar_processo(self):
+        """Descarta conexões herdadas de um processo pai (fork do gunicorn)"""
+        if self._pid != os.getpid():
+            with self._lock:
+                if self._pid != os.getpid():
+                    self._idle = queue.LifoQueue()
+                    self._criadas = 0
+                    self._pid = os.getpid()
+
+    def _conexao_saudavel(self, conn):
+        """Health check executado a cada checkout"""
+        try:
+            conn.execute('SELECT 1').fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def _descartar(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._criadas -= 1
+            self._stats['descartadas'] += 1
+
+    def acquire(self):
+        """Retira uma conexão do pool, criando uma nova se houver vaga"""
+        self._verificar_processo()
+
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = None
+
+            if conn is None:
+                with self._lock:
+                    pode_criar = self._criadas < self.max_size
+                    if pode_criar:
+                        self._criadas += 1
+
+                if pode_criar:
+                    try:
+                        conn = get_db_connection(readonly=self.readonly)
+                    except Exception:
+                        with self._lock:
+                            self._criadas -= 1
+                        raise
+                    with self._lock:
+                        self._stats['criadas'] += 1
+                        self._stats['checkouts'] += 1
+                    return conn
+
+                # Pool cheio: aguardar uma conexão ser devolvida
+                inicio = time.perf_counter()
+                try:
+                    conn = self._idle.get(timeout=self.timeout)
+                except queue.Empty:
+                    raise RuntimeError('Tempo esgotado aguardando conexão do pool')
+                with self._lock:
+                    self._stats['esperas'] += 1
+                    self._stats['tempo_espera_ms'] += (time.perf_counter() - inicio) * 1000
+
+            if self._conexao_saudavel(conn):
+                with self._lock:
+                    self._stats['checkouts'] += 1
+                    self._stats['reutilizadas'] += 1
+                return conn
+
+            self._descartar(conn)
+
+    def release(self, conn):
+        """Devolve uma conexão ao pool"""
+        if self._pid != os.getpid():
+            conn.close()
+            return
+
+        try:
+            # Nunca devolver conexão com transação pendente
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._descartar(conn)
+            return
+
+        self._idle.put(conn)
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas do pool"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._descartar(conn)
+
+    def stats(self):
+        """Retorna estatísticas de uso do pool"""
+        with self._lock:
+            stats = dict(self._stats)
+            stats['tempo_espera_ms'] = round(stats['tempo_espera_ms'], 3)
+            stats['abertas'] = self._criadas
+        stats['ociosas'] = self._idle.qsize()
+        stats['em_uso'] = stats['abertas'] - stats['ociosas']
+        stats['tamanho_maximo'] = self.max_size
+        stats['pid'] = self._pid
+        return stats
+
+
+def _criar_pool(readonly=False):
+    """Cria o pool de conexões do backend configurado"""
+    if DIALECT == 'postgres':
+        from models.postgres import PostgresPool
+        if readonly:
+            return PostgresPool(DATABASE_REPLICA_URL or DATABASE_URL, readonly=True)
+        return PostgresPool(DATABASE_URL)
+    if readonly:
+        return ConnectionPool(max_size=DB_READ_POOL_SIZE, readonly=True)
+    return ConnectionPool()
+
+
+_pool = _criar_pool()
+_read_pool = _criar_pool(readonly=True)
+
+
+def _criar_escritor():
+    """Cria o escritor serializado, se habilitado (somente SQLite)"""
+    from models.writer import DB_WRITE_SERIALIZATION, SerializedWriter
+    if DIALECT != 'sqlite' or not DB_WRITE_SERIALIZATION:
+        return None
+    return SerializedWriter(get_db_connection, DATABASE_PATH + '.writelock')
+
+
+_writer = _criar_escritor()
+
+
+def get_pool_stats():
+    """Retorna estatísticas dos pools de conexões deste worker"""
+    stats = {
+        'escrita': _pool.stats(),
+        'leitura': _read_pool.stats()
+    }
+    if _writer is not None:
+        stats['escritor'] = _writer.stats()
+    return stats
+
+
+def close_pool():
+    """Fecha as conexões ociosas dos pools deste worker"""
+    _pool.close_all()
+    _read_pool.close_all()
+
+
+# Funções agendadas com apos_commit, uma lista por transação de escrita
+# aberta por get_db na thread (a última é a mais interna)
+_apos_commit = threading.local()
+
+
+def apos_commit(funcao):
+    """Agenda `funcao` para depois do COMMIT da transação corrente de get_db
+
+    Descartada se a transação terminar em rollback. Em uma transação aninhada
+    no escritor serializado, espera o COMMIT da transação externa.
+    """
+    pilha = getattr(_apos_commit, 'pilha', None)
+    if not pilha:
+        raise RuntimeError('apos_commit fora de uma transação de escrita de get_db')
+    pilha[-1].append(funcao)
+
+
+def _abrir_apos_commit():
+    if not hasattr(_apos_commit, 'pilha'):
+        _apos_commit.pilha = []
+    _apos_commit.pilha.append([])
+
+
+def _fechar_apos_commit(confirmada, aninhada=False):
+    funcoes = _apos_commit.pilha.pop()
+    if not confirmada:
+        return
+    if aninhada:
+        # Savepoint liberado: o COMMIT ainda depende da transação externa
+        _apos_commit.pilha[-1].extend(funcoes)
+        return
+    for funcao in funcoes:
+        try:
+            funcao()
+        except Exception as e:
+            # A transação já foi confirmada: a falha não vira erro da requisição
+            print(f"⚠️  Erro em tarefa após o commit: {e}")
+
+
 @contextmanager
-def get_db():
-    """Context manager para conexão com banco de dados"""
-    conn = get_db_connection()
+def get_db(readonly=False, serializar=True):
+    """Context manager para conexão com banco de dados
+
+    Com readonly=True a conexão vem do pool de leitura (query_only no SQLite,
+    réplica ou sessão read-only no PostgreSQL) e não há commit no final.
+    Com DB_WRITE_SERIALIZATION habilitado, as escritas passam pelo escritor
+    único do worker (group commit); serializar=False usa o pool diretamente,
+    para quem controla as próprias transações (migrações). Funções agendadas
+    com apos_commit rodam depois do COMMIT.
+    """
+    if not readonly and serializar and _writer is not None:
+        aninhada = _writer.em_transacao()
+        _abrir_apos_commit()
+        confirmada = False
+        try:
+            with _writer.transacao() as conn:
+                db = instrumentar(conn, DIALECT)
+                try:
+                    yield db
+                finally:
+                    if db is not conn:
+                        db.finalizar()
+            confirmada = True
+        finally:
+            _fechar_apos_commit(confirmada, aninhada)
+        return
+
+    pool = _read_pool if readonly else _pool
+    conn = pool.acquire()
+    db = instrumentar(conn, DIALECT)
+    if not readonly:
+        _abrir_apos_commit()
+    confirmada = False
     try:
-        yield conn
-        conn.commit()
+        yield db
+        if not readonly:
+            conn.commit()
+            confirmada = True
     except Exception as e:
-        conn.rollback()
+        if not readonly:
+            conn.rollback()
         raise e
     finally:
-        conn.close()
+        if db is not conn:
+            db.finalizar()
+        pool.release(conn)
+        if not readonly:
+            _fechar_apos_commit(confirmada)
 
-def init_db():
-    """Inicializa o banco de dados com todas as tabelas"""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        
-        # Tabela de usuários
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS usuarios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                email TEXT UNIQUE NOT NULL,
-                senha_hash TEXT NOT NULL,
-                perfil TEXT DEFAULT 'usuario',
-                ativo BOOLEAN DEFAULT 1,
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de ingredientes
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ingredientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome TEXT NOT NULL,
-                unidade_medida TEXT NOT NULL,
-                custo_unitario REAL NOT NULL,
-                estoque_atual REAL DEFAULT 0,
-                estoque_minimo REAL DEFAULT 0,
-                fornecedor TEXT,
-                ativo BOOLEAN DEFAULT 1,
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de fichas técnicas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS fichas_tecnicas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                nome_prato TEXT NOT NULL,
-                categoria TEXT,
-                descricao TEXT,
-                porcoes INTEGER DEFAULT 1,
-                tempo_preparo INTEGER,
-                modo_preparo TEXT,
-                validade_horas INTEGER,
-                custo_total REAL DEFAULT 0,
-                preco_venda REAL DEFAULT 0,
-                margem_lucro REAL DEFAULT 0,
-                ativo BOOLEAN DEFAULT 1,
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de ingredientes das fichas técnicas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS ficha_ingredientes (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ficha_id INTEGER NOT NULL,
-                ingrediente_id INTEGER NOT NULL,
-                quantidade_gramas REAL NOT NULL,
-                custo_parcial REAL DEFAULT 0,
-                FOREIGN KEY (ficha_id) REFERENCES fichas_tecnicas(id) ON DELETE CASCADE,
-                FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id)
-            )
-        ''')
-        
-        # Tabela de inventário
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS inventario (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data_inventario DATE NOT NULL,
-                ingrediente_id INTEGER NOT NULL,
-                quantidade_sistema REAL NOT NULL,
-                quantidade_fisica REAL,
-                diferenca REAL,
-                observacoes TEXT,
-                editavel BOOLEAN DEFAULT 1,
-                usuario_id INTEGER,
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-            )
-        ''')
-        
-        # Tabela de movimentações de estoque
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS movimentacoes_estoque (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                ingrediente_id INTEGER NOT NULL,
-                tipo TEXT NOT NULL,
-                quantidade REAL NOT NULL,
-                data_movimentacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                usuario_id INTEGER,
-                observacao TEXT,
-                FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-            )
-        ''')
-        
-        # Tabela de cardápios
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cardapios (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                data DATE NOT NULL,
-                nome TEXT NOT NULL,
-                descricao TEXT,
-                ativo BOOLEAN DEFAULT 1,
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Tabela de pratos do cardápio
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS cardapio_pratos (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                cardapio_id INTEGER NOT NULL,
-                ficha_tecnica_id INTEGER NOT NULL,
-                disponivel BOOLEAN DEFAULT 1,
-                ordem INTEGER DEFAULT 0,
-                FOREIGN KEY (cardapio_id) REFERENCES cardapios(id) ON DELETE CASCADE,
-                FOREIGN KEY (ficha_tecnica_id) REFERENCES fichas_tecnicas(id)
-            )
-        ''')
-        
-        # Tabela de mesas
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS mesas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                numero INTEGER UNIQUE NOT NULL,
-                qrcode_url TEXT,
-                cardapio_id INTEGER,
-                ativo BOOLEAN DEFAULT 1,
-                criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (cardapio_id) REFERENCES cardapios(id)
-            )
-        ''')
-        
-        # Tabela de vendas
+_cursores_nomeados = itertools.count()
+
+
+def cursor_em_lotes(conn):
+    """Cursor para ler resultados grandes aos poucos, com fetchmany
+
+    No PostgreSQL é um cursor nomeado (server-side), para que o resultado não
+    seja carregado inteiro na memória do worker; no SQLite as linhas já são
+    lidas sob demanda.
+    """
+    if DIALECT == 'postgres':
+        return conn.cursor(nome=f'silvess_lotes_{next(_cursores_nomeados)}')
+    return conn.cursor()
+
+def tabela_existe(cursor, nome):
+    """Verifica se uma tabela existe no banco"""
+    if DIALECT == 'postgres':
+        cursor.execute('SELECT to_regclass(?) IS NOT NULL AS existe', (nome,))
+    else:
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS vendas (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                mesa_id INTEGER,
-                ficha_tecnica_id INTEGER NOT NULL,
-                quantidade INTEGER NOT NULL,
-                valor_unitario REAL NOT NULL,
-                valor_total REAL NOT NULL,
-                data_venda TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                usuario_id INTEGER,
-                FOREIGN KEY (mesa_id) REFERENCES mesas(id),
-                FOREIGN KEY (ficha_tecnica_id) REFERENCES fichas_tecnicas(id),
-                FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
-            )
-        ''')
-        
-        conn.commit()
-        print("Banco de dados inicializado com sucesso!")
+            SELECT COUNT(*) > 0 AS existe FROM sqlite_master
+            WHERE type = 'table' AND name = ?
+        ''', (nome,))
+    return bool(cursor.fetchone()['existe'])
+
+def iniciar_transacao_exclusiva(conn):
+    """Abre uma transação que bloqueia outros escritores até o commit"""
+    if DIALECT == 'postgres':
+        # Lock consultivo liberado automaticamente no fim da transação
+        conn.execute('SELECT pg_advisory_xact_lock(?)', (0x5115E55,))
+    else:
+        conn.execute('BEGIN IMMEDIATE')
+
+def init_db():
+    """Inicializa o banco de dados aplicando as migrações pendentes"""
+    from models.migrations import aplicar_migracoes
+
+    aplicadas = aplicar_migracoes()
+    if aplicadas:
+        print(f"Banco de dados inicializado com sucesso! ({len(aplicadas)} migrações aplicadas)")
+    else:
+        print("Banco de dados já está atualizado")
 
 if __name__ == '__main__':
     init_db()
@@ -0,0 +1,127 @@
+import threading
+from collections import OrderedDict
+from models.database import get_db
+from models.estatisticas import obter_versoes
+
+# Limites da curva ABC (participação acumulada)
+LIMITE_ABC_A = 0.80
+LIMITE_ABC_B = 0.95
+
+# Popularidade alta: participação no mix >= 70% da participação média (Kasavana & Smith)
+FATOR_POPULARIDADE = 0.70
+
+# Critérios aceitos para a curva ABC
+CRITERIOS_ABC = ('valor_total', 'margem_total', 'quantidade')
+
+QUADRANTES = {
+    (True, True): 'estrela',
+    (True, False): 'burro_de_carga',
+    (False, True): 'quebra_cabeca',
+    (False, False): 'cao'
+}
+
+# Resultados por (data_inicio, data_fim, criterio), válidos enquanto as
+# versões de vendas e fichas_tecnicas não mudarem
+CACHE_MAX_PERIODOS = 32
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _carregar_pratos(data_inicio, data_fim):
+    """Totais do período por prato, em uma única consulta sobre o rollup diário"""
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT
+                ft.id as ficha_tecnica_id,
+                ft.nome_prato,
+                ft.categoria,
+                ft.preco_venda,
+                ft.custo_total as custo_unitario,
+                COALESCE(SUM(r.quantidade), 0) as quantidade,
+                COALESCE(SUM(r.valor_total), 0) as valor_total
+            FROM fichas_tecnicas ft
+            LEFT JOIN vendas_diarias_prato r
+                ON r.ficha_tecnica_id = ft.id AND r.dia >= ? AND r.dia <= ?
+            WHERE ft.ativo = 1 OR r.ficha_tecnica_id IS NOT NULL
+            GROUP BY ft.id
+        ''', (data_inicio, data_fim))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+def _classificar(pratos, criterio):
+    """Calcula margem, quadrante e classe ABC de cada prato"""
+    quantidade_total = sum(p['quantidade'] for p in pratos)
+    for p in pratos:
+        custo_unitario = p['custo_unitario'] or 0
+        p['custo_total'] = p['quantidade'] * custo_unitario
+        p['margem_total'] = p['valor_total'] - p['custo_total']
+        if p['quantidade']:
+            p['margem_unitaria'] = p['margem_total'] / p['quantidade']
+        else:
+            p['margem_unitaria'] = (p['preco_venda'] or 0) - custo_unitario
+        p['mix_percentual'] = p['quantidade'] / quantidade_total * 100 if quantidade_total else 0
+
+    margem_media = sum(p['margem_total'] for p in pratos) / quantidade_total if quantidade_total else 0
+    limite_popularidade = 100 / len(pratos) * FATOR_POPULARIDADE if pratos else 0
+
+    for p in pratos:
+        p['popularidade'] = 'alta' if p['mix_percentual'] >= limite_popularidade else 'baixa'
+        p['rentabilidade'] = 'alta' if p['margem_unitaria'] >= margem_media else 'baixa'
+        p['quadrante'] = QUADRANTES[(p['popularidade'] == 'alta', p['rentabilidade'] == 'alta')]
+
+    # Curva ABC: pratos em ordem decrescente do critério
+    pratos.sort(key=lambda p: p[criterio], reverse=True)
+    total = sum(max(p[criterio], 0) for p in pratos)
+    acumulado = 0
+    for p in pratos:
+        anterior = acumulado / total if total else 1
+        acumulado += max(p[criterio], 0)
+        p['participacao_acumulada'] = acumulado / total * 100 if total else 0
+        # A classe é definida pela participação acumulada antes do prato
+        if total and anterior < LIMITE_ABC_A:
+            p['classe_abc'] = 'A'
+        elif total and anterior < LIMITE_ABC_B:
+            p['classe_abc'] = 'B'
+        else:
+            p['classe_abc'] = 'C'
+
+    return {
+        'margem_media': margem_media,
+        'limite_popularidade': limite_popularidade
+    }
+
+
+def analisar_cardapio(data_inicio, data_fim, criterio='valor_total'):
+    """Retorna (parametros, pratos classificados) do período, usando o cache"""
+    versoes = obter_versoes()
+    chave = (data_inicio, data_fim, criterio)
+    validade = (versoes.get('vendas'), versoes.get('fichas_tecnicas'))
+
+    with _lock:
+        item = _cache.get(chave)
+        if item is not None and item[0] == validade:
+            _cache.move_to_end(chave)
+            return item[1], item[2]
+
+    pratos = _carregar_pratos(data_inicio, data_fim)
+    parametros = _classificar(pratos, criterio)
+
+    with _lock:
+        _cache[chave] = (validade, parametros, pratos)
+        _cache.move_to_end(chave)
+        while len(_cache) > CACHE_MAX_PERIODOS:
+            _cache.popitem(last=False)
+    return parametros, pratos
+
+
+def resumir(pratos):
+    """Totais e contagem por quadrante/classe de uma lista de pratos"""
+    return {
+        'pratos': len(pratos),
+        'quantidade_total': sum(p['quantidade'] for p in pratos),
+        'valor_total': sum(p['valor_total'] for p in pratos),
+        'margem_total': sum(p['margem_total'] for p in pratos),
+        'quadrantes': {q: sum(1 for p in pratos if p['quadrante'] == q) for q in QUADRANTES.values()},
+        'classes_abc': {c: sum(1 for p in pratos if p['classe_abc'] == c) for c in 'ABC'}
+    }
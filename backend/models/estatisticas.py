@@ -0,0 +1,141 @@
+import hashlib
+import os
+import threading
+import time
+from flask import after_this_request, has_request_context
+from models.database import get_db
+
+# Intervalo (s) em que as versões das tabelas são reaproveitadas sem consultar
+# o banco. Escritas no próprio worker invalidam na hora; escritas de outros
+# workers aparecem em até STATS_REVALIDAR_S segundos.
+STATS_REVALIDAR_S = float(os.environ.get('STATS_REVALIDAR_S', 2))
+
+# Tabelas com contador de versão em versoes_tabelas
+TABELAS_VERSIONADAS = ('ingredientes', 'fichas_tecnicas', 'mesas', 'cardapios', 'vendas')
+
+# Partes do /api/dashboard/stats: parte -> (tabela de que depende, [(campo, subconsulta)])
+# As subconsultas de uma parte recebem os mesmos parâmetros (ver chaves_estatisticas)
+PARTES = {
+    'ingredientes': ('ingredientes', [
+        ('total', 'SELECT COUNT(*) FROM ingredientes WHERE ativo = 1'),
+        # Conjunto de alertas abertos, mantido pelas escritas de estoque
+        ('estoque_baixo', 'SELECT COUNT(*) FROM alertas_estoque WHERE fim IS NULL')
+    ]),
+    'fichas_tecnicas': ('fichas_tecnicas', [
+        ('total', 'SELECT COUNT(*) FROM fichas_tecnicas WHERE ativo = 1')
+    ]),
+    'mesas': ('mesas', [
+        ('total', 'SELECT COUNT(*) FROM mesas WHERE ativo = 1')
+    ]),
+    'cardapios': ('cardapios', [
+        ('total', 'SELECT COUNT(*) FROM cardapios WHERE ativo = 1')
+    ]),
+    'vendas_mes': ('vendas', [
+        ('total', 'SELECT COALESCE(SUM(total_vendas), 0) FROM vendas_diarias_prato WHERE dia >= ?'),
+        ('valor_total', 'SELECT COALESCE(SUM(valor_total), 0) FROM vendas_diarias_prato WHERE dia >= ?')
+    ]),
+    'vendas_hoje': ('vendas', [
+        ('total', 'SELECT COALESCE(SUM(total_vendas), 0) FROM vendas_diarias_prato WHERE dia = ?'),
+        ('valor_total', 'SELECT COALESCE(SUM(valor_total), 0) FROM vendas_diarias_prato WHERE dia = ?')
+    ])
+}
+
+_lock = threading.Lock()
+_versoes = None
+_versoes_lidas_em = 0.0
+_partes = {}  # parte -> (chave, valores)
+
+
+def criar_tabela_versoes(cursor):
+    """Cria versoes_tabelas com uma linha por tabela versionada"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS versoes_tabelas (
+            tabela TEXT PRIMARY KEY,
+            versao INTEGER NOT NULL DEFAULT 0
+        )
+    ''')
+    cursor.executemany(
+        'INSERT OR IGNORE INTO versoes_tabelas (tabela, versao) VALUES (?, 0)',
+        [(tabela,) for tabela in TABELAS_VERSIONADAS]
+    )
+
+
+def _descartar_versoes(response=None):
+    global _versoes
+    with _lock:
+        _versoes = None
+    return response
+
+
+def registrar_alteracao(cursor, *tabelas):
+    """Incrementa a versão das tabelas alteradas, na transação corrente"""
+    cursor.executemany(
+        'UPDATE versoes_tabelas SET versao = versao + 1 WHERE tabela = ?',
+        [(tabela,) for tabela in tabelas]
+    )
+    _descartar_versoes()
+    if has_request_context():
+        # Descarta de novo após o COMMIT, caso uma leitura concorrente tenha
+        # recarregado as versões antigas nesse meio tempo
+        after_this_request(_descartar_versoes)
+
+
+def obter_versoes():
+    """Retorna {tabela: versao}, consultando o banco no máximo a cada STATS_REVALIDAR_S"""
+    global _versoes, _versoes_lidas_em
+    with _lock:
+        if _versoes is not None and time.monotonic() - _versoes_lidas_em < STATS_REVALIDAR_S:
+            return _versoes
+
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT tabela, versao FROM versoes_tabelas')
+        versoes = {row['tabela']: row['versao'] for row in cursor.fetchall()}
+
+    with _lock:
+        _versoes = versoes
+        _versoes_lidas_em = time.monotonic()
+    return versoes
+
+
+def chaves_estatisticas(parametros):
+    """Retorna a chave de cache de cada parte: (versão da tabela, parâmetros)"""
+    versoes = obter_versoes()
+    return {
+        parte: (versoes.get(tabela, 0), tuple(parametros.get(parte, ())))
+        for parte, (tabela, _) in PARTES.items()
+    }
+
+
+def etag_estatisticas(chaves):
+    """ETag derivada das chaves de todas as partes"""
+    return hashlib.sha1(repr(sorted(chaves.items())).encode()).hexdigest()[:20]
+
+
+def obter_estatisticas(chaves):
+    """Retorna {parte: {campo: valor}}, recalculando só as partes desatualizadas"""
+    with _lock:
+        valores = {parte: _partes[parte][1] for parte in PARTES
+                   if parte in _partes and _partes[parte][0] == chaves[parte]}
+    pendentes = [parte for parte in PARTES if parte not in valores]
+
+    if pendentes:
+        # Todas as partes desatualizadas em uma única consulta
+        colunas = []
+        params = []
+        for parte in pendentes:
+            for campo, subconsulta in PARTES[parte][1]:
+                colunas.append(f'({subconsulta}) AS {parte}__{campo}')
+                params.extend(chaves[parte][1])
+
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT ' + ', '.join(colunas), params)
+            row = cursor.fetchone()
+
+        with _lock:
+            for parte in pendentes:
+                valores[parte] = {campo: row[f'{parte}__{campo}'] for campo, _ in PARTES[parte][1]}
+                _partes[parte] = (chaves[parte], valores[parte])
+
+    return {parte: valores[parte] for parte in PARTES}
@@ -0,0 +1,124 @@
+from models.alertas_estoque import registrar_estoque_alterado
+from models.custos import registrar_custos
+from models.estatisticas import registrar_alteracao
+
+# Folga para arredondamento de ponto flutuante na regra de estoque não negativo
+TOLERANCIA_ESTOQUE = 1e-9
+
+
+class EstoqueInsuficiente(Exception):
+    """Saída maior que o estoque de um ou mais ingredientes
+
+    `itens` traz, por ingrediente, o estoque atual e a quantidade pedida.
+    Levantada dentro do `with get_db()`, desfaz toda a transação.
+    """
+
+    def __init__(self, itens):
+        super().__init__('Estoque insuficiente')
+        self.itens = itens
+
+
+class IngredienteNaoEncontrado(LookupError):
+    def __init__(self, ids):
+        super().__init__('Ingrediente não encontrado')
+        self.ids = ids
+
+
+def movimentar_estoque(cursor, movimentos, usuario_id):
+    """Aplica movimentações de estoque e grava o livro, na transação corrente
+
+    `movimentos` é uma lista de (ingrediente_id, tipo, quantidade,
+    observacao, custo_unitario), com tipo 'entrada' ou 'saida'; o custo
+    (None se não informado) alimenta o custo médio. O saldo de
+    cada ingrediente é aplicado com um único UPDATE relativo e condicional
+    (`estoque_atual + delta >= 0`), que devolve o estoque novo com
+    RETURNING: não há leitura seguida de escrita, então escritores
+    concorrentes não perdem atualizações. Se algum ingrediente não tiver
+    estoque suficiente, levanta EstoqueInsuficiente e nada é gravado.
+
+    Retorna {ingrediente_id: (estoque anterior, estoque novo)}.
+    """
+    deltas = {}
+    for ingrediente_id, tipo, quantidade, _, _ in movimentos:
+        if tipo not in ('entrada', 'saida'):
+            raise ValueError('Tipo deve ser entrada ou saida')
+        sinal = 1 if tipo == 'entrada' else -1
+        deltas[ingrediente_id] = deltas.get(ingrediente_id, 0) + sinal * quantidade
+
+    saldos = {}
+    falhas = []
+    # Ordem fixa de ids: transações concorrentes travam as linhas na mesma ordem
+    for ingrediente_id in sorted(deltas):
+        delta = deltas[ingrediente_id]
+        cursor.execute('''
+            UPDATE ingredientes
+            SET estoque_atual = estoque_atual + ?,
+                atualizado_em = CURRENT_TIMESTAMP
+            WHERE id = ? AND (? >= 0 OR estoque_atual + ? >= ?)
+            RETURNING estoque_atual
+        ''', (delta, ingrediente_id, delta, delta, -TOLERANCIA_ESTOQUE))
+        linhas = cursor.fetchall()
+        if linhas:
+            novo = linhas[0]['estoque_atual']
+            saldos[ingrediente_id] = (novo - delta, novo)
+        else:
+            falhas.append(ingrediente_id)
+
+    if falhas:
+        marcadores = ', '.join('?' * len(falhas))
+        cursor.execute(f'''
+            SELECT id, nome, estoque_atual FROM ingredientes WHERE id IN ({marcadores})
+        ''', falhas)
+        existentes = {row['id']: row for row in cursor.fetchall()}
+        ausentes = [i for i in falhas if i not in existentes]
+        if ausentes:
+            raise IngredienteNaoEncontrado(ausentes)
+        raise EstoqueInsuficiente([
+            {
+                'ingrediente_id': ingrediente_id,
+                'nome': existentes[ingrediente_id]['nome'],
+                'estoque_atual': existentes[ingrediente_id]['estoque_atual'],
+                'quantidade': -deltas[ingrediente_id]
+            }
+            for ingrediente_id in falhas
+        ])
+
+    # Custo médio (e FIFO) atualizado pelas entradas; custo de cada movimento no livro
+    custos = registrar_custos(cursor, movimentos, saldos)
+
+    cursor.executemany('''
+        INSERT INTO movimentacoes_estoque
+        (ingrediente_id, tipo, quantidade, custo_unitario, usuario_id, observacao)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (ingrediente_id, tipo, quantidade, custo, usuario_id, observacao)
+        for (ingrediente_id, tipo, quantidade, observacao, _), custo in zip(movimentos, custos)
+    ])
+
+    registrar_alteracao(cursor, 'ingredientes')
+    registrar_estoque_alterado(cursor, deltas)
+    return saldos
+
+
+def conferir_livro(cursor):
+    """Ingredientes cujo estoque difere da soma das movimentações do livro
+
+    Retorna uma lista de dicts com estoque_atual, saldo_livro e diferença.
+    """
+    cursor.execute('''
+        SELECT
+            i.id,
+            i.nome,
+            i.estoque_atual,
+            COALESCE(SUM(CASE WHEN m.tipo = 'entrada' THEN m.quantidade ELSE -m.quantidade END), 0) AS saldo_livro
+        FROM ingredientes i
+        LEFT JOIN movimentacoes_estoque m ON m.ingrediente_id = i.id
+        GROUP BY i.id, i.nome, i.estoque_atual
+        ORDER BY i.id
+    ''')
+    divergentes = []
+    for row in cursor.fetchall():
+        diferenca = (row['estoque_atual'] or 0) - row['saldo_livro']
+        if abs(diferenca) > 1e-6:
+            divergentes.append({**dict(row), 'diferenca': diferenca})
+    return divergentes
@@ -0,0 +1,194 @@
+from datetime import datetime, timedelta
+from models.custos import custo_em_sql
+from models.database import DIALECT, get_db
+from utils.periodos import parse_data
+
+# Efeito de uma movimentação no estoque
+SALDO_MOVIMENTACAO = "CASE WHEN tipo = 'entrada' THEN quantidade ELSE -quantidade END"
+
+FORMATO_TIMESTAMP = '%Y-%m-%d %H:%M:%S'
+
+
+def criar_tabela_snapshots(cursor):
+    """Cria a tabela com o estoque de fechamento de cada dia por ingrediente"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS estoque_diario (
+            dia DATE NOT NULL,
+            ingrediente_id INTEGER NOT NULL,
+            estoque REAL NOT NULL,
+            PRIMARY KEY (dia, ingrediente_id)
+        )
+    ''')
+
+
+def _hoje():
+    # data_movimentacao é gravada em UTC (CURRENT_TIMESTAMP)
+    return datetime.utcnow().date()
+
+
+def registrar_snapshots(cursor):
+    """Grava o fechamento dos dias ainda sem snapshot, até ontem (UTC)
+
+    Movimentações são sempre registradas com o horário atual, então o
+    fechamento de um dia passado não muda mais. Os dias pendentes são
+    calculados de trás para frente a partir do estoque atual, com uma
+    única consulta das movimentações agrupadas por ingrediente e dia.
+
+    O livro e o estoque atual precisam ser lidos no mesmo estado: chamar
+    dentro de uma transação aberta com iniciar_transacao_exclusiva (como
+    fazem a migração e `flask db snapshot-stock`). Retorna o número de
+    dias gravados.
+    """
+    if DIALECT == 'postgres':
+        # Em READ COMMITTED cada SELECT vê um estado diferente: o lock barra
+        # novas movimentações (que também alteram o estoque) até o COMMIT
+        cursor.execute('LOCK TABLE movimentacoes_estoque IN SHARE MODE')
+
+    ontem = _hoje() - timedelta(days=1)
+
+    cursor.execute('SELECT MAX(dia) AS dia FROM estoque_diario')
+    ultimo = cursor.fetchone()['dia']
+    if ultimo is not None:
+        inicio = parse_data(str(ultimo)[:10]) + timedelta(days=1)
+    else:
+        # Primeira execução: histórico completo desde a primeira movimentação
+        cursor.execute('SELECT MIN(data_movimentacao) AS inicio FROM movimentacoes_estoque')
+        primeira = cursor.fetchone()['inicio']
+        inicio = parse_data(str(primeira)[:10]) if primeira else ontem
+    if inicio > ontem:
+        return 0
+
+    cursor.execute(f'''
+        SELECT ingrediente_id, DATE(data_movimentacao) AS dia, SUM({SALDO_MOVIMENTACAO}) AS saldo
+        FROM movimentacoes_estoque
+        WHERE data_movimentacao >= ?
+        GROUP BY ingrediente_id, DATE(data_movimentacao)
+    ''', (inicio.isoformat(),))
+    saldos = {}  # dia -> {ingrediente_id: saldo do dia}
+    for row in cursor.fetchall():
+        saldos.setdefault(str(row['dia'])[:10], {})[row['ingrediente_id']] = row['saldo']
+
+    cursor.execute('SELECT id, estoque_atual FROM ingredientes')
+    estoque = {row['id']: row['estoque_atual'] or 0 for row in cursor.fetchall()}
+
+    # Desfaz as movimentações de hoje para chegar ao fechamento de ontem
+    for dia, por_ingrediente in saldos.items():
+        if dia > ontem.isoformat():
+            for ingrediente_id, saldo in por_ingrediente.items():
+                estoque[ingrediente_id] = estoque.get(ingrediente_id, 0) - saldo
+
+    linhas = []
+    dia = ontem
+    while dia >= inicio:
+        chave = dia.isoformat()
+        linhas.extend((chave, ingrediente_id, round(valor, 6)) for ingrediente_id, valor in estoque.items())
+        for ingrediente_id, saldo in saldos.get(chave, {}).items():
+            estoque[ingrediente_id] = estoque.get(ingrediente_id, 0) - saldo
+        dia -= timedelta(days=1)
+
+    cursor.executemany('''
+        INSERT OR IGNORE INTO estoque_diario (dia, ingrediente_id, estoque)
+        VALUES (?, ?, ?)
+    ''', linhas)
+    return (ontem - inicio).days + 1
+
+
+def ler_momento(valor):
+    """Converte `data` (YYYY-MM-DD ou YYYY-MM-DD HH:MM[:SS], UTC) no fim exclusivo
+
+    Uma data sozinha representa o fechamento do dia. ValueError se inválida.
+    """
+    if not valor:
+        raise ValueError('Parâmetro data é obrigatório')
+    texto = valor.strip().replace('T', ' ')
+    if len(texto) == 10:
+        return datetime.combine(parse_data(texto) + timedelta(days=1), datetime.min.time())
+    for formato in (FORMATO_TIMESTAMP, '%Y-%m-%d %H:%M'):
+        try:
+            momento = datetime.strptime(texto, formato)
+        except ValueError:
+            continue
+        # Timestamps têm resolução de segundos: inclui o próprio segundo
+        return momento + timedelta(seconds=1)
+    raise ValueError('Data inválida. Use YYYY-MM-DD ou YYYY-MM-DD HH:MM:SS')
+
+
+def estoque_em(fim, ingrediente_id=None):
+    """Estoque dos ingredientes no instante `fim` (exclusivo, UTC)
+
+    Parte do snapshot mais próximo antes do instante e soma as
+    movimentações desde então; sem snapshot anterior, parte do primeiro
+    snapshot seguinte (ou do estoque atual) e desfaz as movimentações
+    posteriores. Somente leitura: os snapshots são gravados pelo job diário
+    `flask db snapshot-stock`; sem ele a consulta continua correta, apenas
+    percorre mais movimentações. Cada ingrediente traz também o custo médio vigente no
+    instante (histórico de custos). Retorna (base, lista de ingredientes).
+    """
+    # Último dia cujo fechamento é anterior ao instante
+    limite = fim.date() - timedelta(days=1)
+
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+
+        cursor.execute('SELECT MAX(dia) AS dia FROM estoque_diario WHERE dia <= ?', (limite.isoformat(),))
+        anterior = cursor.fetchone()['dia']
+        posterior = None
+        if anterior is None:
+            cursor.execute('SELECT MIN(dia) AS dia FROM estoque_diario WHERE dia > ?', (limite.isoformat(),))
+            posterior = cursor.fetchone()['dia']
+
+        fim_texto = fim.strftime(FORMATO_TIMESTAMP)
+        if anterior is not None:
+            dia = str(anterior)[:10]
+            base = {'tipo': 'snapshot', 'dia': dia}
+            estoque_base = 's.estoque'
+            sinal = '+'
+            intervalo = ((parse_data(dia) + timedelta(days=1)).isoformat(), fim_texto)
+        elif posterior is not None:
+            dia = str(posterior)[:10]
+            base = {'tipo': 'snapshot', 'dia': dia}
+            estoque_base = 's.estoque'
+            sinal = '-'
+            intervalo = (fim_texto, (parse_data(dia) + timedelta(days=1)).isoformat())
+        else:
+            dia = None
+            base = {'tipo': 'estoque_atual', 'dia': None}
+            estoque_base = 'i.estoque_atual'
+            sinal = '-'
+            intervalo = (fim_texto, '9999-12-31')
+
+        filtro = ''
+        params = [fim_texto, dia, intervalo[0], intervalo[1], fim_texto]
+        if ingrediente_id is not None:
+            filtro = 'AND i.id = ?'
+            params.append(ingrediente_id)
+
+        cursor.execute(f'''
+            SELECT
+                i.id,
+                i.nome,
+                i.unidade_medida,
+                i.estoque_atual,
+                i.ativo,
+                COALESCE({estoque_base}, 0) {sinal} COALESCE(m.saldo, 0) AS estoque,
+                {custo_em_sql('i')} AS custo_medio,
+                COALESCE(m.movimentacoes, 0) AS movimentacoes
+            FROM ingredientes i
+            LEFT JOIN estoque_diario s ON s.ingrediente_id = i.id AND s.dia = ?
+            LEFT JOIN (
+                SELECT ingrediente_id, SUM({SALDO_MOVIMENTACAO}) AS saldo, COUNT(*) AS movimentacoes
+                FROM movimentacoes_estoque
+                WHERE data_movimentacao >= ? AND data_movimentacao < ?
+                GROUP BY ingrediente_id
+            ) m ON m.ingrediente_id = i.id
+            WHERE i.criado_em < ? {filtro}
+            ORDER BY i.nome
+        ''', params)
+        ingredientes = [dict(row) for row in cursor.fetchall()]
+
+    for ing in ingredientes:
+        ing['estoque'] = round(ing['estoque'], 6)
+        # Custo por kg, como em relatorio_estoque
+        ing['valor_estoque'] = ing['estoque'] * (ing['custo_medio'] or 0) / 1000
+    base['movimentacoes'] = sum(ing['movimentacoes'] for ing in ingredientes)
+    return base, ingredientes
@@ -0,0 +1,243 @@
+import json
+import os
+import queue
+import threading
+import time
+from flask import after_this_request, has_request_context
+from models.database import get_db
+
+# Intervalo (s) máximo entre leituras da tabela de eventos por worker. Eventos
+# gravados no próprio worker acordam o distribuidor na hora.
+SSE_POLL_S = float(os.environ.get('SSE_POLL_S', 1))
+
+# Comentário enviado periodicamente para manter a conexão viva em proxies
+SSE_HEARTBEAT_S = 15
+
+# Duração máxima (s) de uma conexão; o EventSource reconecta sozinho e
+# retoma do último evento recebido (header Last-Event-ID)
+SSE_DURACAO_MAX_S = 300
+
+# Conexões SSE simultâneas por worker (cada uma ocupa uma thread do gunicorn)
+SSE_MAX_CLIENTES = int(os.environ.get('SSE_MAX_CLIENTES', 20))
+
+# Eventos não entregues acumulados por cliente antes de desconectá-lo
+SSE_FILA_MAX = 1000
+
+# Eventos mantidos na tabela para retomada após reconexão
+EVENTOS_RETIDOS = 1000
+
+# Tempo (s) que um id pulado é aguardado antes de ser dado como descartado
+# (transação mais antiga ainda aberta ou revertida, no PostgreSQL)
+LACUNA_MAX_S = 5
+
+TAMANHO_LOTE_EVENTOS = 500
+
+
+def criar_tabela_eventos(cursor):
+    """Cria a tabela de eventos do dashboard (deltas publicados pelas escritas)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS eventos_dashboard (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tipo TEXT NOT NULL,
+            dados TEXT NOT NULL,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def publicar(cursor, tipo, dados):
+    """Grava um evento na transação corrente; só é distribuído após o COMMIT"""
+    cursor.execute(
+        'INSERT INTO eventos_dashboard (tipo, dados) VALUES (?, ?)',
+        (tipo, json.dumps(dados, ensure_ascii=False, default=str))
+    )
+    evento_id = cursor.lastrowid
+    if evento_id and evento_id % 100 == 0:
+        cursor.execute('DELETE FROM eventos_dashboard WHERE id <= ?', (evento_id - EVENTOS_RETIDOS,))
+    if has_request_context():
+        after_this_request(_acordar_distribuidor)
+    return evento_id
+
+
+def _formatar(row):
+    """Mensagem SSE pronta, montada uma vez e enviada a todos os clientes"""
+    return f'id: {row["id"]}\nevent: {row["tipo"]}\ndata: {row["dados"]}\n\n'
+
+
+class _Assinante:
+    def __init__(self):
+        self.fila = queue.Queue(maxsize=SSE_FILA_MAX)
+        # Eventos retomados da tabela na reconexão, enviados antes da fila
+        self.anteriores = []
+        self.descartado = False
+
+
+class Distribuidor:
+    """Lê os eventos novos uma vez por worker e repassa a todos os assinantes
+
+    A tabela só é consultada enquanto há clientes conectados neste worker,
+    com no máximo uma consulta por SSE_POLL_S, independentemente do número
+    de clientes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._assinantes = set()
+        self._acordar = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._ultimo_id = None
+        self._lacunas = {}  # id pulado -> instante em que foi notado
+
+    def assinantes(self):
+        with self._lock:
+            return len(self._assinantes)
+
+    def acordar(self):
+        self._acordar.set()
+
+    def inscrever(self, ultimo_id=None):
+        """Registra um cliente; retorna None se o limite do worker foi atingido
+
+        Com `ultimo_id` (reconexão), os eventos posteriores ainda retidos
+        na tabela são enviados antes dos novos. As consultas ao banco são
+        feitas fora do lock, sem travar a distribuição aos demais clientes.
+        """
+        maior_id = None
+        while True:
+            with self._lock:
+                if len(self._assinantes) >= SSE_MAX_CLIENTES:
+                    return None
+                if not self._assinantes and maior_id is not None:
+                    # Primeiro cliente do worker: parte do último evento gravado
+                    self._ultimo_id = maior_id
+                    self._lacunas = {}
+                if self._assinantes or maior_id is not None:
+                    assinante = _Assinante()
+                    self._assinantes.add(assinante)
+                    # Daqui em diante o distribuidor entrega na fila; o que
+                    # veio antes sai do histórico, exceto as lacunas, que
+                    # ainda serão entregues por ele
+                    corte = self._ultimo_id
+                    pendentes = set(self._lacunas)
+                    self._iniciar()
+                    break
+            maior_id = self._maior_id()
+
+        if ultimo_id is None or ultimo_id >= corte:
+            return assinante
+        try:
+            rows = self._ler(ultimo_id, ate=corte)
+        except Exception:
+            self.cancelar(assinante)
+            raise
+        if not rows or rows[0]['id'] > ultimo_id + 1:
+            # Eventos já removidos da tabela: o cliente recarrega tudo
+            assinante.anteriores.append('event: recarregar\ndata: {}\n\n')
+        assinante.anteriores.extend(
+            _formatar(row) for row in rows[-(SSE_FILA_MAX - 1):] if row['id'] not in pendentes
+        )
+        return assinante
+
+    def cancelar(self, assinante):
+        with self._lock:
+            self._assinantes.discard(assinante)
+
+    def _iniciar(self):
+        # A thread não sobrevive ao fork do gunicorn: recriada por processo
+        if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._executar, name='silvess-eventos', daemon=True)
+            self._thread.start()
+
+    def _maior_id(self):
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT COALESCE(MAX(id), 0) AS id FROM eventos_dashboard')
+            return cursor.fetchone()['id']
+
+    def _ler(self, depois_de, ate=None):
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            if ate is None:
+                cursor.execute('''
+                    SELECT id, tipo, dados FROM eventos_dashboard
+                    WHERE id > ? ORDER BY id LIMIT ?
+                ''', (depois_de, TAMANHO_LOTE_EVENTOS))
+            else:
+                cursor.execute('''
+                    SELECT id, tipo, dados FROM eventos_dashboard
+                    WHERE id > ? AND id <= ? ORDER BY id
+                ''', (depois_de, ate))
+            return cursor.fetchall()
+
+    def _executar(self):
+        while True:
+            self._acordar.wait(SSE_POLL_S)
+            self._acordar.clear()
+            with self._lock:
+                if not self._assinantes:
+                    continue
+            try:
+                self._distribuir()
+            except Exception as e:
+                print(f"⚠️  Falha ao distribuir eventos: {e}")
+                time.sleep(SSE_POLL_S)
+
+    def _distribuir(self):
+        with self._lock:
+            inicio = min(self._lacunas, default=self._ultimo_id + 1) - 1
+        rows = self._ler(inicio)
+
+        with self._lock:
+            agora = time.monotonic()
+            mensagens = []
+            for row in rows:
+                evento_id = row['id']
+                if evento_id > self._ultimo_id:
+                    # Ids pulados podem ser de transações ainda não confirmadas
+                    for pulado in range(self._ultimo_id + 1, evento_id):
+                        self._lacunas[pulado] = agora
+                    self._ultimo_id = evento_id
+                elif self._lacunas.pop(evento_id, None) is None:
+                    continue
+                mensagens.append(_formatar(row))
+
+            for pulado, notado_em in list(self._lacunas.items()):
+                if agora - notado_em > LACUNA_MAX_S:
+                    del self._lacunas[pulado]
+
+            for assinante in list(self._assinantes):
+                for mensagem in mensagens:
+                    try:
+                        assinante.fila.put_nowait(mensagem)
+                    except queue.Full:
+                        # Cliente lento: desconectado, reconecta e retoma pelo id
+                        assinante.descartado = True
+                        self._assinantes.discard(assinante)
+                        break
+
+        if len(rows) == TAMANHO_LOTE_EVENTOS:
+            self._acordar.set()
+
+    def gerar(self, assinante):
+        """Corpo da resposta text/event-stream de um assinante"""
+        try:
+            yield 'retry: 3000\n\n'
+            yield from assinante.anteriores
+            fim = time.monotonic() + SSE_DURACAO_MAX_S
+            while time.monotonic() < fim and not assinante.descartado:
+                try:
+                    yield assinante.fila.get(timeout=SSE_HEARTBEAT_S)
+                except queue.Empty:
+                    yield ': ping\n\n'
+        finally:
+            self.cancelar(assinante)
+
+
+distribuidor = Distribuidor()
+
+
+def _acordar_distribuidor(response):
+    distribuidor.acordar()
+    return response
@@ -0,0 +1,422 @@
+import time
+from models.database import get_db, tabela_existe, iniciar_transacao_exclusiva
+from models.rollups import criar_tabelas_rollup, reconstruir_rollups
+from models.estatisticas import criar_tabela_versoes
+from models.previsao_consumo import criar_tabela_previsao
+from models.eventos import criar_tabela_eventos
+from models.alertas_estoque import criar_tabela_alertas, reconstruir_alertas
+from models.busca import criar_indices_busca
+from models.estoque_historico import criar_tabela_snapshots, registrar_snapshots
+from models.custos import criar_tabelas_custo, iniciar_custos
+
+# Registro das migrações, em ordem de versão
+MIGRACOES = []
+
+
+def migracao(versao, descricao):
+    """Registra uma função como a migração de número `versao`"""
+    def decorator(func):
+        MIGRACOES.append((versao, descricao, func))
+        MIGRACOES.sort(key=lambda m: m[0])
+        return func
+    return decorator
+
+
+# ========== MIGRAÇÕES ==========
+
+@migracao(1, 'Tabelas iniciais')
+def _001_tabelas_iniciais(cursor):
+    # Tabela de usuários
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS usuarios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            email TEXT UNIQUE NOT NULL,
+            senha_hash TEXT NOT NULL,
+            perfil TEXT DEFAULT 'usuario',
+            ativo BOOLEAN DEFAULT 1,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabela de ingredientes
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ingredientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            unidade_medida TEXT NOT NULL,
+            custo_unitario REAL NOT NULL,
+            estoque_atual REAL DEFAULT 0,
+            estoque_minimo REAL DEFAULT 0,
+            fornecedor TEXT,
+            ativo BOOLEAN DEFAULT 1,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabela de fichas técnicas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS fichas_tecnicas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome_prato TEXT NOT NULL,
+            categoria TEXT,
+            descricao TEXT,
+            porcoes INTEGER DEFAULT 1,
+            tempo_preparo INTEGER,
+            modo_preparo TEXT,
+            validade_horas INTEGER,
+            custo_total REAL DEFAULT 0,
+            preco_venda REAL DEFAULT 0,
+            margem_lucro REAL DEFAULT 0,
+            ativo BOOLEAN DEFAULT 1,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabela de ingredientes das fichas técnicas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS ficha_ingredientes (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ficha_id INTEGER NOT NULL,
+            ingrediente_id INTEGER NOT NULL,
+            quantidade_gramas REAL NOT NULL,
+            custo_parcial REAL DEFAULT 0,
+            FOREIGN KEY (ficha_id) REFERENCES fichas_tecnicas(id) ON DELETE CASCADE,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id)
+        )
+    ''')
+    
+    # Tabela de inventário
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS inventario (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data_inventario DATE NOT NULL,
+            ingrediente_id INTEGER NOT NULL,
+            quantidade_sistema REAL NOT NULL,
+            quantidade_fisica REAL,
+            diferenca REAL,
+            observacoes TEXT,
+            editavel BOOLEAN DEFAULT 1,
+            usuario_id INTEGER,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+        )
+    ''')
+    
+    # Tabela de movimentações de estoque
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS movimentacoes_estoque (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ingrediente_id INTEGER NOT NULL,
+            tipo TEXT NOT NULL,
+            quantidade REAL NOT NULL,
+            data_movimentacao TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            usuario_id INTEGER,
+            observacao TEXT,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+        )
+    ''')
+    
+    # Tabela de cardápios
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cardapios (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            data DATE NOT NULL,
+            nome TEXT NOT NULL,
+            descricao TEXT,
+            ativo BOOLEAN DEFAULT 1,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            atualizado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    
+    # Tabela de pratos do cardápio
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS cardapio_pratos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            cardapio_id INTEGER NOT NULL,
+            ficha_tecnica_id INTEGER NOT NULL,
+            disponivel BOOLEAN DEFAULT 1,
+            ordem INTEGER DEFAULT 0,
+            FOREIGN KEY (cardapio_id) REFERENCES cardapios(id) ON DELETE CASCADE,
+            FOREIGN KEY (ficha_tecnica_id) REFERENCES fichas_tecnicas(id)
+        )
+    ''')
+    
+    # Tabela de mesas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS mesas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            numero INTEGER UNIQUE NOT NULL,
+            qrcode_url TEXT,
+            cardapio_id INTEGER,
+            ativo BOOLEAN DEFAULT 1,
+            criado_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (cardapio_id) REFERENCES cardapios(id)
+        )
+    ''')
+    
+    # Tabela de vendas
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            mesa_id INTEGER,
+            ficha_tecnica_id INTEGER NOT NULL,
+            quantidade INTEGER NOT NULL,
+            valor_unitario REAL NOT NULL,
+            valor_total REAL NOT NULL,
+            data_venda TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            usuario_id INTEGER,
+            FOREIGN KEY (mesa_id) REFERENCES mesas(id),
+            FOREIGN KEY (ficha_tecnica_id) REFERENCES fichas_tecnicas(id),
+            FOREIGN KEY (usuario_id) REFERENCES usuarios(id)
+        )
+    ''')
+
+@migracao(2, 'Índices de chaves estrangeiras e filtros por data')
+def _002_indices(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendas_data_venda ON vendas(data_venda)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendas_ficha ON vendas(ficha_tecnica_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendas_mesa ON vendas(mesa_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ficha_ingredientes_ficha ON ficha_ingredientes(ficha_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_ficha_ingredientes_ingrediente ON ficha_ingredientes(ingrediente_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_inventario_ingrediente ON inventario(ingrediente_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_movimentacoes_ingrediente ON movimentacoes_estoque(ingrediente_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cardapio_pratos_cardapio ON cardapio_pratos(cardapio_id, ordem)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_mesas_cardapio ON mesas(cardapio_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_cardapios_data ON cardapios(data)')
+
+@migracao(3, 'Índices parciais sobre registros ativos')
+def _003_indices_parciais_ativos(cursor):
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_ingredientes_ativos_nome
+        ON ingredientes(nome) WHERE ativo = 1
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fichas_ativas_nome
+        ON fichas_tecnicas(nome_prato) WHERE ativo = 1
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_fichas_ativas_categoria
+        ON fichas_tecnicas(categoria) WHERE ativo = 1
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_mesas_ativas_numero
+        ON mesas(numero) WHERE ativo = 1
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_cardapios_ativos_data
+        ON cardapios(data) WHERE ativo = 1
+    ''')
+
+@migracao(4, 'Inventário único por data e ingrediente')
+def _004_inventario_unico(cursor):
+    # Remover duplicatas eventuais antes de criar a restrição,
+    # mantendo o primeiro registro gerado (mesmo critério de gerar_inventario)
+    cursor.execute('''
+        DELETE FROM inventario
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM inventario
+            GROUP BY data_inventario, ingrediente_id
+        )
+    ''')
+    cursor.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS uq_inventario_data_ingrediente
+        ON inventario(data_inventario, ingrediente_id)
+    ''')
+    cursor.execute('ANALYZE')
+
+@migracao(5, 'Versão da receita nas fichas técnicas')
+def _005_versao_receita(cursor):
+    # Incrementada a cada mudança em ficha_ingredientes (cache de receitas)
+    cursor.execute('ALTER TABLE fichas_tecnicas ADD COLUMN versao_receita INTEGER DEFAULT 0')
+
+@migracao(6, 'Rollups de vendas por dia/prato e hora/categoria')
+def _006_rollups_vendas(cursor):
+    criar_tabelas_rollup(cursor)
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendas_diarias_prato_ficha ON vendas_diarias_prato(ficha_tecnica_id, dia)')
+    # Backfill com as vendas já existentes (vendas.categoria só existe a partir da 19)
+    reconstruir_rollups(cursor, categoria_da_venda=False)
+
+
+@migracao(7, 'Versões das tabelas para o cache de estatísticas')
+def _007_versoes_tabelas(cursor):
+    criar_tabela_versoes(cursor)
+
+
+@migracao(8, 'Índice (data_venda, id) para paginação por cursor das vendas')
+def _008_indice_vendas_keyset(cursor):
+    # Substitui idx_vendas_data_venda, que é prefixo do novo índice
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_vendas_data_venda_id ON vendas(data_venda, id)')
+    cursor.execute('DROP INDEX IF EXISTS idx_vendas_data_venda')
+
+
+@migracao(9, 'Modelos de previsão de consumo de ingredientes')
+def _009_previsao_consumo(cursor):
+    criar_tabela_previsao(cursor)
+    cursor.execute("INSERT OR IGNORE INTO versoes_tabelas (tabela, versao) VALUES ('previsao_consumo', 0)")
+
+
+@migracao(10, 'Tabela de eventos do stream do dashboard')
+def _010_eventos_dashboard(cursor):
+    criar_tabela_eventos(cursor)
+
+@migracao(11, 'Custo unitário nas movimentações de estoque')
+def _011_custo_movimentacoes(cursor):
+    # Custo pago em cada entrada (notas de fornecedor); NULL quando não informado
+    cursor.execute('ALTER TABLE movimentacoes_estoque ADD COLUMN custo_unitario REAL')
+
+@migracao(12, 'Snapshots diários de estoque por ingrediente')
+def _012_estoque_diario(cursor):
+    criar_tabela_snapshots(cursor)
+    # Backfill do histórico a partir das movimentações existentes
+    registrar_snapshots(cursor)
+
+
+@migracao(13, 'Índices do livro de movimentações para paginação por cursor')
+def _013_indices_movimentacoes(cursor):
+    # Histórico por ingrediente; substitui idx_movimentacoes_ingrediente, que é prefixo
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_movimentacoes_ingrediente_data
+        ON movimentacoes_estoque(ingrediente_id, data_movimentacao, id)
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_movimentacoes_ingrediente')
+    # Livro completo e intervalos de datas (snapshots, previsão)
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_movimentacoes_data_id
+        ON movimentacoes_estoque(data_movimentacao, id)
+    ''')
+
+
+@migracao(14, 'Alertas de estoque baixo mantidos pelas escritas')
+def _014_alertas_estoque(cursor):
+    criar_tabela_alertas(cursor)
+    # Alertas abertos para os ingredientes que já estão abaixo do mínimo
+    reconstruir_alertas(cursor)
+
+
+@migracao(15, 'Índices de busca textual (FTS5) de ingredientes e fichas')
+def _015_indices_busca(cursor):
+    criar_indices_busca(cursor)
+
+
+@migracao(16, 'Custo médio ponderado, histórico de custos e camadas FIFO')
+def _016_custos(cursor):
+    criar_tabelas_custo(cursor)
+    # Ponto de partida: o custo de referência atual de cada ingrediente
+    iniciar_custos(cursor)
+
+
+@migracao(17, 'Ajuste de estoque já aplicado por item de inventário')
+def _017_inventario_ajuste(cursor):
+    # Torna o ajuste de inventário idempotente: só a diferença nova movimenta o estoque
+    cursor.execute('ALTER TABLE inventario ADD COLUMN ajuste_aplicado REAL NOT NULL DEFAULT 0')
+
+
+@migracao(18, 'Índice (inicio, id) para paginação por cursor dos alertas de estoque')
+def _018_indice_alertas(cursor):
+    # Substitui idx_alertas_estoque_inicio, que é prefixo
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_alertas_estoque_inicio_id
+        ON alertas_estoque(inicio, id)
+    ''')
+    cursor.execute('DROP INDEX IF EXISTS idx_alertas_estoque_inicio')
+
+
+@migracao(19, 'Categoria da ficha gravada em cada venda')
+def _019_vendas_categoria(cursor):
+    # Relatórios por categoria usam a categoria do momento da venda, como os rollups
+    cursor.execute('ALTER TABLE vendas ADD COLUMN categoria TEXT')
+    # Vendas antigas: a categoria por venda não foi guardada; usa a atual da ficha
+    cursor.execute('''
+        UPDATE vendas SET categoria = (
+            SELECT ft.categoria FROM fichas_tecnicas ft WHERE ft.id = vendas.ficha_tecnica_id
+        )
+    ''')
+
+
+# ========== MOTOR DE MIGRAÇÕES ==========
+
+def _criar_tabela_versao(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            versao INTEGER PRIMARY KEY,
+            descricao TEXT NOT NULL,
+            aplicada_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            duracao_ms REAL
+        )
+    ''')
+
+
+def _versao_atual(cursor):
+    cursor.execute('SELECT MAX(versao) AS versao FROM schema_version')
+    return cursor.fetchone()['versao'] or 0
+
+
+def versao_mais_recente():
+    """Retorna o número da última migração conhecida pelo código"""
+    return MIGRACOES[-1][0] if MIGRACOES else 0
+
+
+def versao_do_banco():
+    """Retorna a versão de schema registrada no banco (0 se não inicializado)"""
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+        if not tabela_existe(cursor, 'schema_version'):
+            return 0
+        return _versao_atual(cursor)
+
+
+def migracoes_pendentes():
+    """Lista as migrações ainda não aplicadas no banco"""
+    versao = versao_do_banco()
+    return [(v, d) for v, d, _ in MIGRACOES if v > versao]
+
+
+def aplicar_migracoes(ate_versao=None):
+    """Aplica as migrações pendentes, cada uma em sua própria transação"""
+    aplicadas = []
+    alvo = ate_versao or versao_mais_recente()
+
+    with get_db(serializar=False) as conn:
+        cursor = conn.cursor()
+        _criar_tabela_versao(cursor)
+        conn.commit()
+
+        # Caminho rápido: banco já atualizado, nenhuma DDL executada
+        if _versao_atual(cursor) >= alvo:
+            return aplicadas
+
+        for versao, descricao, func in MIGRACOES:
+            if versao > alvo:
+                break
+
+            # Apenas um processo migra por vez
+            iniciar_transacao_exclusiva(conn)
+            try:
+                if _versao_atual(cursor) >= versao:
+                    conn.rollback()
+                    continue
+
+                inicio = time.perf_counter()
+                func(cursor)
+                duracao_ms = (time.perf_counter() - inicio) * 1000
+
+                cursor.execute('''
+                    INSERT INTO schema_version (versao, descricao, duracao_ms)
+                    VALUES (?, ?, ?)
+                ''', (versao, descricao, duracao_ms))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+            aplicadas.append((versao, descricao))
+            print(f"  ✓ Migração {versao:03d}: {descricao}")
+
+    return aplicadas
@@ -0,0 +1,331 @@
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+# Configurações do pool PostgreSQL (por worker)
+PG_POOL_MIN = int(os.environ.get('PG_POOL_MIN', 1))
+PG_POOL_MAX = int(os.environ.get('PG_POOL_MAX', 10))
+PG_POOL_TIMEOUT = float(os.environ.get('PG_POOL_TIMEOUT', 10))
+
+# OIDs de DATE, TIMESTAMP e TIMESTAMPTZ: retornados como texto, como no SQLite
+_OIDS_DATA_HORA = (1082, 1114, 1184)
+
+_RE_INSERT_OR_IGNORE = re.compile(r'^\s*INSERT\s+OR\s+IGNORE\s+INTO', re.IGNORECASE)
+_RE_DDL = re.compile(r'^\s*(CREATE|ALTER)\s', re.IGNORECASE)
+_RE_INSERT_TABELA = re.compile(r'^\s*INSERT\s+(?:OR\s+IGNORE\s+)?INTO\s+"?(\w+)"?', re.IGNORECASE)
+
+# Tabelas com coluna `id` SERIAL (nextval) no schema atual, lidas na
+# primeira inserção e descartadas a cada DDL
+_tabelas_serial = None
+
+
+def _fora_de_aspas(sql):
+    """Divide o SQL em trechos (texto, dentro_de_aspas)"""
+    partes = []
+    atual = []
+    aspa = None
+    for ch in sql:
+        if aspa:
+            atual.append(ch)
+            if ch == aspa:
+                partes.append((''.join(atual), True))
+                atual = []
+                aspa = None
+        elif ch in ("'", '"'):
+            partes.append((''.join(atual), False))
+            atual = [ch]
+            aspa = ch
+        else:
+            atual.append(ch)
+    partes.append((''.join(atual), bool(aspa)))
+    return partes
+
+
+@lru_cache(maxsize=1024)
+def traduzir_sql(sql):
+    """Traduz o dialeto SQLite usado nas rotas para PostgreSQL
+
+    - placeholders `?` viram `%s` (e `%` literal vira `%%`)
+    - `LIKE` vira `ILIKE` (SQLite compara ASCII sem diferenciar maiúsculas)
+    - `INSERT OR IGNORE` vira `INSERT ... ON CONFLICT DO NOTHING`
+    - DDL: `INTEGER PRIMARY KEY AUTOINCREMENT` vira `SERIAL PRIMARY KEY`,
+      `BOOLEAN` vira `INTEGER` (as rotas comparam com 0/1) e `REAL` vira
+      `DOUBLE PRECISION`
+
+    `DATE(...)` e `CURRENT_TIMESTAMP` são aceitos nativamente pelo PostgreSQL.
+    """
+    ignorar_conflito = bool(_RE_INSERT_OR_IGNORE.match(sql))
+    if ignorar_conflito:
+        sql = _RE_INSERT_OR_IGNORE.sub('INSERT INTO', sql, count=1)
+
+    ddl = bool(_RE_DDL.match(sql))
+    partes = []
+    for trecho, entre_aspas in _fora_de_aspas(sql):
+        trecho = trecho.replace('%', '%%')
+        if not entre_aspas:
+            trecho = trecho.replace('?', '%s')
+            trecho = re.sub(r'\bLIKE\b', 'ILIKE', trecho, flags=re.IGNORECASE)
+            if ddl:
+                trecho = re.sub(r'INTEGER\s+PRIMARY\s+KEY\s+AUTOINCREMENT',
+                                'SERIAL PRIMARY KEY', trecho, flags=re.IGNORECASE)
+                trecho = re.sub(r'\bBOOLEAN\b', 'INTEGER', trecho, flags=re.IGNORECASE)
+                trecho = re.sub(r'\bREAL\b', 'DOUBLE PRECISION', trecho, flags=re.IGNORECASE)
+        partes.append(trecho)
+    sql = ''.join(partes)
+
+    if ignorar_conflito:
+        sql = sql.rstrip().rstrip(';') + ' ON CONFLICT DO NOTHING'
+    return sql
+
+
+@lru_cache(maxsize=1024)
+def _tabela_insert_valores(sql):
+    """Tabela de um `INSERT ... VALUES` sem RETURNING próprio, ou None"""
+    encontrado = _RE_INSERT_TABELA.match(sql)
+    if not encontrado:
+        return None
+    fora = ' '.join(trecho for trecho, entre_aspas in _fora_de_aspas(sql) if not entre_aspas)
+    if not re.search(r'\bVALUES\b', fora, re.IGNORECASE) or re.search(r'\b(SELECT|RETURNING)\b', fora, re.IGNORECASE):
+        return None
+    return encontrado.group(1).lower()
+
+
+def _carregar_tabelas_serial(cursor):
+    global _tabelas_serial
+    if _tabelas_serial is None:
+        cursor.execute('''
+            SELECT table_name FROM information_schema.columns
+            WHERE table_schema = current_schema() AND column_name = 'id'
+            AND column_default LIKE 'nextval%'
+        ''')
+        _tabelas_serial = frozenset(row[0] for row in cursor.fetchall())
+    return _tabelas_serial
+
+
+def _registrar_tipos():
+    """Faz datas e timestamps chegarem como texto, no mesmo formato do SQLite"""
+    import psycopg2.extensions
+    for oid in _OIDS_DATA_HORA:
+        tipo = psycopg2.extensions.new_type((oid,), f'TEXTO_{oid}', lambda valor, cur: valor)
+        psycopg2.extensions.register_type(tipo)
+
+
+class PGCursor:
+    """Cursor psycopg2 com a interface do cursor sqlite3 usada nas rotas"""
+
+    def __init__(self, cursor):
+        self._cursor = cursor
+        self._lastrowid = None
+
+    def execute(self, sql, params=()):
+        global _tabelas_serial
+        self._lastrowid = None
+        traduzido = traduzir_sql(sql)
+        tabela = _tabela_insert_valores(sql)
+        if tabela is not None and tabela in _carregar_tabelas_serial(self._cursor):
+            # O id vem do próprio INSERT: lastval() pegaria a sequence de
+            # uma inserção feita por trigger ou de outra tabela
+            self._cursor.execute(traduzido.rstrip().rstrip(';') + ' RETURNING id', tuple(params))
+            rows = self._cursor.fetchall()
+            self._lastrowid = rows[-1][0] if rows else None
+            return self
+        self._cursor.execute(traduzido, tuple(params))
+        if _RE_DDL.match(sql):
+            _tabelas_serial = None
+        return self
+
+    def executemany(self, sql, seq_params):
+        self._lastrowid = None
+        self._cursor.executemany(traduzir_sql(sql), [tuple(p) for p in seq_params])
+        return self
+
+    @property
+    def lastrowid(self):
+        """Equivalente ao lastrowid do sqlite3, para `INSERT ... VALUES` em tabelas com id SERIAL
+
+        Obtido com `RETURNING id` acrescentado ao próprio INSERT; None para
+        as demais instruções (INSERT ... SELECT, tabelas sem id) e para um
+        INSERT OR IGNORE que não inseriu nada.
+        """
+        return self._lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    def fetchone(self):
+        return self._cursor.fetchone()
+
+    def fetchall(self):
+        return self._cursor.fetchall()
+
+    def fetchmany(self, size=None):
+        if size is None:
+            return self._cursor.fetchmany()
+        return self._cursor.fetchmany(size)
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def close(self):
+        self._cursor.close()
+
+
+class PGConnection:
+    """Conexão psycopg2 com a interface da conexão sqlite3 usada nas rotas"""
+
+    def __init__(self, conn):
+        self._conn = conn
+
+    @property
+    def raw(self):
+        return self._conn
+
+    def cursor(self, nome=None):
+        from psycopg2.extras import DictCursor
+        if nome:
+            # Cursor nomeado: o resultado fica no servidor e vem em lotes
+            return PGCursor(self._conn.cursor(name=nome, cursor_factory=DictCursor))
+        return PGCursor(self._conn.cursor(cursor_factory=DictCursor))
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    @property
+    def in_transaction(self):
+        from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+        return self._conn.info.transaction_status != TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self._conn.close()
+
+
+class PostgresPool:
+    """Pool de conexões PostgreSQL (ThreadedConnectionPool) com espera e health check"""
+
+    def __init__(self, dsn, min_size=PG_POOL_MIN, max_size=PG_POOL_MAX, timeout=PG_POOL_TIMEOUT,
+                 readonly=False):
+        self.dsn = dsn
+        self.readonly = readonly
+        self.min_size = min_size
+        self.max_size = max_size
+        self.timeout = timeout
+        self._pid = None
+        self._pool = None
+        self._vagas = None
+        self._lock = threading.Lock()
+        self._stats = {
+            'checkouts': 0,
+            'descartadas': 0,
+            'esperas': 0,
+            'tempo_espera_ms': 0.0
+        }
+
+    def _garantir_pool(self):
+        """Cria o pool no processo atual (após o fork do gunicorn)"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            from psycopg2.pool import ThreadedConnectionPool
+            _registrar_tipos()
+            self._pool = ThreadedConnectionPool(
+                self.min_size,
+                self.max_size,
+                self.dsn,
+                options='-c timezone=UTC'
+            )
+            self._vagas = threading.BoundedSemaphore(self.max_size)
+            self._pid = os.getpid()
+
+    def acquire(self):
+        """Retira uma conexão do pool, aguardando se todas estiverem em uso"""
+        import psycopg2
+        self._garantir_pool()
+
+        inicio = time.perf_counter()
+        if not self._vagas.acquire(timeout=self.timeout):
+            raise RuntimeError('Tempo esgotado aguardando conexão do pool')
+        espera_ms = (time.perf_counter() - inicio) * 1000
+
+        try:
+            while True:
+                raw = self._pool.getconn()
+
+                # Health check no checkout
+                try:
+                    if raw.closed:
+                        raise psycopg2.InterfaceError('conexão fechada')
+                    if self.readonly and not raw.readonly:
+                        raw.readonly = True
+                    with raw.cursor() as cur:
+                        cur.execute('SELECT 1')
+                    raw.rollback()
+                    break
+                except psycopg2.Error:
+                    self._pool.putconn(raw, close=True)
+                    with self._lock:
+                        self._stats['descartadas'] += 1
+        except Exception:
+            self._vagas.release()
+            raise
+
+        with self._lock:
+            self._stats['checkouts'] += 1
+            if espera_ms > 1:
+                self._stats['esperas'] += 1
+                self._stats['tempo_espera_ms'] += espera_ms
+        return PGConnection(raw)
+
+    def release(self, conn):
+        """Devolve uma conexão ao pool"""
+        import psycopg2
+        raw = conn.raw
+        if self._pid != os.getpid():
+            raw.close()
+            return
+
+        fechar = False
+        try:
+            if conn.in_transaction:
+                raw.rollback()
+        except psycopg2.Error:
+            fechar = True
+
+        self._pool.putconn(raw, close=fechar or raw.closed)
+        self._vagas.release()
+
+    def close_all(self):
+        """Fecha todas as conexões do pool"""
+        if self._pool is not None and self._pid == os.getpid():
+            self._pool.closeall()
+            self._pid = None
+
+    def stats(self):
+        """Retorna estatísticas de uso do pool"""
+        with self._lock:
+            stats = dict(self._stats)
+        stats['tempo_espera_ms'] = round(stats['tempo_espera_ms'], 3)
+        if self._pool is not None and self._pid == os.getpid():
+            stats['em_uso'] = len(self._pool._used)
+            stats['ociosas'] = len(self._pool._pool)
+        else:
+            stats['em_uso'] = 0
+            stats['ociosas'] = 0
+        stats['abertas'] = stats['em_uso'] + stats['ociosas']
+        stats['tamanho_maximo'] = self.max_size
+        stats['pid'] = self._pid
+        return stats
@@ -0,0 +1,212 @@
+import importlib.util
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from models.database import get_db
+from models.estatisticas import obter_versoes, registrar_alteracao
+
+# Semanas de histórico de saídas usadas no ajuste dos modelos
+PREVISAO_JANELA_SEMANAS = int(os.environ.get('PREVISAO_JANELA_SEMANAS', 8))
+
+# Horizonte máximo (dias) da previsão e do cálculo de ruptura
+PREVISAO_HORIZONTE_MAX = 90
+
+# NumPy só é importado no primeiro cálculo (ver _importar_numpy): o boot
+# dos workers não paga a importação
+np = None
+
+# Modelos ajustados, carregados de previsao_consumo uma vez por versão
+_modelos = None
+_versao_modelos = None
+_lock = threading.Lock()
+
+
+def previsao_disponivel():
+    """Indica se as previsões podem ser calculadas neste worker"""
+    return np is not None or importlib.util.find_spec('numpy') is not None
+
+
+def _importar_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+
+
+def ler_horizonte(valor):
+    """Valida o parâmetro `horizonte` (dias, 7 por padrão)"""
+    horizonte = int(valor) if valor not in (None, '') else 7
+    if horizonte < 1 or horizonte > PREVISAO_HORIZONTE_MAX:
+        raise ValueError(f'horizonte deve estar entre 1 e {PREVISAO_HORIZONTE_MAX}')
+    return horizonte
+
+
+def criar_tabela_previsao(cursor):
+    """Cria a tabela com o modelo de consumo ajustado de cada ingrediente"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS previsao_consumo (
+            ingrediente_id INTEGER PRIMARY KEY,
+            media_7d REAL NOT NULL,
+            media_28d REAL NOT NULL,
+            fatores_semana TEXT NOT NULL,
+            dias_com_saida INTEGER NOT NULL,
+            calculado_em TIMESTAMP NOT NULL,
+            FOREIGN KEY (ingrediente_id) REFERENCES ingredientes(id)
+        )
+    ''')
+
+
+def _hoje():
+    # data_movimentacao é gravada em UTC (CURRENT_TIMESTAMP)
+    return datetime.utcnow().date()
+
+
+def recalcular_previsoes(cursor):
+    """Ajusta média móvel e sazonalidade semanal de todos os ingredientes
+
+    As saídas das últimas PREVISAO_JANELA_SEMANAS semanas completas (até
+    ontem) são somadas por ingrediente e dia no banco e montadas em uma
+    matriz ingredientes × dias; médias e fatores por dia da semana saem de
+    operações sobre a matriz inteira. Retorna o número de ingredientes.
+
+    Roda só no job diário (`flask db rebuild-forecasts`); as leituras
+    apenas carregam os modelos gravados.
+    """
+    _importar_numpy()
+    hoje = _hoje()
+    dias = PREVISAO_JANELA_SEMANAS * 7
+    inicio = hoje - timedelta(days=dias)
+
+    cursor.execute('SELECT id FROM ingredientes WHERE ativo = 1 ORDER BY id')
+    ids = np.array([row['id'] for row in cursor.fetchall()], dtype=np.int64)
+
+    cursor.execute('''
+        SELECT ingrediente_id, DATE(data_movimentacao) AS dia, SUM(quantidade) AS total
+        FROM movimentacoes_estoque
+        WHERE tipo = 'saida' AND data_movimentacao >= ? AND data_movimentacao < ?
+        GROUP BY ingrediente_id, DATE(data_movimentacao)
+    ''', (inicio.isoformat(), hoje.isoformat()))
+    saidas = cursor.fetchall()
+
+    consumo = np.zeros((len(ids), dias))
+    if saidas and len(ids):
+        ingredientes = np.array([row['ingrediente_id'] for row in saidas], dtype=np.int64)
+        colunas = (np.array([str(row['dia'])[:10] for row in saidas], dtype='datetime64[D]')
+                   - np.datetime64(inicio.isoformat(), 'D')).astype(np.int64)
+        linhas = np.searchsorted(ids, ingredientes)
+        # Ingredientes inativos ficam fora da matriz
+        validas = (linhas < len(ids)) & (ids[np.minimum(linhas, len(ids) - 1)] == ingredientes)
+        consumo[linhas[validas], colunas[validas]] = [row['total'] for row, ok in zip(saidas, validas) if ok]
+
+    media_7d = consumo[:, -7:].mean(axis=1)
+    media_28d = consumo[:, -28:].mean(axis=1)
+    media_geral = consumo.mean(axis=1)
+
+    # Média por posição na semana, reordenada para 0 = segunda-feira
+    por_dia_semana = np.roll(consumo.reshape(len(ids), PREVISAO_JANELA_SEMANAS, 7).mean(axis=1),
+                             inicio.weekday(), axis=1)
+    fatores = np.ones_like(por_dia_semana)
+    com_consumo = media_geral > 0
+    fatores[com_consumo] = por_dia_semana[com_consumo] / media_geral[com_consumo, None]
+    dias_com_saida = (consumo > 0).sum(axis=1)
+
+    calculado_em = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+    cursor.execute('DELETE FROM previsao_consumo')
+    cursor.executemany('''
+        INSERT INTO previsao_consumo
+        (ingrediente_id, media_7d, media_28d, fatores_semana, dias_com_saida, calculado_em)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', [
+        (int(ids[i]), float(media_7d[i]), float(media_28d[i]),
+         json.dumps([round(float(f), 4) for f in fatores[i]]), int(dias_com_saida[i]), calculado_em)
+        for i in range(len(ids))
+    ])
+    registrar_alteracao(cursor, 'previsao_consumo')
+    return len(ids)
+
+
+def _carregar_modelos():
+    """Modelos ajustados deste worker, relidos quando o job grava uma nova versão
+
+    As consultas rodam fora do lock; ele só protege a troca dos modelos.
+    """
+    global _modelos, _versao_modelos
+    versao = obter_versoes().get('previsao_consumo')
+    with _lock:
+        if _modelos is not None and versao == _versao_modelos:
+            return _modelos
+
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT ingrediente_id, media_7d, media_28d, fatores_semana, dias_com_saida, calculado_em
+            FROM previsao_consumo
+            ORDER BY ingrediente_id
+        ''')
+        rows = cursor.fetchall()
+
+    modelos = {
+        'ids': np.array([row['ingrediente_id'] for row in rows], dtype=np.int64),
+        'media_7d': np.array([row['media_7d'] for row in rows], dtype=np.float64),
+        'nivel': np.array([row['media_28d'] for row in rows], dtype=np.float64),
+        'fatores': np.array([json.loads(row['fatores_semana']) for row in rows],
+                            dtype=np.float64).reshape(len(rows), 7),
+        'dias_com_saida': [row['dias_com_saida'] for row in rows],
+        'calculado_em': str(rows[0]['calculado_em']) if rows else None
+    }
+    with _lock:
+        _modelos = modelos
+        _versao_modelos = versao
+    return modelos
+
+
+def prever_consumo(ingredientes, horizonte=7):
+    """Previsão de consumo e de ruptura para os ingredientes informados
+
+    `ingredientes` é uma lista de dicts com id e estoque_atual. A previsão
+    diária é o nível (média de 28 dias) vezes o fator do dia da semana; os
+    dias até a ruptura contam quantos dias o estoque atual cobre, dentro de
+    PREVISAO_HORIZONTE_MAX (None quando não há consumo ou cobre além disso).
+    """
+    _importar_numpy()
+    modelos = _carregar_modelos()
+    hoje = _hoje()
+
+    ids = np.array([ing['id'] for ing in ingredientes], dtype=np.int64)
+    estoque = np.array([ing['estoque_atual'] or 0 for ing in ingredientes], dtype=np.float64)
+    posicoes = np.searchsorted(modelos['ids'], ids)
+    posicoes = np.minimum(posicoes, max(len(modelos['ids']) - 1, 0))
+    conhecidos = (modelos['ids'][posicoes] == ids) if len(modelos['ids']) else np.zeros(len(ids), dtype=bool)
+
+    nivel = np.where(conhecidos, modelos['nivel'][posicoes] if len(modelos['ids']) else 0, 0)
+    fatores = np.ones((len(ids), 7))
+    if len(modelos['ids']):
+        fatores[conhecidos] = modelos['fatores'][posicoes[conhecidos]]
+
+    # Matriz ingredientes × dias futuros (a partir de hoje)
+    dias_semana = (hoje.weekday() + np.arange(PREVISAO_HORIZONTE_MAX)) % 7
+    previsao = nivel[:, None] * fatores[:, dias_semana]
+    acumulado = np.cumsum(previsao, axis=1)
+    cobertura = (acumulado <= estoque[:, None]).sum(axis=1)
+
+    resultado = []
+    for i, ing in enumerate(ingredientes):
+        pos = posicoes[i]
+        sem_ruptura = nivel[i] <= 0 or cobertura[i] >= PREVISAO_HORIZONTE_MAX
+        dias = None if sem_ruptura else int(cobertura[i])
+        resultado.append({
+            **ing,
+            'consumo_medio_7d': float(modelos['media_7d'][pos]) if conhecidos[i] else 0.0,
+            'consumo_medio_diario': float(nivel[i]),
+            'consumo_previsto': float(acumulado[i, horizonte - 1]),
+            'previsao_diaria': [
+                {'data': (hoje + timedelta(days=d)).isoformat(), 'quantidade': float(previsao[i, d])}
+                for d in range(horizonte)
+            ],
+            'dias_ate_ruptura': dias,
+            'data_ruptura': (hoje + timedelta(days=dias)).isoformat() if dias is not None else None,
+            'dias_com_saida': modelos['dias_com_saida'][pos] if conhecidos[i] else 0
+        })
+    return resultado, modelos['calculado_em']
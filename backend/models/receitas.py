@@ -0,0 +1,96 @@
+import threading
+from array import array
+
+# Cache de "explosão" das fichas técnicas: ficha_id -> Receita
+# A validade de cada entrada é controlada por fichas_tecnicas.versao_receita,
+# incrementada sempre que os ingredientes da ficha mudam. Como a versão vem
+# na mesma consulta que já busca o preço da ficha, outros workers percebem a
+# alteração sem nenhuma consulta extra.
+_cache = {}
+_lock = threading.Lock()
+_stats = {'acertos': 0, 'carregamentos': 0}
+
+
+class Receita:
+    """Ingredientes e quantidade (kg) consumida por porção de uma ficha"""
+
+    __slots__ = ('versao', 'ingredientes', 'quantidades_kg')
+
+    def __init__(self, versao, ingredientes, quantidades_kg):
+        self.versao = versao
+        self.ingredientes = ingredientes
+        self.quantidades_kg = quantidades_kg
+
+    def consumo(self, quantidade):
+        """Itera (ingrediente_id, kg) para `quantidade` porções"""
+        for ingrediente_id, kg in zip(self.ingredientes, self.quantidades_kg):
+            yield ingrediente_id, kg * quantidade
+
+    def __len__(self):
+        return len(self.ingredientes)
+
+
+def obter_receitas(cursor, versoes):
+    """Retorna {ficha_id: Receita} para as fichas informadas
+
+    `versoes` mapeia ficha_id -> versao_receita lida do banco. Apenas as
+    fichas ausentes do cache ou com versão diferente são carregadas, todas
+    com uma única consulta.
+    """
+    versoes = {int(ficha_id): versao for ficha_id, versao in versoes.items()}
+    receitas = {}
+    pendentes = []
+    with _lock:
+        for ficha_id, versao in versoes.items():
+            receita = _cache.get(ficha_id)
+            if receita is not None and receita.versao == versao:
+                receitas[ficha_id] = receita
+            else:
+                pendentes.append(ficha_id)
+        _stats['acertos'] += len(receitas)
+
+    if not pendentes:
+        return receitas
+
+    marcadores = ', '.join('?' * len(pendentes))
+    cursor.execute(f'''
+        SELECT ficha_id, ingrediente_id, quantidade_gramas
+        FROM ficha_ingredientes
+        WHERE ficha_id IN ({marcadores})
+        ORDER BY ficha_id, id
+    ''', pendentes)
+
+    carregadas = {ficha_id: Receita(versoes[ficha_id], array('q'), array('d')) for ficha_id in pendentes}
+    for row in cursor.fetchall():
+        receita = carregadas[row['ficha_id']]
+        receita.ingredientes.append(row['ingrediente_id'])
+        receita.quantidades_kg.append(row['quantidade_gramas'] / 1000)
+
+    with _lock:
+        _cache.update(carregadas)
+        _stats['carregamentos'] += len(carregadas)
+
+    receitas.update(carregadas)
+    return receitas
+
+
+def obter_receita(cursor, ficha_id, versao):
+    """Retorna a Receita de uma ficha"""
+    return obter_receitas(cursor, {ficha_id: versao})[int(ficha_id)]
+
+
+def invalidar_receita(ficha_id=None):
+    """Remove uma ficha (ou todas) do cache deste worker"""
+    with _lock:
+        if ficha_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(ficha_id, None)
+
+
+def get_receitas_stats():
+    """Retorna estatísticas do cache de receitas"""
+    with _lock:
+        stats = dict(_stats)
+        stats['fichas_em_cache'] = len(_cache)
+    return stats
@@ -0,0 +1,130 @@
+from models.database import DIALECT
+
+# Tabelas de agregação de vendas, mantidas na mesma transação de cada venda:
+#   vendas_diarias_prato      (dia, ficha_tecnica_id)
+#   vendas_horarias_categoria (dia, hora, categoria)
+# A categoria é a da ficha no momento da venda ('' quando não informada).
+
+
+def _dia_e_hora(data_venda):
+    """Extrai ('YYYY-MM-DD', hora) de um timestamp 'YYYY-MM-DD HH:MM:SS'"""
+    return data_venda[:10], int(data_venda[11:13])
+
+
+def registrar_vendas_rollup(cursor, vendas):
+    """Acumula vendas nas tabelas de rollup
+
+    `vendas` é uma lista de (data_venda, ficha_tecnica_id, categoria,
+    quantidade, valor_total). As linhas são agregadas antes, para gerar um
+    único upsert por chave.
+    """
+    por_prato = {}
+    por_categoria = {}
+    for data_venda, ficha_id, categoria, quantidade, valor_total in vendas:
+        dia, hora = _dia_e_hora(data_venda)
+
+        chave = (dia, ficha_id)
+        total = por_prato.setdefault(chave, [0, 0, 0.0])
+        total[0] += 1
+        total[1] += quantidade
+        total[2] += valor_total
+
+        chave = (dia, hora, categoria or '')
+        total = por_categoria.setdefault(chave, [0, 0, 0.0])
+        total[0] += 1
+        total[1] += quantidade
+        total[2] += valor_total
+
+    cursor.executemany('''
+        INSERT INTO vendas_diarias_prato
+        (dia, ficha_tecnica_id, total_vendas, quantidade, valor_total)
+        VALUES (?, ?, ?, ?, ?)
+        ON CONFLICT (dia, ficha_tecnica_id) DO UPDATE SET
+            total_vendas = vendas_diarias_prato.total_vendas + excluded.total_vendas,
+            quantidade = vendas_diarias_prato.quantidade + excluded.quantidade,
+            valor_total = vendas_diarias_prato.valor_total + excluded.valor_total
+    ''', [chave + tuple(total) for chave, total in por_prato.items()])
+
+    cursor.executemany('''
+        INSERT INTO vendas_horarias_categoria
+        (dia, hora, categoria, total_vendas, quantidade, valor_total)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT (dia, hora, categoria) DO UPDATE SET
+            total_vendas = vendas_horarias_categoria.total_vendas + excluded.total_vendas,
+            quantidade = vendas_horarias_categoria.quantidade + excluded.quantidade,
+            valor_total = vendas_horarias_categoria.valor_total + excluded.valor_total
+    ''', [chave + tuple(total) for chave, total in por_categoria.items()])
+
+
+def criar_tabelas_rollup(cursor):
+    """Cria as tabelas de rollup (usada pela migração)"""
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendas_diarias_prato (
+            dia DATE NOT NULL,
+            ficha_tecnica_id INTEGER NOT NULL,
+            total_vendas INTEGER NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            valor_total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, ficha_tecnica_id)
+        )
+    ''')
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS vendas_horarias_categoria (
+            dia DATE NOT NULL,
+            hora INTEGER NOT NULL,
+            categoria TEXT NOT NULL DEFAULT '',
+            total_vendas INTEGER NOT NULL DEFAULT 0,
+            quantidade INTEGER NOT NULL DEFAULT 0,
+            valor_total REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (dia, hora, categoria)
+        )
+    ''')
+
+
+def reconstruir_rollups(cursor, categoria_da_venda=True):
+    """Recalcula as tabelas de rollup a partir de todas as vendas
+
+    categoria_da_venda=False usa a categoria atual da ficha (migrações
+    anteriores à coluna vendas.categoria).
+    """
+    if DIALECT == 'postgres':
+        # Bloqueia novas vendas até o fim da transação (no SQLite o lock de escrita já garante isso)
+        cursor.execute('LOCK TABLE vendas IN SHARE MODE')
+        hora = 'CAST(EXTRACT(HOUR FROM v.data_venda) AS INTEGER)'
+    else:
+        hora = "CAST(strftime('%H', v.data_venda) AS INTEGER)"
+    if categoria_da_venda:
+        categoria, juncao = "COALESCE(v.categoria, '')", ''
+    else:
+        categoria, juncao = "COALESCE(ft.categoria, '')", 'JOIN fichas_tecnicas ft ON v.ficha_tecnica_id = ft.id'
+
+    cursor.execute('DELETE FROM vendas_diarias_prato')
+    cursor.execute('DELETE FROM vendas_horarias_categoria')
+
+    cursor.execute('''
+        INSERT INTO vendas_diarias_prato
+        (dia, ficha_tecnica_id, total_vendas, quantidade, valor_total)
+        SELECT
+            DATE(v.data_venda),
+            v.ficha_tecnica_id,
+            COUNT(*),
+            SUM(v.quantidade),
+            SUM(v.valor_total)
+        FROM vendas v
+        GROUP BY DATE(v.data_venda), v.ficha_tecnica_id
+    ''')
+
+    cursor.execute(f'''
+        INSERT INTO vendas_horarias_categoria
+        (dia, hora, categoria, total_vendas, quantidade, valor_total)
+        SELECT
+            DATE(v.data_venda),
+            {hora},
+            {categoria},
+            COUNT(*),
+            SUM(v.quantidade),
+            SUM(v.valor_total)
+        FROM vendas v
+        {juncao}
+        GROUP BY DATE(v.data_venda), {hora}, {categoria}
+    ''')
@@ -0,0 +1,182 @@
+import os
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: apenas serialização dentro do processo
+    fcntl = None
+
+# Configurações da serialização de escritas (somente SQLite)
+DB_WRITE_SERIALIZATION = os.environ.get('DB_WRITE_SERIALIZATION', 'False').lower() == 'true'
+DB_GROUP_COMMIT_MAX = int(os.environ.get('DB_GROUP_COMMIT_MAX', 32))
+
+
+class _Lote:
+    """Grupo de transações confirmadas por um único COMMIT"""
+
+    def __init__(self):
+        self.membros = 0
+        self.confirmado = threading.Event()
+        self.erro = None
+
+
+class SerializedWriter:
+    """Escritor único por worker, com group commit e lock entre processos
+
+    Cada transação de escrita roda em um SAVEPOINT dentro da transação do
+    lote atual, na conexão dedicada do escritor. Enquanto houver outras
+    escritas aguardando, o lote continua aberto; a última da fila faz o
+    COMMIT e libera todas as que estavam esperando a confirmação.
+
+    Entre workers, um flock no arquivo `<banco>.writelock` enfileira os
+    lotes sem depender do busy handler do SQLite (que faz polling com
+    backoff e gera os picos de latência/`database is locked`).
+
+    O mutex e o flock ficam com a thread durante toda a transação. Um
+    get_db() de escrita aninhado na mesma thread não espera por eles (o
+    que travaria o worker): roda em um SAVEPOINT interno e é confirmado
+    junto com a transação externa.
+    """
+
+    def __init__(self, conectar, caminho_lock, max_lote=DB_GROUP_COMMIT_MAX):
+        self._conectar = conectar
+        self._caminho_lock = caminho_lock
+        self.max_lote = max_lote
+        self._pid = None
+        self._conn = None
+        self._arquivo_lock = None
+        self._mutex = threading.Lock()
+        self._dono = None  # ident da thread que está com o mutex
+        self._aninhadas = 0
+        self._contador_lock = threading.Lock()
+        self._aguardando = 0
+        self._lote = None
+        self._stats = {'transacoes': 0, 'commits': 0, 'falhas': 0}
+
+    def _garantir_conexao(self):
+        if self._pid != os.getpid() or self._conn is None:
+            self._conn = self._conectar()
+            # Controle manual de transações (BEGIN/SAVEPOINT/COMMIT)
+            self._conn.isolation_level = None
+            self._arquivo_lock = None
+            self._pid = os.getpid()
+
+    def _bloquear_processos(self):
+        if fcntl is None:
+            return
+        if self._arquivo_lock is None:
+            self._arquivo_lock = open(self._caminho_lock, 'a')
+        fcntl.flock(self._arquivo_lock, fcntl.LOCK_EX)
+
+    def _liberar_processos(self):
+        if fcntl is not None and self._arquivo_lock is not None:
+            fcntl.flock(self._arquivo_lock, fcntl.LOCK_UN)
+
+    def _abrir_lote(self):
+        self._bloquear_processos()
+        try:
+            self._conn.execute('BEGIN IMMEDIATE')
+        except Exception:
+            self._liberar_processos()
+            raise
+        self._lote = _Lote()
+
+    def _confirmar_lote(self):
+        lote = self._lote
+        self._lote = None
+        try:
+            self._conn.execute('COMMIT')
+            self._stats['commits'] += 1
+        except Exception as e:
+            lote.erro = e
+            self._stats['falhas'] += 1
+            try:
+                self._conn.execute('ROLLBACK')
+            except Exception:
+                pass
+        finally:
+            self._liberar_processos()
+            lote.confirmado.set()
+
+    @contextmanager
+    def _aninhada(self):
+        """Transação aberta dentro de outra da mesma thread"""
+        self._aninhadas += 1
+        nome = f'transacao_{self._aninhadas}'
+        self._conn.execute(f'SAVEPOINT {nome}')
+        try:
+            yield self._conn
+            self._conn.execute(f'RELEASE SAVEPOINT {nome}')
+        except BaseException:
+            self._conn.execute(f'ROLLBACK TO SAVEPOINT {nome}')
+            self._conn.execute(f'RELEASE SAVEPOINT {nome}')
+            raise
+        finally:
+            self._aninhadas -= 1
+
+    def em_transacao(self):
+        """Indica se a thread atual já está dentro de uma transação do escritor"""
+        return self._dono == threading.get_ident()
+
+    @contextmanager
+    def transacao(self):
+        """Executa uma transação de escrita no lote atual"""
+        if self._dono == threading.get_ident():
+            with self._aninhada() as conn:
+                yield conn
+            return
+
+        with self._contador_lock:
+            self._aguardando += 1
+        self._mutex.acquire()
+        with self._contador_lock:
+            self._aguardando -= 1
+        self._dono = threading.get_ident()
+
+        erro = None
+        try:
+            self._garantir_conexao()
+            if self._lote is None:
+                self._abrir_lote()
+            lote = self._lote
+            lote.membros += 1
+            self._stats['transacoes'] += 1
+
+            self._conn.execute('SAVEPOINT transacao')
+            try:
+                yield self._conn
+                self._conn.execute('RELEASE SAVEPOINT transacao')
+            except BaseException as e:
+                erro = e
+                self._conn.execute('ROLLBACK TO SAVEPOINT transacao')
+                self._conn.execute('RELEASE SAVEPOINT transacao')
+
+            # Sem ninguém na fila (ou lote cheio): confirmar agora
+            with self._contador_lock:
+                fila_vazia = self._aguardando == 0
+            if fila_vazia or lote.membros >= self.max_lote:
+                self._confirmar_lote()
+        except BaseException:
+            if self._lote is not None:
+                self._confirmar_lote()
+            raise
+        finally:
+            self._dono = None
+            self._mutex.release()
+
+        if erro is not None:
+            raise erro
+
+        # Só retorna depois que o COMMIT do lote aconteceu
+        lote.confirmado.wait()
+        if lote.erro is not None:
+            raise lote.erro
+
+    def stats(self):
+        """Retorna estatísticas do escritor"""
+        stats = dict(self._stats)
+        stats['transacoes_por_commit'] = round(
+            stats['transacoes'] / stats['commits'], 2) if stats['commits'] else 0
+        stats['aguardando'] = self._aguardando
+        return stats
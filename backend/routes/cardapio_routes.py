@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify
 from models.database import get_db
+from models.estatisticas import registrar_alteracao
 from utils.auth import token_required
 from utils.qrcode_generator import generate_menu_qrcode
 import os
@@ -12,7 +13,7 @@ cardapio_bp = Blueprint('cardapio', __name__)
 def list_cardapios():
     """Lista todos os cardápios (público para visualização)"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             ativo = request.args.get('ativo')
@@ -43,7 +44,7 @@ def list_cardapios():
 def get_cardapio(id):
     """Busca um cardápio com seus pratos (público)"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             # Buscar cardápio
@@ -122,6 +123,8 @@ def create_cardapio():
                         prato.get('ordem', idx)
                     ))
             
+            registrar_alteracao(cursor, 'cardapios')
+            
             return jsonify({
                 'message': 'Cardápio criado com sucesso',
                 'id': cardapio_id
@@ -177,6 +180,8 @@ def update_cardapio(id):
                         prato.get('ordem', idx)
                     ))
             
+            registrar_alteracao(cursor, 'cardapios')
+            
             return jsonify({'message': 'Cardápio atualizado com sucesso'}), 200
     
     except Exception as e:
@@ -200,6 +205,8 @@ def delete_cardapio(id):
                 WHERE id = ?
             ''', (id,))
             
+            registrar_alteracao(cursor, 'cardapios')
+            
             return jsonify({'message': 'Cardápio desativado com sucesso'}), 200
     
     except Exception as e:
@@ -240,7 +247,7 @@ def toggle_prato_disponibilidade(cardapio_id, prato_id):
 def list_mesas():
     """Lista todas as mesas"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -306,6 +313,8 @@ def create_mesa():
                     UPDATE mesas SET qrcode_url = ? WHERE id = ?
                 ''', (qrcode_url, mesa_id))
             
+            registrar_alteracao(cursor, 'mesas')
+            
             return jsonify({
                 'message': 'Mesa criada com sucesso',
                 'id': mesa_id,
@@ -359,6 +368,8 @@ def update_mesa(id):
                     UPDATE mesas SET qrcode_url = ? WHERE id = ?
                 ''', (qrcode_url, id))
             
+            registrar_alteracao(cursor, 'mesas')
+            
             return jsonify({
                 'message': 'Mesa atualizada com sucesso',
                 'qrcode_url': qrcode_url
@@ -1,6 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
+from models.analise_vendas import (
+    AGRUPAMENTOS, analise_disponivel, consultar_vendas, inicio_janela,
+    relatorio_vendas as relatorio_vendas_colunar
+)
 from models.database import get_db
-from utils.auth import token_required
+from models.engenharia_cardapio import CRITERIOS_ABC, analisar_cardapio, resumir
+from models.estatisticas import chaves_estatisticas, etag_estatisticas, obter_estatisticas, registrar_alteracao
+from models.custos import custo_efetivo_sql
+from models.estoque import EstoqueInsuficiente, movimentar_estoque
+from models.eventos import distribuidor, publicar
+from models.receitas import obter_receita, obter_receitas
+from models.rollups import registrar_vendas_rollup
+from utils.auth import SSE_TOKEN_TTL_S, generate_stream_token, token_required, token_sse_required
+from utils.exportacao import ler_formato, resposta_exportacao
+from utils.paginacao import (
+    LIMITE_PADRAO, ler_limite, codificar_cursor, decodificar_cursor, quer_ndjson, resposta_ndjson
+)
+from utils.periodos import intervalo_dias, agora_timestamp
 from datetime import datetime, timedelta
 
 dashboard_bp = Blueprint('dashboard', __name__)
@@ -10,127 +26,148 @@ dashboard_bp = Blueprint('dashboard', __name__)
 def get_stats():
     """Retorna estatísticas gerais do sistema"""
     try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            
-            # Total de ingredientes ativos
-            cursor.execute('SELECT COUNT(*) as total FROM ingredientes WHERE ativo = 1')
-            total_ingredientes = cursor.fetchone()['total']
-            
-            # Ingredientes com estoque baixo
-            cursor.execute('''
-                SELECT COUNT(*) as total FROM ingredientes 
-                WHERE ativo = 1 AND estoque_atual <= estoque_minimo
-            ''')
-            estoque_baixo = cursor.fetchone()['total']
-            
-            # Total de fichas técnicas ativas
-            cursor.execute('SELECT COUNT(*) as total FROM fichas_tecnicas WHERE ativo = 1')
-            total_fichas = cursor.fetchone()['total']
-            
-            # Total de mesas ativas
-            cursor.execute('SELECT COUNT(*) as total FROM mesas WHERE ativo = 1')
-            total_mesas = cursor.fetchone()['total']
-            
-            # Cardápios ativos
-            cursor.execute('SELECT COUNT(*) as total FROM cardapios WHERE ativo = 1')
-            total_cardapios = cursor.fetchone()['total']
-            
-            # Vendas do mês atual
-            primeiro_dia_mes = datetime.now().replace(day=1).strftime('%Y-%m-%d')
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_vendas,
-                    SUM(valor_total) as valor_total
-                FROM vendas
-                WHERE data_venda >= ?
-            ''', (primeiro_dia_mes,))
-            
-            vendas_mes = cursor.fetchone()
-            
-            # Vendas de hoje
-            hoje = datetime.now().strftime('%Y-%m-%d')
-            cursor.execute('''
-                SELECT 
-                    COUNT(*) as total_vendas,
-                    SUM(valor_total) as valor_total
-                FROM vendas
-                WHERE DATE(data_venda) = ?
-            ''', (hoje,))
-            
-            vendas_hoje = cursor.fetchone()
-            
-            return jsonify({
-                'ingredientes': {
-                    'total': total_ingredientes,
-                    'estoque_baixo': estoque_baixo
-                },
-                'fichas_tecnicas': {
-                    'total': total_fichas
-                },
-                'mesas': {
-                    'total': total_mesas
-                },
-                'cardapios': {
-                    'total': total_cardapios
-                },
-                'vendas_mes': {
-                    'total': vendas_mes['total_vendas'] or 0,
-                    'valor_total': vendas_mes['valor_total'] or 0
-                },
-                'vendas_hoje': {
-                    'total': vendas_hoje['total_vendas'] or 0,
-                    'valor_total': vendas_hoje['valor_total'] or 0
-                }
-            }), 200
+        # Cada parte é recalculada apenas quando a versão da sua tabela muda
+        agora = datetime.now()
+        chaves = chaves_estatisticas({
+            'vendas_mes': (agora.replace(day=1).strftime('%Y-%m-%d'),),
+            'vendas_hoje': (agora.strftime('%Y-%m-%d'),)
+        })
+        etag = etag_estatisticas(chaves)
+        
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = jsonify(obter_estatisticas(chaves))
+        
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/stream/token', methods=['POST'])
+@token_required
+def token_stream():
+    """Token curto para abrir o stream SSE (vai na query string do EventSource)"""
+    return jsonify({
+        'token': generate_stream_token(request.user),
+        'expira_em': SSE_TOKEN_TTL_S
+    })
+
+@dashboard_bp.route('/stream', methods=['GET'])
+@token_sse_required
+def stream_dashboard():
+    """Stream SSE com os deltas de vendas, estoque e estoque baixo
+
+    Eventos: `venda`, `estoque`, `estoque_baixo` e `recarregar` (o cliente
+    perdeu eventos e deve recarregar os dados). Na reconexão, o header
+    Last-Event-ID (ou `ultimo_id`) retoma a partir do último evento
+    recebido. O token da query string vem de POST /stream/token.
+    """
+    ultimo_id = request.headers.get('Last-Event-ID') or request.args.get('ultimo_id')
+    try:
+        ultimo_id = int(ultimo_id) if ultimo_id else None
+    except ValueError:
+        return jsonify({'error': 'Last-Event-ID inválido'}), 400
     
+    try:
+        assinante = distribuidor.inscrever(ultimo_id)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    if assinante is None:
+        response = jsonify({'error': 'Limite de conexões de stream atingido'})
+        response.headers['Retry-After'] = '30'
+        return response, 503
+    
+    response = Response(distribuidor.gerar(assinante), mimetype='text/event-stream')
+    # Cliente que desconecta antes do primeiro envio também é removido
+    response.call_on_close(lambda: distribuidor.cancelar(assinante))
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @dashboard_bp.route('/vendas', methods=['GET'])
 @token_required
 def get_vendas():
-    """Lista vendas com filtros"""
+    """Lista vendas com filtros, paginadas por cursor (limit/after)
+
+    A resposta traz no máximo `limit` vendas, da mais recente para a mais
+    antiga; quando há mais, o header X-Proximo-Cursor traz o valor de `after`
+    para a próxima página. Com `Accept: application/x-ndjson` todas as vendas
+    do filtro são enviadas em streaming, uma por linha.
+    """
+    ndjson = quer_ndjson(request)
     try:
-        with get_db() as conn:
+        inicio, fim = intervalo_dias(request.args.get('data_inicio'), request.args.get('data_fim'))
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+    
+    try:
+        limite = ler_limite(request.args.get('limit'), padrao=None if ndjson else LIMITE_PADRAO)
+        after = request.args.get('after')
+        cursor_after = decodificar_cursor(after, 2) if after else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        mesa_id = request.args.get('mesa_id')
+        
+        query = '''
+            SELECT 
+                v.*,
+                ft.nome_prato,
+                m.numero as mesa_numero,
+                u.nome as usuario_nome
+            FROM vendas v
+            JOIN fichas_tecnicas ft ON v.ficha_tecnica_id = ft.id
+            LEFT JOIN mesas m ON v.mesa_id = m.id
+            LEFT JOIN usuarios u ON v.usuario_id = u.id
+            WHERE 1=1
+        '''
+        params = []
+        
+        if inicio:
+            query += ' AND v.data_venda >= ?'
+            params.append(inicio)
+        
+        if fim:
+            query += ' AND v.data_venda < ?'
+            params.append(fim)
+        
+        if mesa_id:
+            query += ' AND v.mesa_id = ?'
+            params.append(mesa_id)
+        
+        # Keyset: continua após a última venda da página anterior
+        if cursor_after:
+            query += ' AND (v.data_venda < ? OR (v.data_venda = ? AND v.id < ?))'
+            params.extend([cursor_after[0], cursor_after[0], cursor_after[1]])
+        
+        # Ordem total (data_venda, id), coberta por idx_vendas_data_venda_id
+        query += ' ORDER BY v.data_venda DESC, v.id DESC'
+        
+        if ndjson:
+            if limite:
+                query += ' LIMIT ?'
+                params.append(limite)
+            return resposta_ndjson(query, params)
+        
+        # Uma linha a mais indica se existe próxima página
+        query += ' LIMIT ?'
+        params.append(limite + 1)
+        
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
-            
-            data_inicio = request.args.get('data_inicio')
-            data_fim = request.args.get('data_fim')
-            mesa_id = request.args.get('mesa_id')
-            
-            query = '''
-                SELECT 
-                    v.*,
-                    ft.nome_prato,
-                    m.numero as mesa_numero,
-                    u.nome as usuario_nome
-                FROM vendas v
-                JOIN fichas_tecnicas ft ON v.ficha_tecnica_id = ft.id
-                LEFT JOIN mesas m ON v.mesa_id = m.id
-                LEFT JOIN usuarios u ON v.usuario_id = u.id
-                WHERE 1=1
-            '''
-            params = []
-            
-            if data_inicio:
-                query += ' AND DATE(v.data_venda) >= ?'
-                params.append(data_inicio)
-            
-            if data_fim:
-                query += ' AND DATE(v.data_venda) <= ?'
-                params.append(data_fim)
-            
-            if mesa_id:
-                query += ' AND v.mesa_id = ?'
-                params.append(mesa_id)
-            
-            query += ' ORDER BY v.data_venda DESC'
-            
             cursor.execute(query, params)
             vendas = [dict(row) for row in cursor.fetchall()]
-            
-            return jsonify(vendas), 200
+        
+        response = jsonify(vendas[:limite])
+        if len(vendas) > limite:
+            ultima = vendas[limite - 1]
+            response.headers['X-Proximo-Cursor'] = codificar_cursor(ultima['data_venda'], ultima['id'])
+        return response, 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -150,7 +187,7 @@ def registrar_venda():
             
             # Buscar preço da ficha técnica
             cursor.execute('''
-                SELECT preco_venda, nome_prato FROM fichas_tecnicas WHERE id = ?
+                SELECT preco_venda, nome_prato, categoria, versao_receita FROM fichas_tecnicas WHERE id = ?
             ''', (data['ficha_tecnica_id'],))
             
             ficha = cursor.fetchone()
@@ -160,55 +197,51 @@ def registrar_venda():
             valor_unitario = ficha['preco_venda']
             quantidade = int(data['quantidade'])
             valor_total = valor_unitario * quantidade
+            data_venda = agora_timestamp()
             
             # Registrar venda
             cursor.execute('''
                 INSERT INTO vendas
-                (mesa_id, ficha_tecnica_id, quantidade, valor_unitario, valor_total, usuario_id)
-                VALUES (?, ?, ?, ?, ?, ?)
+                (mesa_id, ficha_tecnica_id, categoria, quantidade, valor_unitario, valor_total, usuario_id, data_venda)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (
                 data.get('mesa_id'),
                 data['ficha_tecnica_id'],
+                ficha['categoria'],
                 quantidade,
                 valor_unitario,
                 valor_total,
-                request.user['user_id']
+                request.user['user_id'],
+                data_venda
             ))
             
             venda_id = cursor.lastrowid
             
-            # Baixar ingredientes do estoque
-            cursor.execute('''
-                SELECT ingrediente_id, quantidade_gramas
-                FROM ficha_ingredientes
-                WHERE ficha_id = ?
-            ''', (data['ficha_tecnica_id'],))
+            # Atualizar rollups de vendas na mesma transação
+            registrar_vendas_rollup(cursor, [
+                (data_venda, int(data['ficha_tecnica_id']), ficha['categoria'], quantidade, valor_total)
+            ])
             
-            ingredientes = cursor.fetchall()
+            # Baixar ingredientes do estoque (receita vinda do cache)
+            receita = obter_receita(cursor, data['ficha_tecnica_id'], ficha['versao_receita'])
+            observacao = f'Venda: {ficha["nome_prato"]} (x{quantidade})'
+            movimentar_estoque(cursor, [
+                (ingrediente_id, 'saida', quantidade_total, observacao, None)
+                for ingrediente_id, quantidade_total in receita.consumo(quantidade)
+            ], request.user['user_id'])
             
-            for ing in ingredientes:
-                quantidade_total = (ing['quantidade_gramas'] / 1000) * quantidade
-                
-                # Atualizar estoque
-                cursor.execute('''
-                    UPDATE ingredientes
-                    SET estoque_atual = estoque_atual - ?,
-                        atualizado_em = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (quantidade_total, ing['ingrediente_id']))
-                
-                # Registrar movimentação
-                cursor.execute('''
-                    INSERT INTO movimentacoes_estoque
-                    (ingrediente_id, tipo, quantidade, usuario_id, observacao)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    ing['ingrediente_id'],
-                    'saida',
-                    quantidade_total,
-                    request.user['user_id'],
-                    f'Venda: {ficha["nome_prato"]} (x{quantidade})'
-                ))
+            registrar_alteracao(cursor, 'vendas')
+            
+            # Deltas para o stream do dashboard
+            publicar(cursor, 'venda', {'vendas': [{
+                'id': venda_id,
+                'ficha_tecnica_id': int(data['ficha_tecnica_id']),
+                'nome_prato': ficha['nome_prato'],
+                'mesa_id': data.get('mesa_id'),
+                'quantidade': quantidade,
+                'valor_total': valor_total,
+                'data_venda': data_venda
+            }]})
             
             return jsonify({
                 'message': 'Venda registrada com sucesso',
@@ -216,6 +249,165 @@ def registrar_venda():
                 'valor_total': valor_total
             }), 201
     
+    except EstoqueInsuficiente as e:
+        # A venda inteira é desfeita junto com a transação
+        return jsonify({'error': 'Estoque insuficiente', 'itens': e.itens}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/vendas/lote', methods=['POST'])
+@token_required
+def registrar_vendas_lote():
+    """Registra um ou mais pedidos em uma única transação
+
+    Aceita {"itens": [...], "mesa_id": ...} ou {"pedidos": [{"mesa_id": ..., "itens": [...]}]}.
+    O consumo de ingredientes é somado entre todas as linhas e aplicado
+    com um UPDATE por ingrediente distinto. Se faltar estoque para algum
+    ingrediente, nenhuma venda do lote é registrada.
+    """
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'O corpo deve ser um objeto JSON'}), 400
+
+    # Normalizar as linhas do lote
+    pedidos = data.get('pedidos')
+    if pedidos is None:
+        pedidos = [{'mesa_id': data.get('mesa_id'), 'itens': data.get('itens') or []}]
+    elif not isinstance(pedidos, list):
+        return jsonify({'error': 'pedidos deve ser uma lista'}), 400
+
+    linhas = []
+    for numero, pedido in enumerate(pedidos):
+        if not isinstance(pedido, dict):
+            return jsonify({'error': f'Pedido {numero}: deve ser um objeto'}), 400
+        itens = pedido.get('itens') or []
+        if not isinstance(itens, list):
+            return jsonify({'error': f'Pedido {numero}: itens deve ser uma lista'}), 400
+        for item in itens:
+            # Item que não é objeto vira uma linha com erro, como os incompletos
+            item = item if isinstance(item, dict) else {}
+            linhas.append({
+                'mesa_id': item.get('mesa_id', pedido.get('mesa_id')),
+                'ficha_tecnica_id': item.get('ficha_tecnica_id'),
+                'quantidade': item.get('quantidade')
+            })
+
+    if not linhas:
+        return jsonify({'error': 'Informe ao menos um item'}), 400
+
+    resultados = []
+    for idx, linha in enumerate(linhas):
+        resultado = {'linha': idx, 'ficha_tecnica_id': linha['ficha_tecnica_id']}
+        try:
+            linha['ficha_tecnica_id'] = int(linha['ficha_tecnica_id'] or 0)
+            linha['quantidade'] = int(linha['quantidade'])
+        except (TypeError, ValueError):
+            linha['quantidade'] = 0
+        if not linha['ficha_tecnica_id'] or linha['quantidade'] <= 0:
+            resultado.update({'status': 'erro', 'error': 'Ficha técnica e quantidade são obrigatórios'})
+        resultados.append(resultado)
+
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+
+            validas = [i for i, r in enumerate(resultados) if 'status' not in r]
+            fichas_ids = sorted({linhas[i]['ficha_tecnica_id'] for i in validas})
+
+            fichas = {}
+            receitas = {}
+            if fichas_ids:
+                marcadores = ', '.join('?' * len(fichas_ids))
+
+                # Preços de todas as fichas do lote
+                cursor.execute(f'''
+                    SELECT id, preco_venda, nome_prato, categoria, versao_receita FROM fichas_tecnicas
+                    WHERE id IN ({marcadores})
+                ''', fichas_ids)
+                fichas = {row['id']: row for row in cursor.fetchall()}
+
+                # Receitas de todas as fichas do lote (cache de receitas)
+                receitas = obter_receitas(
+                    cursor,
+                    {ficha_id: ficha['versao_receita'] for ficha_id, ficha in fichas.items()}
+                )
+
+            movimentacoes = []
+            vendas_rollup = []
+            vendas_evento = []
+            valor_lote = 0
+            data_venda = agora_timestamp()
+
+            for i in validas:
+                linha = linhas[i]
+                ficha = fichas.get(linha['ficha_tecnica_id'])
+                if not ficha:
+                    resultados[i].update({'status': 'erro', 'error': 'Ficha técnica não encontrada'})
+                    continue
+
+                quantidade = linha['quantidade']
+                valor_unitario = ficha['preco_venda']
+                valor_total = valor_unitario * quantidade
+
+                cursor.execute('''
+                    INSERT INTO vendas
+                    (mesa_id, ficha_tecnica_id, categoria, quantidade, valor_unitario, valor_total, usuario_id, data_venda)
+                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                ''', (
+                    linha['mesa_id'],
+                    linha['ficha_tecnica_id'],
+                    ficha['categoria'],
+                    quantidade,
+                    valor_unitario,
+                    valor_total,
+                    request.user['user_id'],
+                    data_venda
+                ))
+                vendas_rollup.append((
+                    data_venda, linha['ficha_tecnica_id'], ficha['categoria'], quantidade, valor_total
+                ))
+
+                resultados[i].update({
+                    'status': 'ok',
+                    'id': cursor.lastrowid,
+                    'quantidade': quantidade,
+                    'valor_total': valor_total
+                })
+                valor_lote += valor_total
+                vendas_evento.append({
+                    'id': resultados[i]['id'],
+                    'ficha_tecnica_id': linha['ficha_tecnica_id'],
+                    'nome_prato': ficha['nome_prato'],
+                    'mesa_id': linha['mesa_id'],
+                    'quantidade': quantidade,
+                    'valor_total': valor_total,
+                    'data_venda': data_venda
+                })
+
+                observacao = f'Venda: {ficha["nome_prato"]} (x{quantidade})'
+                movimentacoes.extend(
+                    (ingrediente_id, 'saida', quantidade_total, observacao, None)
+                    for ingrediente_id, quantidade_total in receitas[linha['ficha_tecnica_id']].consumo(quantidade)
+                )
+
+            registrar_vendas_rollup(cursor, vendas_rollup)
+            if vendas_rollup:
+                # Um UPDATE por ingrediente distinto
+                movimentar_estoque(cursor, movimentacoes, request.user['user_id'])
+                registrar_alteracao(cursor, 'vendas')
+                publicar(cursor, 'venda', {'vendas': vendas_evento})
+
+            registradas = sum(1 for r in resultados if r['status'] == 'ok')
+
+            return jsonify({
+                'message': f'{registradas} de {len(resultados)} itens registrados',
+                'registradas': registradas,
+                'valor_total': valor_lote,
+                'itens': resultados
+            }), 201 if registradas else 400
+
+    except EstoqueInsuficiente as e:
+        return jsonify({'error': 'Estoque insuficiente', 'itens': e.itens}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -230,7 +422,26 @@ def relatorio_vendas():
         if not data_inicio or not data_fim:
             return jsonify({'error': 'data_inicio e data_fim são obrigatórios'}), 400
         
-        with get_db() as conn:
+        try:
+            inicio, fim = intervalo_dias(data_inicio, data_fim)
+        except ValueError:
+            return jsonify({'error': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+        
+        # Com NumPy, o relatório sai do snapshot colunar em memória, se o
+        # período estiver dentro da janela mantida nele
+        janela = inicio_janela()
+        if analise_disponivel() and (janela is None or inicio >= janela):
+            relatorio = relatorio_vendas_colunar(inicio, fim)
+            return jsonify({
+                'periodo': {
+                    'data_inicio': data_inicio,
+                    'data_fim': data_fim
+                },
+                **relatorio
+            }), 200
+        
+        # Consultas sobre os rollups: custo proporcional aos dias do período
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             # Vendas por prato
@@ -238,12 +449,12 @@ def relatorio_vendas():
                 SELECT 
                     ft.nome_prato,
                     ft.categoria,
-                    SUM(v.quantidade) as quantidade_total,
-                    SUM(v.valor_total) as valor_total
-                FROM vendas v
-                JOIN fichas_tecnicas ft ON v.ficha_tecnica_id = ft.id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
-                GROUP BY v.ficha_tecnica_id
+                    SUM(r.quantidade) as quantidade_total,
+                    SUM(r.valor_total) as valor_total
+                FROM vendas_diarias_prato r
+                JOIN fichas_tecnicas ft ON r.ficha_tecnica_id = ft.id
+                WHERE r.dia >= ? AND r.dia <= ?
+                GROUP BY ft.id
                 ORDER BY valor_total DESC
             ''', (data_inicio, data_fim))
             
@@ -252,40 +463,53 @@ def relatorio_vendas():
             # Vendas por dia
             cursor.execute('''
                 SELECT 
-                    DATE(data_venda) as data,
-                    COUNT(*) as total_vendas,
+                    dia as data,
+                    SUM(total_vendas) as total_vendas,
                     SUM(valor_total) as valor_total
-                FROM vendas
-                WHERE DATE(data_venda) BETWEEN ? AND ?
-                GROUP BY DATE(data_venda)
-                ORDER BY data
+                FROM vendas_diarias_prato
+                WHERE dia >= ? AND dia <= ?
+                GROUP BY dia
+                ORDER BY dia
             ''', (data_inicio, data_fim))
             
             vendas_por_dia = [dict(row) for row in cursor.fetchall()]
             
-            # Vendas por categoria
+            # Vendas por categoria (a da ficha no momento da venda, como no snapshot)
             cursor.execute('''
                 SELECT 
-                    ft.categoria,
-                    COUNT(*) as total_vendas,
-                    SUM(v.valor_total) as valor_total
-                FROM vendas v
-                JOIN fichas_tecnicas ft ON v.ficha_tecnica_id = ft.id
-                WHERE DATE(v.data_venda) BETWEEN ? AND ?
-                GROUP BY ft.categoria
+                    NULLIF(categoria, '') as categoria,
+                    SUM(total_vendas) as total_vendas,
+                    SUM(valor_total) as valor_total
+                FROM vendas_horarias_categoria
+                WHERE dia >= ? AND dia <= ?
+                GROUP BY categoria
                 ORDER BY valor_total DESC
             ''', (data_inicio, data_fim))
             
             vendas_por_categoria = [dict(row) for row in cursor.fetchall()]
             
+            # Vendas por hora do dia
+            cursor.execute('''
+                SELECT 
+                    hora,
+                    SUM(total_vendas) as total_vendas,
+                    SUM(valor_total) as valor_total
+                FROM vendas_horarias_categoria
+                WHERE dia >= ? AND dia <= ?
+                GROUP BY hora
+                ORDER BY hora
+            ''', (data_inicio, data_fim))
+            
+            vendas_por_hora = [dict(row) for row in cursor.fetchall()]
+            
             # Total geral
             cursor.execute('''
                 SELECT 
-                    COUNT(*) as total_vendas,
+                    COALESCE(SUM(total_vendas), 0) as total_vendas,
                     SUM(valor_total) as valor_total,
-                    AVG(valor_total) as ticket_medio
-                FROM vendas
-                WHERE DATE(data_venda) BETWEEN ? AND ?
+                    SUM(valor_total) / NULLIF(SUM(total_vendas), 0) as ticket_medio
+                FROM vendas_diarias_prato
+                WHERE dia >= ? AND dia <= ?
             ''', (data_inicio, data_fim))
             
             totais = dict(cursor.fetchone())
@@ -298,30 +522,214 @@ def relatorio_vendas():
                 'totais': totais,
                 'vendas_por_prato': vendas_por_prato,
                 'vendas_por_dia': vendas_por_dia,
-                'vendas_por_categoria': vendas_por_categoria
+                'vendas_por_categoria': vendas_por_categoria,
+                'vendas_por_hora': vendas_por_hora
             }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@dashboard_bp.route('/relatorio/vendas/export', methods=['GET'])
+@token_required
+def exportar_relatorio_vendas():
+    """Exporta as vendas do período, uma por linha, em CSV ou XLSX"""
+    data_inicio = request.args.get('data_inicio')
+    data_fim = request.args.get('data_fim')
+    
+    if not data_inicio or not data_fim:
+        return jsonify({'error': 'data_inicio e data_fim são obrigatórios'}), 400
+    
+    try:
+        inicio, fim = intervalo_dias(data_inicio, data_fim)
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+    
+    try:
+        formato = ler_formato(request.args.get('formato'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = '''
+        SELECT 
+            v.id,
+            v.data_venda,
+            ft.nome_prato,
+            ft.categoria,
+            m.numero as mesa_numero,
+            v.quantidade,
+            v.valor_unitario,
+            v.valor_total,
+            u.nome as usuario_nome
+        FROM vendas v
+        JOIN fichas_tecnicas ft ON v.ficha_tecnica_id = ft.id
+        LEFT JOIN mesas m ON v.mesa_id = m.id
+        LEFT JOIN usuarios u ON v.usuario_id = u.id
+        WHERE v.data_venda >= ? AND v.data_venda < ?
+        ORDER BY v.data_venda, v.id
+    '''
+    colunas = [
+        ('id', 'Venda'),
+        ('data_venda', 'Data'),
+        ('nome_prato', 'Prato'),
+        ('categoria', 'Categoria'),
+        ('mesa_numero', 'Mesa'),
+        ('quantidade', 'Quantidade'),
+        ('valor_unitario', 'Valor unitário'),
+        ('valor_total', 'Valor total'),
+        ('usuario_nome', 'Usuário')
+    ]
+    return resposta_exportacao(query, (inicio, fim), colunas,
+                               f'vendas_{data_inicio}_{data_fim}', formato)
+
+@dashboard_bp.route('/analise', methods=['GET'])
+@token_required
+def analise_vendas():
+    """Agrega vendas por prato, categoria, dia, hora, dia da semana ou mesa
+
+    Filtros opcionais: data_inicio/data_fim, ficha_id, categoria, mesa_id,
+    dia_semana (0 = segunda) e hora. `ordenar` aceita valor_total (padrão),
+    quantidade_total, total_vendas, margem ou chave. Cobre as vendas dos
+    últimos ANALISE_VENDAS_DIAS dias.
+    """
+    if not analise_disponivel():
+        return jsonify({'error': 'Análises indisponíveis (numpy não instalado)'}), 501
+    
+    agrupar = request.args.get('agrupar')
+    if agrupar not in AGRUPAMENTOS:
+        return jsonify({'error': f'agrupar deve ser um de: {", ".join(AGRUPAMENTOS)}'}), 400
+    
+    ordenar = request.args.get('ordenar', 'valor_total')
+    if ordenar not in ('valor_total', 'quantidade_total', 'total_vendas', 'margem', 'chave'):
+        return jsonify({'error': 'ordenar inválido'}), 400
+    
+    try:
+        inicio, fim = intervalo_dias(request.args.get('data_inicio'), request.args.get('data_fim'))
+        consulta = consultar_vendas().filtrar(
+            inicio=inicio,
+            fim=fim,
+            ficha_id=request.args.get('ficha_id', type=int),
+            categoria=request.args.get('categoria'),
+            mesa_id=request.args.get('mesa_id', type=int),
+            dia_semana=request.args.get('dia_semana', type=int),
+            hora=request.args.get('hora', type=int)
+        )
+        limite = ler_limite(request.args.get('limit'), padrao=None)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        grupos = consulta.agrupar(agrupar)
+        if ordenar != 'chave':
+            grupos.sort(key=lambda g: g[ordenar], reverse=True)
+        
+        return jsonify({
+            'agrupar': agrupar,
+            'totais': consulta.totais(),
+            'grupos': grupos[:limite] if limite else grupos
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/analise/ticket', methods=['GET'])
+@token_required
+def analise_ticket():
+    """Distribuição do valor das vendas (percentis e histograma)"""
+    if not analise_disponivel():
+        return jsonify({'error': 'Análises indisponíveis (numpy não instalado)'}), 501
+    
+    try:
+        inicio, fim = intervalo_dias(request.args.get('data_inicio'), request.args.get('data_fim'))
+        faixas = int(request.args.get('faixas', 10))
+        if faixas < 1 or faixas > 100:
+            raise ValueError('faixas deve estar entre 1 e 100')
+        consulta = consultar_vendas().filtrar(
+            inicio=inicio,
+            fim=fim,
+            ficha_id=request.args.get('ficha_id', type=int),
+            categoria=request.args.get('categoria'),
+            mesa_id=request.args.get('mesa_id', type=int),
+            dia_semana=request.args.get('dia_semana', type=int)
+        )
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        return jsonify(consulta.distribuicao('valor', faixas)), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@dashboard_bp.route('/engenharia-cardapio', methods=['GET'])
+@token_required
+def engenharia_cardapio():
+    """Curva ABC e matriz de engenharia de cardápio dos pratos no período
+
+    Quadrantes: estrela (popular e rentável), burro_de_carga (popular, pouco
+    rentável), quebra_cabeca (rentável, pouco popular) e cao. A análise é
+    feita sobre todo o cardápio e guardada em cache por período; o filtro
+    `categoria` apenas seleciona os pratos do resultado.
+    """
+    data_inicio = request.args.get('data_inicio')
+    data_fim = request.args.get('data_fim')
+    
+    if not data_inicio or not data_fim:
+        return jsonify({'error': 'data_inicio e data_fim são obrigatórios'}), 400
+    
+    try:
+        intervalo_dias(data_inicio, data_fim)
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+    
+    criterio = request.args.get('criterio', 'valor_total')
+    if criterio not in CRITERIOS_ABC:
+        return jsonify({'error': f'criterio deve ser um de: {", ".join(CRITERIOS_ABC)}'}), 400
+    
+    try:
+        parametros, pratos = analisar_cardapio(data_inicio, data_fim, criterio)
+        
+        categoria = request.args.get('categoria')
+        if categoria:
+            pratos = [p for p in pratos if p['categoria'] == categoria]
+        
+        quadrante = request.args.get('quadrante')
+        if quadrante:
+            pratos = [p for p in pratos if p['quadrante'] == quadrante]
+        
+        return jsonify({
+            'periodo': {
+                'data_inicio': data_inicio,
+                'data_fim': data_fim
+            },
+            'criterio_abc': criterio,
+            'parametros': parametros,
+            'resumo': resumir(pratos),
+            'pratos': pratos
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @dashboard_bp.route('/relatorio/estoque', methods=['GET'])
 @token_required
 def relatorio_estoque():
     """Gera relatório de estoque atual"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT 
                     i.*,
-                    (i.estoque_atual * i.custo_unitario / 1000) as valor_estoque,
+                    (i.estoque_atual * {custo_efetivo_sql('i')} / 1000) as valor_estoque,
                     CASE 
-                        WHEN i.estoque_atual <= i.estoque_minimo THEN 'critico'
+                        WHEN a.ingrediente_id IS NOT NULL THEN 'critico'
                         WHEN i.estoque_atual <= (i.estoque_minimo * 1.5) THEN 'baixo'
                         ELSE 'normal'
-                    END as status_estoque
+                    END as status_estoque,
+                    a.inicio as alerta_desde
                 FROM ingredientes i
+                LEFT JOIN alertas_estoque a ON a.ingrediente_id = i.id AND a.fim IS NULL
                 WHERE i.ativo = 1
                 ORDER BY status_estoque DESC, i.nome
             ''')
@@ -343,3 +751,49 @@ def relatorio_estoque():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+
+@dashboard_bp.route('/relatorio/estoque/export', methods=['GET'])
+@token_required
+def exportar_relatorio_estoque():
+    """Exporta o estoque atual em CSV ou XLSX"""
+    try:
+        formato = ler_formato(request.args.get('formato'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = f'''
+        SELECT 
+            i.id,
+            i.nome,
+            i.unidade_medida,
+            i.fornecedor,
+            i.estoque_atual,
+            i.estoque_minimo,
+            {custo_efetivo_sql('i')} as custo_medio,
+            (i.estoque_atual * {custo_efetivo_sql('i')} / 1000) as valor_estoque,
+            CASE 
+                WHEN a.ingrediente_id IS NOT NULL THEN 'critico'
+                WHEN i.estoque_atual <= (i.estoque_minimo * 1.5) THEN 'baixo'
+                ELSE 'normal'
+            END as status_estoque,
+            a.inicio as alerta_desde
+        FROM ingredientes i
+        LEFT JOIN alertas_estoque a ON a.ingrediente_id = i.id AND a.fim IS NULL
+        WHERE i.ativo = 1
+        ORDER BY status_estoque DESC, i.nome
+    '''
+    colunas = [
+        ('id', 'Ingrediente'),
+        ('nome', 'Nome'),
+        ('unidade_medida', 'Unidade'),
+        ('fornecedor', 'Fornecedor'),
+        ('estoque_atual', 'Estoque atual'),
+        ('estoque_minimo', 'Estoque mínimo'),
+        ('custo_medio', 'Custo médio'),
+        ('valor_estoque', 'Valor em estoque'),
+        ('status_estoque', 'Status'),
+        ('alerta_desde', 'Em alerta desde')
+    ]
+    return resposta_exportacao(query, (), colunas,
+                               f'estoque_{datetime.now().strftime("%Y-%m-%d")}', formato)
@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify
 from models.database import get_db
+from models.custos import custo_efetivo_sql
+from models.busca import juncao_busca
+from models.estatisticas import registrar_alteracao
+from models.receitas import invalidar_receita
 from utils.auth import token_required
 
 fichas_bp = Blueprint('fichas', __name__)
@@ -9,25 +13,32 @@ fichas_bp = Blueprint('fichas', __name__)
 def list_fichas():
     """Lista todas as fichas técnicas"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             ativo = request.args.get('ativo', '1')
             categoria = request.args.get('categoria', '')
             search = request.args.get('search', '')
             
-            query = 'SELECT * FROM fichas_tecnicas WHERE ativo = ?'
-            params = [ativo]
+            query = 'SELECT fichas_tecnicas.* FROM fichas_tecnicas'
+            params = []
+            ordem = 'nome_prato'
+            
+            # Busca por prefixo, sem acentos, no índice de nome e descrição
+            juncao, params_busca = juncao_busca('fichas', search)
+            if juncao:
+                query += juncao
+                params.extend(params_busca)
+                ordem = 'busca.relevancia, nome_prato'
+            
+            query += ' WHERE ativo = ?'
+            params.append(ativo)
             
             if categoria:
                 query += ' AND categoria = ?'
                 params.append(categoria)
             
-            if search:
-                query += ' AND nome_prato LIKE ?'
-                params.append(f'%{search}%')
-            
-            query += ' ORDER BY nome_prato'
+            query += f' ORDER BY {ordem}'
             
             cursor.execute(query, params)
             fichas = [dict(row) for row in cursor.fetchall()]
@@ -42,7 +53,7 @@ def list_fichas():
 def get_ficha(id):
     """Busca uma ficha técnica por ID com seus ingredientes"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             # Buscar ficha
@@ -55,7 +66,7 @@ def get_ficha(id):
             ficha_dict = dict(ficha)
             
             # Buscar ingredientes da ficha
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT 
                     fi.id,
                     fi.quantidade_gramas,
@@ -63,7 +74,7 @@ def get_ficha(id):
                     i.id as ingrediente_id,
                     i.nome as ingrediente_nome,
                     i.unidade_medida,
-                    i.custo_unitario
+                    {custo_efetivo_sql('i')} as custo_unitario
                 FROM ficha_ingredientes fi
                 JOIN ingredientes i ON fi.ingrediente_id = i.id
                 WHERE fi.ficha_id = ?
@@ -104,8 +115,8 @@ def create_ficha():
                     return jsonify({'error': 'Ingrediente e quantidade são obrigatórios'}), 400
                 
                 # Buscar custo do ingrediente
-                cursor.execute('''
-                    SELECT custo_unitario, unidade_medida 
+                cursor.execute(f'''
+                    SELECT {custo_efetivo_sql()} as custo_unitario, unidade_medida 
                     FROM ingredientes 
                     WHERE id = ?
                 ''', (ing['ingrediente_id'],))
@@ -117,7 +128,7 @@ def create_ficha():
                 # Calcular custo parcial (convertendo gramas para a unidade do ingrediente)
                 quantidade_gramas = float(ing['quantidade_gramas'])
                 
-                # Assumindo que custo_unitario é por kg
+                # Assumindo que custo_unitario é por kg (custo médio ponderado das entradas)
                 custo_parcial = (quantidade_gramas / 1000) * ingrediente['custo_unitario']
                 
                 custo_total += custo_parcial
@@ -167,6 +178,8 @@ def create_ficha():
                     ing['custo_parcial']
                 ))
             
+            registrar_alteracao(cursor, 'fichas_tecnicas')
+            
             return jsonify({
                 'message': 'Ficha técnica criada com sucesso',
                 'id': ficha_id,
@@ -200,8 +213,8 @@ def update_ficha(id):
                 # Calcular novo custo
                 custo_total = 0
                 for ing in data['ingredientes']:
-                    cursor.execute('''
-                        SELECT custo_unitario FROM ingredientes WHERE id = ?
+                    cursor.execute(f'''
+                        SELECT {custo_efetivo_sql()} as custo_unitario FROM ingredientes WHERE id = ?
                     ''', (ing['ingrediente_id'],))
                     
                     ingrediente = cursor.fetchone()
@@ -220,6 +233,14 @@ def update_ficha(id):
                     ''', (id, ing['ingrediente_id'], quantidade_gramas, custo_parcial))
                 
                 data['custo_total'] = custo_total
+                
+                # Invalidar o cache de receitas (todos os workers via versão)
+                cursor.execute('''
+                    UPDATE fichas_tecnicas
+                    SET versao_receita = COALESCE(versao_receita, 0) + 1
+                    WHERE id = ?
+                ''', (id,))
+                invalidar_receita(id)
             
             # Recalcular margem se necessário
             if data.get('preco_venda') and data.get('custo_total'):
@@ -250,6 +271,8 @@ def update_ficha(id):
                 id
             ))
             
+            registrar_alteracao(cursor, 'fichas_tecnicas')
+            
             return jsonify({'message': 'Ficha técnica atualizada com sucesso'}), 200
     
     except Exception as e:
@@ -273,6 +296,8 @@ def delete_ficha(id):
                 WHERE id = ?
             ''', (id,))
             
+            registrar_alteracao(cursor, 'fichas_tecnicas')
+            
             return jsonify({'message': 'Ficha técnica desativada com sucesso'}), 200
     
     except Exception as e:
@@ -283,7 +308,7 @@ def delete_ficha(id):
 def get_categorias():
     """Lista todas as categorias de fichas técnicas"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             cursor.execute('''
@@ -1,6 +1,20 @@
 from flask import Blueprint, request, jsonify
 from models.database import get_db
+from models.estatisticas import registrar_alteracao
+from models.estoque_historico import estoque_em, ler_momento
+from models.alertas_estoque import registrar_estoque_alterado
+from models.busca import juncao_busca
+from models.custos import (
+    CUSTO_FIFO, camadas_abertas, custo_efetivo_sql, custo_em_sql, registrar_custo_referencia
+)
+from models.estoque import EstoqueInsuficiente, IngredienteNaoEncontrado, movimentar_estoque
+from models.previsao_consumo import ler_horizonte, prever_consumo, previsao_disponivel
 from utils.auth import token_required
+from utils.importacao import ler_linhas_importacao, ler_numero
+from utils.paginacao import (
+    LIMITE_PADRAO, ler_limite, codificar_cursor, decodificar_cursor, quer_ndjson, resposta_ndjson
+)
+from utils.periodos import intervalo_dias
 
 ingredientes_bp = Blueprint('ingredientes', __name__)
 
@@ -9,21 +23,28 @@ ingredientes_bp = Blueprint('ingredientes', __name__)
 def list_ingredientes():
     """Lista todos os ingredientes"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             # Filtros opcionais
             ativo = request.args.get('ativo', '1')
             search = request.args.get('search', '')
             
-            query = 'SELECT * FROM ingredientes WHERE ativo = ?'
-            params = [ativo]
+            query = 'SELECT ingredientes.* FROM ingredientes'
+            params = []
+            ordem = 'nome'
+            
+            # Busca por prefixo, sem acentos, no índice de nome e fornecedor
+            juncao, params_busca = juncao_busca('ingredientes', search)
+            if juncao:
+                query += juncao
+                params.extend(params_busca)
+                ordem = 'busca.relevancia, nome'
             
-            if search:
-                query += ' AND nome LIKE ?'
-                params.append(f'%{search}%')
+            query += ' WHERE ativo = ?'
+            params.append(ativo)
             
-            query += ' ORDER BY nome'
+            query += f' ORDER BY {ordem}'
             
             cursor.execute(query, params)
             ingredientes = [dict(row) for row in cursor.fetchall()]
@@ -38,7 +59,7 @@ def list_ingredientes():
 def get_ingrediente(id):
     """Busca um ingrediente por ID"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
             cursor.execute('SELECT * FROM ingredientes WHERE id = ?', (id,))
@@ -64,6 +85,15 @@ def create_ingrediente():
         if not data.get(field):
             return jsonify({'error': f'Campo {field} é obrigatório'}), 400
     
+    try:
+        estoque_inicial = ler_numero(data.get('estoque_atual') or 0)
+        custo = ler_numero(data['custo_unitario'])
+    except ValueError:
+        return jsonify({'error': 'Estoque inicial e custo unitário devem ser numéricos'}), 400
+    
+    if estoque_inicial < 0:
+        return jsonify({'error': 'Estoque inicial não pode ser negativo'}), 400
+    
     try:
         with get_db() as conn:
             cursor = conn.cursor()
@@ -71,31 +101,27 @@ def create_ingrediente():
             cursor.execute('''
                 INSERT INTO ingredientes 
                 (nome, unidade_medida, custo_unitario, estoque_atual, estoque_minimo, fornecedor)
-                VALUES (?, ?, ?, ?, ?, ?)
+                VALUES (?, ?, ?, 0, ?, ?)
             ''', (
                 data['nome'],
                 data['unidade_medida'],
-                data['custo_unitario'],
-                data.get('estoque_atual', 0),
+                custo,
                 data.get('estoque_minimo', 0),
                 data.get('fornecedor', '')
             ))
             
             ingrediente_id = cursor.lastrowid
             
-            # Registrar movimentação inicial se houver estoque
-            if data.get('estoque_atual', 0) > 0:
-                cursor.execute('''
-                    INSERT INTO movimentacoes_estoque
-                    (ingrediente_id, tipo, quantidade, usuario_id, observacao)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
-                    ingrediente_id,
-                    'entrada',
-                    data.get('estoque_atual', 0),
-                    request.user['user_id'],
-                    'Estoque inicial'
-                ))
+            # Estoque inicial entra como movimentação, para o livro fechar com o estoque
+            if estoque_inicial > 0:
+                movimentar_estoque(cursor, [
+                    (ingrediente_id, 'entrada', estoque_inicial, 'Estoque inicial', custo)
+                ], request.user['user_id'])
+            else:
+                # Sem entrada, o custo de referência inicia o histórico de custos
+                registrar_custo_referencia(cursor, ingrediente_id, custo)
+                registrar_alteracao(cursor, 'ingredientes')
+                registrar_estoque_alterado(cursor, [ingrediente_id])
             
             return jsonify({
                 'message': 'Ingrediente criado com sucesso',
@@ -111,6 +137,15 @@ def update_ingrediente(id):
     """Atualiza um ingrediente"""
     data = request.get_json()
     
+    custo = None
+    if data.get('custo_unitario') is not None:
+        try:
+            custo = ler_numero(data['custo_unitario'])
+        except ValueError:
+            custo = -1
+        if custo < 0:
+            return jsonify({'error': 'Custo unitário inválido'}), 400
+    
     try:
         with get_db() as conn:
             cursor = conn.cursor()
@@ -131,12 +166,19 @@ def update_ingrediente(id):
             ''', (
                 data.get('nome', ingrediente_atual['nome']),
                 data.get('unidade_medida', ingrediente_atual['unidade_medida']),
-                data.get('custo_unitario', ingrediente_atual['custo_unitario']),
+                ingrediente_atual['custo_unitario'] if custo is None else custo,
                 data.get('estoque_minimo', ingrediente_atual['estoque_minimo']),
                 data.get('fornecedor', ingrediente_atual['fornecedor']),
                 id
             ))
             
+            # Custo de referência: só vale enquanto não há custo médio (entradas com custo)
+            if custo is not None and custo != ingrediente_atual['custo_unitario']:
+                registrar_custo_referencia(cursor, id, custo)
+            
+            registrar_alteracao(cursor, 'ingredientes')
+            registrar_estoque_alterado(cursor, [id])
+            
             return jsonify({'message': 'Ingrediente atualizado com sucesso'}), 200
     
     except Exception as e:
@@ -160,6 +202,10 @@ def delete_ingrediente(id):
                 WHERE id = ?
             ''', (id,))
             
+            registrar_alteracao(cursor, 'ingredientes')
+            # Ingrediente inativo sai do conjunto de alertas
+            registrar_estoque_alterado(cursor, [id])
+            
             return jsonify({'message': 'Ingrediente desativado com sucesso'}), 200
     
     except Exception as e:
@@ -180,52 +226,440 @@ def atualizar_estoque(id):
     if tipo not in ['entrada', 'saida']:
         return jsonify({'error': 'Tipo deve ser entrada ou saida'}), 400
     
+    if quantidade <= 0:
+        return jsonify({'error': 'Quantidade deve ser maior que zero'}), 400
+    
+    # Custo pago na entrada (opcional): atualiza o custo médio do ingrediente
+    custo = None
+    if tipo == 'entrada' and data.get('custo_unitario') not in (None, ''):
+        try:
+            custo = ler_numero(data['custo_unitario'])
+        except ValueError:
+            custo = -1
+        if custo < 0:
+            return jsonify({'error': 'Custo unitário inválido'}), 400
+    
     try:
         with get_db() as conn:
             cursor = conn.cursor()
             
-            # Buscar estoque atual
-            cursor.execute('SELECT estoque_atual FROM ingredientes WHERE id = ?', (id,))
-            ingrediente = cursor.fetchone()
+            # Atualização relativa e atômica; saída maior que o estoque é recusada
+            saldos = movimentar_estoque(cursor, [
+                (id, tipo, quantidade, data.get('observacao', ''), custo)
+            ], request.user['user_id'])
+            estoque_anterior, novo_estoque = saldos[id]
             
-            if not ingrediente:
-                return jsonify({'error': 'Ingrediente não encontrado'}), 404
+            return jsonify({
+                'message': 'Estoque atualizado com sucesso',
+                'estoque_anterior': estoque_anterior,
+                'estoque_atual': novo_estoque
+            }), 200
+    
+    except IngredienteNaoEncontrado:
+        return jsonify({'error': 'Ingrediente não encontrado'}), 404
+    except EstoqueInsuficiente:
+        return jsonify({'error': 'Estoque insuficiente'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _buscar_ingredientes(cursor, ids, nomes):
+    """Ingredientes referenciados por id ou nome, em consultas por conjunto"""
+    por_id, por_nome = {}, {}
+    ids, nomes = sorted(ids), sorted(nomes)
+    
+    # Blocos de 500 para ficar abaixo do limite de parâmetros do SQLite
+    for i in range(0, len(ids), 500):
+        bloco = ids[i:i + 500]
+        cursor.execute(f'''
+            SELECT id, nome, ativo FROM ingredientes WHERE id IN ({', '.join('?' * len(bloco))})
+        ''', bloco)
+        por_id.update({row['id']: row for row in cursor.fetchall()})
+    
+    for i in range(0, len(nomes), 500):
+        bloco = nomes[i:i + 500]
+        cursor.execute(f'''
+            SELECT id, nome, ativo FROM ingredientes
+            WHERE ativo = 1 AND LOWER(nome) IN ({', '.join('?' * len(bloco))})
+        ''', bloco)
+        for row in cursor.fetchall():
+            por_nome.setdefault(row['nome'].lower(), []).append(row)
+    
+    return por_id, por_nome
+
+@ingredientes_bp.route('/estoque/entradas', methods=['POST'])
+@token_required
+def importar_entradas():
+    """Registra entradas de estoque em lote (ex.: nota de fornecedor)
+
+    Aceita CSV (colunas ingrediente, quantidade e opcionalmente custo e
+    observacao), NDJSON ou JSON com a lista de itens. O ingrediente pode ser
+    informado pelo id ou pelo nome. Linhas inválidas são reportadas sem
+    impedir as demais, que são gravadas em uma única transação.
+    """
+    observacao_padrao = request.args.get('observacao') or 'Entrada em lote'
+    
+    linhas = []
+    resultados = []
+    try:
+        for numero, item in ler_linhas_importacao(request):
+            resultado = {'linha': numero, 'ingrediente': item.get('ingrediente', item.get('ingrediente_id'))}
+            resultados.append(resultado)
+            if '_erro' in item:
+                resultado.update({'status': 'erro', 'error': item['_erro']})
+                continue
             
-            estoque_atual = ingrediente['estoque_atual']
+            try:
+                quantidade = ler_numero(item.get('quantidade'))
+                custo = item.get('custo', item.get('custo_unitario'))
+                custo = ler_numero(custo) if custo not in (None, '') else None
+            except (TypeError, ValueError):
+                resultado.update({'status': 'erro', 'error': 'Quantidade ou custo inválido'})
+                continue
             
-            # Calcular novo estoque
-            if tipo == 'entrada':
-                novo_estoque = estoque_atual + quantidade
+            referencia = str(resultado['ingrediente'] or '').strip()
+            if not referencia:
+                resultado.update({'status': 'erro', 'error': 'Ingrediente é obrigatório'})
+            elif quantidade <= 0:
+                resultado.update({'status': 'erro', 'error': 'Quantidade deve ser maior que zero'})
+            elif custo is not None and custo < 0:
+                resultado.update({'status': 'erro', 'error': 'Custo não pode ser negativo'})
             else:
-                novo_estoque = estoque_atual - quantidade
-                if novo_estoque < 0:
-                    return jsonify({'error': 'Estoque insuficiente'}), 400
+                linhas.append((resultado, referencia, quantidade, custo, item.get('observacao') or observacao_padrao))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if not resultados:
+        return jsonify({'error': 'Informe ao menos um item'}), 400
+    
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
             
-            # Atualizar estoque
-            cursor.execute('''
-                UPDATE ingredientes
-                SET estoque_atual = ?, atualizado_em = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (novo_estoque, id))
+            # Validação de todos os ingredientes de uma vez
+            ids = {int(ref) for _, ref, _, _, _ in linhas if ref.isdigit()}
+            nomes = {ref.lower() for _, ref, _, _, _ in linhas if not ref.isdigit()}
+            por_id, por_nome = _buscar_ingredientes(cursor, ids, nomes)
             
-            # Registrar movimentação
-            cursor.execute('''
-                INSERT INTO movimentacoes_estoque
-                (ingrediente_id, tipo, quantidade, usuario_id, observacao)
-                VALUES (?, ?, ?, ?, ?)
-            ''', (
-                id,
-                tipo,
-                quantidade,
-                request.user['user_id'],
-                data.get('observacao', '')
-            ))
+            entradas = {}
+            movimentacoes = []
+            for resultado, referencia, quantidade, custo, observacao in linhas:
+                if referencia.isdigit():
+                    ingrediente = por_id.get(int(referencia))
+                    if ingrediente is not None and not ingrediente['ativo']:
+                        resultado.update({'status': 'erro', 'error': 'Ingrediente inativo'})
+                        continue
+                else:
+                    encontrados = por_nome.get(referencia.lower(), [])
+                    if len(encontrados) > 1:
+                        resultado.update({'status': 'erro', 'error': 'Nome de ingrediente ambíguo; informe o id'})
+                        continue
+                    ingrediente = encontrados[0] if encontrados else None
+                
+                if ingrediente is None:
+                    resultado.update({'status': 'erro', 'error': 'Ingrediente não encontrado'})
+                    continue
+                
+                ingrediente_id = ingrediente['id']
+                entradas[ingrediente_id] = entradas.get(ingrediente_id, 0) + quantidade
+                movimentacoes.append((ingrediente_id, 'entrada', quantidade, observacao, custo))
+                resultado.update({
+                    'status': 'ok',
+                    'ingrediente_id': ingrediente_id,
+                    'nome': ingrediente['nome'],
+                    'quantidade': quantidade
+                })
+            
+            if movimentacoes:
+                # Um UPDATE por ingrediente distinto, mais o livro, na mesma transação
+                movimentar_estoque(cursor, movimentacoes, request.user['user_id'])
+            
+            registradas = len(movimentacoes)
             
             return jsonify({
-                'message': 'Estoque atualizado com sucesso',
-                'estoque_anterior': estoque_atual,
-                'estoque_atual': novo_estoque
-            }), 200
+                'message': f'{registradas} de {len(resultados)} linhas registradas',
+                'registradas': registradas,
+                'ingredientes': len(entradas),
+                'itens': resultados
+            }), 201 if registradas else 400
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _listar_movimentacoes(ingrediente_id=None):
+    """Lista movimentações de estoque com filtros, paginadas por cursor (limit/after)
+
+    Mesmo contrato de GET /api/dashboard/vendas: da mais recente para a mais
+    antiga, próxima página no header X-Proximo-Cursor e streaming NDJSON com
+    `Accept: application/x-ndjson`.
+    """
+    ndjson = quer_ndjson(request)
+    try:
+        inicio, fim = intervalo_dias(request.args.get('data_inicio'), request.args.get('data_fim'))
+    except ValueError:
+        return jsonify({'error': 'Datas devem estar no formato YYYY-MM-DD'}), 400
+    
+    tipo = request.args.get('tipo')
+    if tipo and tipo not in ('entrada', 'saida'):
+        return jsonify({'error': 'Tipo deve ser entrada ou saida'}), 400
+    
+    try:
+        limite = ler_limite(request.args.get('limit'), padrao=None if ndjson else LIMITE_PADRAO)
+        after = request.args.get('after')
+        cursor_after = decodificar_cursor(after, 2) if after else None
+        usuario_id = request.args.get('usuario_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        query = '''
+            SELECT
+                m.*,
+                i.nome as ingrediente_nome,
+                i.unidade_medida,
+                u.nome as usuario_nome
+            FROM movimentacoes_estoque m
+            JOIN ingredientes i ON m.ingrediente_id = i.id
+            LEFT JOIN usuarios u ON m.usuario_id = u.id
+            WHERE 1=1
+        '''
+        params = []
+        
+        if ingrediente_id is not None:
+            query += ' AND m.ingrediente_id = ?'
+            params.append(ingrediente_id)
+        
+        if inicio:
+            query += ' AND m.data_movimentacao >= ?'
+            params.append(inicio)
+        
+        if fim:
+            query += ' AND m.data_movimentacao < ?'
+            params.append(fim)
+        
+        if tipo:
+            query += ' AND m.tipo = ?'
+            params.append(tipo)
+        
+        if usuario_id is not None:
+            query += ' AND m.usuario_id = ?'
+            params.append(usuario_id)
+        
+        # Keyset: continua após a última movimentação da página anterior
+        if cursor_after:
+            query += ' AND (m.data_movimentacao < ? OR (m.data_movimentacao = ? AND m.id < ?))'
+            params.extend([cursor_after[0], cursor_after[0], cursor_after[1]])
+        
+        # Ordem total (data_movimentacao, id), coberta por idx_movimentacoes_ingrediente_data
+        # (por ingrediente) ou idx_movimentacoes_data_id (livro completo)
+        query += ' ORDER BY m.data_movimentacao DESC, m.id DESC'
+        
+        if ndjson:
+            if limite:
+                query += ' LIMIT ?'
+                params.append(limite)
+            return resposta_ndjson(query, params)
+        
+        # Uma linha a mais indica se existe próxima página
+        query += ' LIMIT ?'
+        params.append(limite + 1)
+        
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            movimentacoes = [dict(row) for row in cursor.fetchall()]
+        
+        response = jsonify(movimentacoes[:limite])
+        if len(movimentacoes) > limite:
+            ultima = movimentacoes[limite - 1]
+            response.headers['X-Proximo-Cursor'] = codificar_cursor(ultima['data_movimentacao'], ultima['id'])
+        return response, 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ingredientes_bp.route('/movimentacoes', methods=['GET'])
+@token_required
+def list_movimentacoes():
+    """Livro de movimentações de todos os ingredientes (filtro opcional ingrediente_id)"""
+    return _listar_movimentacoes(request.args.get('ingrediente_id', type=int))
+
+@ingredientes_bp.route('/<int:id>/movimentacoes', methods=['GET'])
+@token_required
+def list_movimentacoes_ingrediente(id):
+    """Histórico de movimentações de um ingrediente"""
+    try:
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT id FROM ingredientes WHERE id = ?', (id,))
+            if not cursor.fetchone():
+                return jsonify({'error': 'Ingrediente não encontrado'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return _listar_movimentacoes(id)
+
+@ingredientes_bp.route('/estoque-em', methods=['GET'])
+@token_required
+def estoque_historico():
+    """Estoque dos ingredientes em uma data/hora passada (UTC)
+
+    `data` em YYYY-MM-DD (fechamento do dia) ou YYYY-MM-DD HH:MM:SS;
+    `ingrediente_id` opcional. Calculado a partir do snapshot diário mais
+    próximo e das movimentações desde então.
+    """
+    try:
+        fim = ler_momento(request.args.get('data'))
+        ingrediente_id = request.args.get('ingrediente_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        base, ingredientes = estoque_em(fim, ingrediente_id)
+        
+        if ingrediente_id is not None and not ingredientes:
+            return jsonify({'error': 'Ingrediente não encontrado nesta data'}), 404
+        
+        return jsonify({
+            'data': request.args['data'],
+            'base': base,
+            'ingredientes': ingredientes
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ingredientes_bp.route('/<int:id>/custos', methods=['GET'])
+@token_required
+def historico_custos(id):
+    """Custo médio ponderado de um ingrediente e seu histórico
+
+    Cada entrada com custo gera um registro com o novo custo médio; com
+    `data` (mesmo formato de /estoque-em) retorna também o custo vigente
+    naquele instante. Histórico paginado por cursor (limit/after), do mais
+    recente para o mais antigo. Com CUSTO_FIFO inclui as camadas abertas.
+    """
+    try:
+        momento = ler_momento(request.args['data']) if request.args.get('data') else None
+        limite = ler_limite(request.args.get('limit'))
+        after = request.args.get('after')
+        cursor_after = decodificar_cursor(after, 2) if after else None
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            
+            cursor.execute(f'''
+                SELECT id, nome, unidade_medida, estoque_atual, custo_unitario, custo_medio,
+                    {custo_efetivo_sql()} as custo_efetivo
+                FROM ingredientes WHERE id = ?
+            ''', (id,))
+            ingrediente = cursor.fetchone()
+            if not ingrediente:
+                return jsonify({'error': 'Ingrediente não encontrado'}), 404
+            resultado = dict(ingrediente)
+            
+            if momento:
+                # Uma busca no índice do histórico, sem reprocessar o livro
+                cursor.execute(f'SELECT {custo_em_sql()} AS custo FROM ingredientes i WHERE i.id = ?',
+                               (momento.strftime('%Y-%m-%d %H:%M:%S'), id))
+                resultado['custo_em'] = {'data': request.args['data'], 'custo_medio': cursor.fetchone()['custo']}
+            
+            query = '''
+                SELECT id, inicio, custo_medio, estoque, quantidade, custo_entrada
+                FROM custos_historico
+                WHERE ingrediente_id = ?
+            '''
+            params = [id]
+            if cursor_after:
+                query += ' AND (inicio < ? OR (inicio = ? AND id < ?))'
+                params.extend([cursor_after[0], cursor_after[0], cursor_after[1]])
+            query += ' ORDER BY inicio DESC, id DESC LIMIT ?'
+            params.append(limite + 1)
+            cursor.execute(query, params)
+            historico = [dict(row) for row in cursor.fetchall()]
+            resultado['historico'] = historico[:limite]
+            
+            if CUSTO_FIFO:
+                resultado['camadas'] = camadas_abertas(cursor, id)
+        
+        response = jsonify(resultado)
+        if len(historico) > limite:
+            ultimo = historico[limite - 1]
+            response.headers['X-Proximo-Cursor'] = codificar_cursor(str(ultimo['inicio']), ultimo['id'])
+        return response, 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ingredientes_bp.route('/previsao', methods=['GET'])
+@token_required
+def previsao_consumo():
+    """Previsão de consumo e dias até a ruptura de cada ingrediente ativo"""
+    if not previsao_disponivel():
+        return jsonify({'error': 'Previsões indisponíveis (numpy não instalado)'}), 501
+    
+    try:
+        horizonte = ler_horizonte(request.args.get('horizonte'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, nome, unidade_medida, estoque_atual, estoque_minimo
+                FROM ingredientes
+                WHERE ativo = 1
+            ''')
+            ingredientes = [dict(row) for row in cursor.fetchall()]
+        
+        previsoes, calculado_em = prever_consumo(ingredientes, horizonte)
+        # Rupturas mais próximas primeiro
+        previsoes.sort(key=lambda p: (p['dias_ate_ruptura'] is None, p['dias_ate_ruptura'] or 0, p['nome']))
+        
+        return jsonify({
+            'horizonte': horizonte,
+            'calculado_em': calculado_em,
+            'ingredientes': previsoes
+        }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ingredientes_bp.route('/<int:id>/previsao', methods=['GET'])
+@token_required
+def previsao_consumo_ingrediente(id):
+    """Previsão de consumo e dias até a ruptura de um ingrediente"""
+    if not previsao_disponivel():
+        return jsonify({'error': 'Previsões indisponíveis (numpy não instalado)'}), 501
+    
+    try:
+        horizonte = ler_horizonte(request.args.get('horizonte'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT id, nome, unidade_medida, estoque_atual, estoque_minimo
+                FROM ingredientes
+                WHERE id = ?
+            ''', (id,))
+            ingrediente = cursor.fetchone()
+        
+        if not ingrediente:
+            return jsonify({'error': 'Ingrediente não encontrado'}), 404
+        
+        previsoes, calculado_em = prever_consumo([dict(ingrediente)], horizonte)
+        
+        return jsonify({
+            'horizonte': horizonte,
+            'calculado_em': calculado_em,
+            **previsoes[0]
+        }), 200
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -235,13 +669,16 @@ def atualizar_estoque(id):
 def estoque_baixo():
     """Lista ingredientes com estoque abaixo do mínimo"""
     try:
-        with get_db() as conn:
+        with get_db(readonly=True) as conn:
             cursor = conn.cursor()
             
+            # Lê apenas o conjunto de alertas abertos, mantido pelas escritas de estoque
             cursor.execute('''
-                SELECT * FROM ingredientes
-                WHERE ativo = 1 AND estoque_atual <= estoque_minimo
-                ORDER BY estoque_atual ASC
+                SELECT i.*, a.inicio as alerta_desde
+                FROM alertas_estoque a
+                JOIN ingredientes i ON i.id = a.ingrediente_id
+                WHERE a.fim IS NULL
+                ORDER BY i.estoque_atual ASC
             ''')
             
             ingredientes = [dict(row) for row in cursor.fetchall()]
@@ -250,3 +687,67 @@ def estoque_baixo():
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+
+@ingredientes_bp.route('/alertas', methods=['GET'])
+@token_required
+def list_alertas():
+    """Histórico de alertas de estoque baixo (entrada e saída do mínimo)
+
+    Do mais recente para o mais antigo, paginado por cursor (limit/after):
+    quando há mais alertas, o header X-Proximo-Cursor traz o valor de
+    `after` para a próxima página.
+    """
+    try:
+        inicio, fim = intervalo_dias(request.args.get('data_inicio'), request.args.get('data_fim'))
+        limite = ler_limite(request.args.get('limit'))
+        after = request.args.get('after')
+        cursor_after = decodificar_cursor(after, 2) if after else None
+        ingrediente_id = request.args.get('ingrediente_id', type=int)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    try:
+        query = '''
+            SELECT a.*, i.nome as ingrediente_nome, i.unidade_medida
+            FROM alertas_estoque a
+            JOIN ingredientes i ON i.id = a.ingrediente_id
+            WHERE 1=1
+        '''
+        params = []
+        
+        if ingrediente_id is not None:
+            query += ' AND a.ingrediente_id = ?'
+            params.append(ingrediente_id)
+        
+        if inicio:
+            query += ' AND a.inicio >= ?'
+            params.append(inicio)
+        
+        if fim:
+            query += ' AND a.inicio < ?'
+            params.append(fim)
+        
+        if request.args.get('abertos') == 'true':
+            query += ' AND a.fim IS NULL'
+        
+        if cursor_after:
+            query += ' AND (a.inicio < ? OR (a.inicio = ? AND a.id < ?))'
+            params.extend([cursor_after[0], cursor_after[0], cursor_after[1]])
+        
+        # Uma linha a mais indica se há próxima página
+        query += ' ORDER BY a.inicio DESC, a.id DESC LIMIT ?'
+        params.append(limite + 1)
+        
+        with get_db(readonly=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute(query, params)
+            alertas = [dict(row) for row in cursor.fetchall()]
+        
+        response = jsonify(alertas[:limite])
+        if len(alertas) > limite:
+            ultimo = alertas[limite - 1]
+            response.headers['X-Proximo-Cursor'] = codificar_cursor(str(ultimo['inicio']), ultimo['id'])
+        return response, 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
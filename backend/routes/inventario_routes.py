@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from models.database import get_db
+from models.custos import custo_efetivo_sql
+from models.estoque import EstoqueInsuficiente, movimentar_estoque
 from utils.auth import token_required
+from utils.exportacao import ler_formato, resposta_exportacao
 from datetime import datetime
 
 inventario_bp = Blueprint('inventario', __name__)
@@ -128,7 +131,10 @@ def atualizar_inventario(id):
     if 'quantidade_fisica' not in data:
         return jsonify({'error': 'quantidade_fisica é obrigatória'}), 400
     
-    quantidade_fisica = float(data['quantidade_fisica'])
+    try:
+        quantidade_fisica = float(data['quantidade_fisica'])
+    except (TypeError, ValueError):
+        return jsonify({'error': 'quantidade_fisica inválida'}), 400
     
     try:
         with get_db() as conn:
@@ -151,57 +157,57 @@ def atualizar_inventario(id):
             quantidade_sistema = inventario['quantidade_sistema']
             diferenca = quantidade_fisica - quantidade_sistema
             
-            # Atualizar inventário
+            # Se houver diferença, perguntar se deve ajustar o estoque
+            ajustar_estoque = data.get('ajustar_estoque', False)
+            
+            # O estoque recebe só o que falta do ajuste: salvar de novo, ou
+            # corrigir uma contagem digitada errada, não repete a movimentação
+            ajuste_anterior = inventario['ajuste_aplicado'] or 0
+            ajuste = diferenca - ajuste_anterior if ajustar_estoque else 0
+            
+            # Atualizar inventário; o ajuste anterior na condição barra dois
+            # PUTs simultâneos aplicando o mesmo ajuste
             cursor.execute('''
                 UPDATE inventario
                 SET quantidade_fisica = ?,
                     diferenca = ?,
                     observacoes = ?,
+                    ajuste_aplicado = ?,
                     atualizado_em = CURRENT_TIMESTAMP
-                WHERE id = ?
+                WHERE id = ? AND ajuste_aplicado = ?
             ''', (
                 quantidade_fisica,
                 diferenca,
                 data.get('observacoes', inventario['observacoes']),
-                id
+                ajuste_anterior + ajuste,
+                id,
+                ajuste_anterior
             ))
+            if cursor.rowcount == 0:
+                return jsonify({'error': 'Inventário alterado por outra requisição; tente novamente'}), 409
             
-            # Se houver diferença, perguntar se deve ajustar o estoque
-            ajustar_estoque = data.get('ajustar_estoque', False)
-            
-            if ajustar_estoque and diferenca != 0:
-                # Atualizar estoque do ingrediente
-                cursor.execute('''
-                    UPDATE ingredientes
-                    SET estoque_atual = ?,
-                        atualizado_em = CURRENT_TIMESTAMP
-                    WHERE id = ?
-                ''', (quantidade_fisica, inventario['ingrediente_id']))
-                
-                # Registrar movimentação
-                tipo_mov = 'entrada' if diferenca > 0 else 'saida'
-                quantidade_mov = abs(diferenca)
-                
-                cursor.execute('''
-                    INSERT INTO movimentacoes_estoque
-                    (ingrediente_id, tipo, quantidade, usuario_id, observacao)
-                    VALUES (?, ?, ?, ?, ?)
-                ''', (
+            if ajuste != 0:
+                # Ajuste relativo: vendas feitas desde a contagem continuam valendo
+                tipo_mov = 'entrada' if ajuste > 0 else 'saida'
+                movimentar_estoque(cursor, [(
                     inventario['ingrediente_id'],
                     tipo_mov,
-                    quantidade_mov,
-                    request.user['user_id'],
-                    f'Ajuste de inventário - {data.get("observacoes", "")}'
-                ))
+                    abs(ajuste),
+                    f'Ajuste de inventário - {data.get("observacoes", "")}',
+                    None
+                )], request.user['user_id'])
             
             return jsonify({
                 'message': 'Inventário atualizado com sucesso',
                 'quantidade_sistema': quantidade_sistema,
                 'quantidade_fisica': quantidade_fisica,
                 'diferenca': diferenca,
-                'estoque_ajustado': ajustar_estoque
+                'estoque_ajustado': ajustar_estoque,
+                'ajuste_aplicado': ajuste
             }), 200
     
+    except EstoqueInsuficiente as e:
+        return jsonify({'error': 'Estoque insuficiente', 'itens': e.itens}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -256,13 +262,13 @@ def relatorio_inventario(data_inventario):
         with get_db() as conn:
             cursor = conn.cursor()
             
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT 
                     inv.*,
                     ing.nome as ingrediente_nome,
                     ing.unidade_medida,
-                    ing.custo_unitario,
-                    (inv.diferenca * ing.custo_unitario / 1000) as valor_diferenca
+                    {custo_efetivo_sql('ing')} as custo_unitario,
+                    (inv.diferenca * {custo_efetivo_sql('ing')} / 1000) as valor_diferenca
                 FROM inventario inv
                 JOIN ingredientes ing ON inv.ingrediente_id = ing.id
                 WHERE inv.data_inventario = ?
@@ -287,6 +293,45 @@ def relatorio_inventario(data_inventario):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@inventario_bp.route('/relatorio/<data_inventario>/export', methods=['GET'])
+@token_required
+def exportar_relatorio_inventario(data_inventario):
+    """Exporta o inventário de uma data em CSV ou XLSX"""
+    try:
+        formato = ler_formato(request.args.get('formato'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    query = f'''
+        SELECT 
+            inv.ingrediente_id,
+            ing.nome as ingrediente_nome,
+            ing.unidade_medida,
+            inv.quantidade_sistema,
+            inv.quantidade_fisica,
+            inv.diferenca,
+            {custo_efetivo_sql('ing')} as custo_unitario,
+            (inv.diferenca * {custo_efetivo_sql('ing')} / 1000) as valor_diferenca,
+            inv.observacoes
+        FROM inventario inv
+        JOIN ingredientes ing ON inv.ingrediente_id = ing.id
+        WHERE inv.data_inventario = ?
+        ORDER BY ABS(inv.diferenca) DESC
+    '''
+    colunas = [
+        ('ingrediente_id', 'Ingrediente'),
+        ('ingrediente_nome', 'Nome'),
+        ('unidade_medida', 'Unidade'),
+        ('quantidade_sistema', 'Quantidade no sistema'),
+        ('quantidade_fisica', 'Quantidade física'),
+        ('diferenca', 'Diferença'),
+        ('custo_unitario', 'Custo unitário'),
+        ('valor_diferenca', 'Valor da diferença'),
+        ('observacoes', 'Observações')
+    ]
+    return resposta_exportacao(query, (data_inventario,), colunas,
+                               f'inventario_{data_inventario}', formato)
+
 @inventario_bp.route('/reabrir/<data_inventario>', methods=['POST'])
 @token_required
 def reabrir_inventario(data_inventario):
@@ -0,0 +1,164 @@
+"""Benchmark das escritas com e sem o escritor serializado (group commit)
+
+Dispara escritores em paralelo (processos × threads) fazendo transações
+no formato de uma venda (INSERT em vendas e baixa de três ingredientes
+com movimentar_estoque), por um tempo fixo, em um banco SQLite
+temporário. Cada modo usa um banco novo. Mostra, por modo, as transações
+por segundo e a latência (p50, p99 e máxima) de cada transação.
+
+Uso (no diretório backend):
+
+    python scripts/benchmark_escritas.py [--processos 8] [--threads 4]
+        [--duracao 5] [--modos normal,serializado]
+"""
+import argparse
+import contextlib
+import io
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INGREDIENTES = 20
+ESTOQUE_INICIAL = 1e9
+MODOS = {'normal': 'false', 'serializado': 'true'}
+
+
+def _escritor(indice, fim, ids, latencias, erros):
+    from models.database import get_db
+    from models.estoque import movimentar_estoque
+
+    n = 0
+    while time.monotonic() < fim:
+        escolhidos = [ids[(indice + n + k) % len(ids)] for k in range(3)]
+        inicio = time.perf_counter()
+        try:
+            with get_db() as conn:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO vendas (ficha_tecnica_id, quantidade, valor_unitario, valor_total)
+                    VALUES (1, 1, 10, 10)
+                ''')
+                movimentar_estoque(cursor, [
+                    (ingrediente_id, 'saida', 0.1, 'benchmark', None) for ingrediente_id in escolhidos
+                ], None)
+        except Exception as e:
+            erros.append(str(e))
+            continue
+        latencias.append(time.perf_counter() - inicio)
+        n += 1
+
+
+def _processo(indice, threads, inicio, fim, ids, fila):
+    # Todos os processos começam juntos, depois de importados os módulos
+    from models import database, estoque  # noqa: F401
+    time.sleep(max(0, inicio - time.monotonic()))
+    latencias = []
+    erros = []
+    escritores = [
+        threading.Thread(target=_escritor, args=(indice * threads + i, fim, ids, latencias, erros))
+        for i in range(threads)
+    ]
+    for escritor in escritores:
+        escritor.start()
+    for escritor in escritores:
+        escritor.join()
+    fila.put((latencias, erros[:5], len(erros)))
+
+
+def _preparar(diretorio):
+    """Cria o banco do modo com uma ficha e os ingredientes; retorna os ids"""
+    from models.database import get_db
+    from models.estoque import movimentar_estoque
+    from models.migrations import aplicar_migracoes
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        aplicar_migracoes()
+    ids = []
+    with get_db(serializar=False) as conn:
+        cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO fichas_tecnicas (id, nome_prato, categoria, preco_venda)
+            VALUES (1, 'Prato', 'Teste', 10)
+        ''')
+        for i in range(INGREDIENTES):
+            cursor.execute('''
+                INSERT INTO ingredientes (nome, unidade_medida, custo_unitario, estoque_atual)
+                VALUES (?, 'kg', 1, 0)
+            ''', (f'Ingrediente {i}',))
+            ids.append(cursor.lastrowid)
+        movimentar_estoque(cursor, [(i, 'entrada', ESTOQUE_INICIAL, 'inicial', None) for i in ids], None)
+    return ids
+
+
+def _percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))] if valores else 0
+
+
+def _executar_modo(modo, args):
+    diretorio = tempfile.mkdtemp(prefix='silvess-benchmark-')
+    # Lidos pelos processos filhos ao importarem models.database
+    os.environ['DATABASE_PATH'] = os.path.join(diretorio, 'benchmark.db')
+    os.environ['DB_WRITE_SERIALIZATION'] = MODOS[modo]
+
+    contexto = multiprocessing.get_context('spawn')
+    # A preparação roda em um processo próprio: models.database lê o
+    # caminho do banco uma única vez, na importação
+    with contexto.Pool(1) as pool:
+        ids = pool.apply(_preparar, (diretorio,))
+
+    fila = contexto.Queue()
+    # Margem para os processos subirem antes de começar a contar
+    inicio = time.monotonic() + 2
+    fim = inicio + args.duracao
+    processos = [
+        contexto.Process(target=_processo, args=(p, args.threads, inicio, fim, ids, fila))
+        for p in range(args.processos)
+    ]
+    for processo in processos:
+        processo.start()
+    resultados = [fila.get() for _ in processos]
+    for processo in processos:
+        processo.join()
+    shutil.rmtree(diretorio, ignore_errors=True)
+
+    latencias = sorted(latencia for lat, _, _ in resultados for latencia in lat)
+    total_erros = sum(n for _, _, n in resultados)
+    print(f'{modo:>12}: {len(latencias) / args.duracao:8.0f} tx/s  '
+          f'p50 {_percentil(latencias, 0.50) * 1000:6.1f} ms  '
+          f'p99 {_percentil(latencias, 0.99) * 1000:6.1f} ms  '
+          f'máx {(latencias[-1] if latencias else 0) * 1000:6.1f} ms  '
+          f'erros {total_erros}')
+    for _, exemplos, _ in resultados:
+        for erro in exemplos:
+            print(f'              ✗ {erro}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processos', type=int, default=8)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--duracao', type=float, default=5, help='segundos por modo')
+    parser.add_argument('--modos', default='normal,serializado', help='normal, serializado ou ambos')
+    args = parser.parse_args()
+
+    os.environ.pop('DATABASE_URL', None)
+    # A instrumentação (contagem e log de consultas lentas) mediria a si mesma
+    os.environ['SQL_INSTRUMENTATION'] = 'false'
+    modos = [modo.strip() for modo in args.modos.split(',') if modo.strip()]
+    for modo in modos:
+        if modo not in MODOS:
+            parser.error(f'modo inválido: {modo}')
+
+    print(f'{args.processos} processos × {args.threads} threads, {args.duracao:g} s por modo')
+    for modo in modos:
+        _executar_modo(modo, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""Teste de concorrência das movimentações de estoque
+
+Dispara escritores em paralelo (processos × threads) chamando
+movimentar_estoque sobre poucos ingredientes, em um banco SQLite
+temporário, e confere no final que:
+
+- o livro fecha com o estoque (conferir_livro não retorna nada);
+- o estoque final de cada ingrediente é o inicial mais a soma exata das
+  movimentações aceitas (nenhuma atualização perdida);
+- nenhum estoque ficou negativo e cada movimentação aceita tem sua linha
+  no livro.
+
+Uso (no diretório backend):
+
+    python scripts/teste_concorrencia_estoque.py [--processos 4] [--threads 8]
+        [--operacoes 200] [--serializado]
+
+Sai com código 1 se alguma verificação falhar.
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INGREDIENTES = 4
+ESTOQUE_INICIAL = 50.0
+# Múltiplos de 1/4: somas exatas em ponto flutuante
+QUANTIDADES = (0.25, 0.5, 1.0, 2.5, 4.0)
+
+
+def _escritor(semente, operacoes, ids, aplicados, recusadas):
+    from models.database import get_db
+    from models.estoque import EstoqueInsuficiente, movimentar_estoque
+
+    rnd = random.Random(semente)
+    for _ in range(operacoes):
+        # Às vezes vários ingredientes na mesma transação, como em uma venda
+        escolhidos = rnd.sample(ids, rnd.randint(1, len(ids)))
+        movimentos = [
+            (ingrediente_id, rnd.choice(('entrada', 'saida', 'saida')), rnd.choice(QUANTIDADES), 'teste', None)
+            for ingrediente_id in escolhidos
+        ]
+        try:
+            with get_db() as conn:
+                movimentar_estoque(conn.cursor(), movimentos, None)
+        except EstoqueInsuficiente:
+            recusadas.append(1)
+            continue
+        aplicados.extend(movimentos)
+
+
+def _processo(semente, threads, operacoes, ids, fila):
+    aplicados = []
+    recusadas = []
+    escritores = [
+        threading.Thread(target=_escritor, args=(semente * 1000 + i, operacoes, ids, aplicados, recusadas))
+        for i in range(threads)
+    ]
+    for escritor in escritores:
+        escritor.start()
+    for escritor in escritores:
+        escritor.join()
+    fila.put((aplicados, len(recusadas)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--processos', type=int, default=4)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--operacoes', type=int, default=200, help='operações por thread')
+    parser.add_argument('--serializado', action='store_true', help='com DB_WRITE_SERIALIZATION=true')
+    args = parser.parse_args()
+
+    diretorio = tempfile.mkdtemp(prefix='silvess-concorrencia-')
+    # Herdado pelos processos filhos antes de importarem models.database
+    os.environ['DATABASE_PATH'] = os.path.join(diretorio, 'teste.db')
+    os.environ.pop('DATABASE_URL', None)
+    os.environ['DB_WRITE_SERIALIZATION'] = 'true' if args.serializado else 'false'
+
+    from models.database import get_db
+    from models.estoque import conferir_livro, movimentar_estoque
+    from models.migrations import aplicar_migracoes
+
+    aplicar_migracoes()
+    ids = []
+    with get_db(serializar=False) as conn:
+        cursor = conn.cursor()
+        for i in range(INGREDIENTES):
+            cursor.execute('''
+                INSERT INTO ingredientes (nome, unidade_medida, custo_unitario, estoque_atual)
+                VALUES (?, 'kg', 1, 0)
+            ''', (f'Ingrediente {i}',))
+            ids.append(cursor.lastrowid)
+        movimentar_estoque(cursor, [(i, 'entrada', ESTOQUE_INICIAL, 'inicial', None) for i in ids], None)
+
+    contexto = multiprocessing.get_context('spawn')
+    fila = contexto.Queue()
+    processos = [
+        contexto.Process(target=_processo, args=(p, args.threads, args.operacoes, ids, fila))
+        for p in range(args.processos)
+    ]
+    for processo in processos:
+        processo.start()
+    resultados = [fila.get() for _ in processos]
+    for processo in processos:
+        processo.join()
+
+    esperado = {i: ESTOQUE_INICIAL for i in ids}
+    aceitos = 0
+    recusados = 0
+    for aplicados, recusadas in resultados:
+        aceitos += len(aplicados)
+        recusados += recusadas
+        for ingrediente_id, tipo, quantidade, _, _ in aplicados:
+            esperado[ingrediente_id] += quantidade if tipo == 'entrada' else -quantidade
+
+    falhas = []
+    with get_db(readonly=True) as conn:
+        cursor = conn.cursor()
+        divergentes = conferir_livro(cursor)
+        if divergentes:
+            falhas.append(f'livro não fecha com o estoque: {divergentes}')
+
+        cursor.execute('SELECT id, estoque_atual FROM ingredientes')
+        for row in cursor.fetchall():
+            if row['estoque_atual'] != esperado[row['id']]:
+                falhas.append(f"ingrediente {row['id']}: estoque {row['estoque_atual']}, esperado {esperado[row['id']]}")
+            if row['estoque_atual'] < 0:
+                falhas.append(f"ingrediente {row['id']}: estoque negativo")
+
+        cursor.execute("SELECT COUNT(*) AS total FROM movimentacoes_estoque WHERE observacao = 'teste'")
+        linhas = cursor.fetchone()['total']
+        if linhas != aceitos:
+            falhas.append(f'{linhas} linhas no livro para {aceitos} movimentações aceitas')
+
+    print(f'{args.processos} processos × {args.threads} threads: '
+          f'{aceitos} movimentações aceitas, {recusados} transações recusadas por estoque insuficiente')
+    for falha in falhas:
+        print(f'✗ {falha}')
+    if falhas:
+        print(f'  banco mantido em {diretorio}')
+        sys.exit(1)
+    shutil.rmtree(diretorio, ignore_errors=True)
+    print('✓ Livro e estoque conferem')
+
+
+if __name__ == '__main__':
+    main()
@@ -7,6 +7,11 @@ from flask import request, jsonify
 
 SECRET_KEY = os.environ.get('JWT_SECRET', 'silvess-secret-key-change-in-production')
 
+# Validade (s) do token do stream SSE: vai na URL e pode ficar em logs de
+# acesso, então só serve para abrir a conexão
+SSE_TOKEN_TTL_S = int(os.environ.get('SSE_TOKEN_TTL_S', 60))
+ESCOPO_STREAM = 'stream'
+
 def hash_password(password):
     """Gera hash da senha usando bcrypt"""
     return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
@@ -25,6 +30,17 @@ def generate_token(user_id, email, perfil):
     }
     return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
 
+def generate_stream_token(user):
+    """Gera token curto, aceito apenas para abrir o stream SSE"""
+    payload = {
+        'user_id': user['user_id'],
+        'email': user['email'],
+        'perfil': user['perfil'],
+        'escopo': ESCOPO_STREAM,
+        'exp': datetime.utcnow() + timedelta(seconds=SSE_TOKEN_TTL_S)
+    }
+    return jwt.encode(payload, SECRET_KEY, algorithm='HS256')
+
 def decode_token(token):
     """Decodifica e valida token JWT"""
     try:
@@ -53,7 +69,7 @@ def token_required(f):
         
         # Decodificar token
         payload = decode_token(token)
-        if not payload:
+        if not payload or payload.get('escopo'):
             return jsonify({'error': 'Token inválido ou expirado'}), 401
         
         # Adicionar informações do usuário ao request
@@ -63,6 +79,29 @@ def token_required(f):
     
     return decorated
 
+def token_sse_required(f):
+    """Como token_required, aceitando também um token de stream em ?token=
+
+    O EventSource do navegador não permite enviar o header Authorization.
+    Na query string só vale o token curto de generate_stream_token, nunca
+    o de login.
+    """
+    protegida = token_required(f)
+    
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        if 'Authorization' in request.headers or not request.args.get('token'):
+            return protegida(*args, **kwargs)
+        
+        payload = decode_token(request.args['token'])
+        if not payload or payload.get('escopo') != ESCOPO_STREAM:
+            return jsonify({'error': 'Token inválido ou expirado'}), 401
+        
+        request.user = payload
+        return f(*args, **kwargs)
+    
+    return decorated
+
 def admin_required(f):
     """Decorator para proteger rotas que requerem perfil admin"""
     @wraps(f)
@@ -0,0 +1,104 @@
+import csv
+import io
+import tempfile
+from flask import Response, stream_with_context
+from models.database import get_db, cursor_em_lotes
+
+# Linhas lidas do banco por vez durante a exportação
+TAMANHO_LOTE_EXPORTACAO = 1000
+
+MIMETYPES = {
+    'csv': 'text/csv',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+}
+
+
+def ler_formato(valor):
+    """Valida o parâmetro `formato` (csv por padrão)"""
+    formato = (valor or 'csv').lower()
+    if formato not in MIMETYPES:
+        raise ValueError('Formato deve ser csv ou xlsx')
+    if formato == 'xlsx':
+        try:
+            import openpyxl  # noqa: F401
+        except ImportError:
+            raise ValueError('Exportação xlsx indisponível (openpyxl não instalado)')
+    return formato
+
+
+def _valor_csv(valor):
+    """Formata números com vírgula decimal, como o Excel em pt-BR espera"""
+    if valor is None:
+        return ''
+    if isinstance(valor, float):
+        return f'{valor:.6f}'.rstrip('0').rstrip('.').replace('.', ',')
+    return valor
+
+
+def _linhas(query, params):
+    """Itera os lotes de linhas da consulta, sem materializar o resultado"""
+    with get_db(readonly=True) as conn:
+        cursor = cursor_em_lotes(conn)
+        try:
+            cursor.execute(query, params)
+            while True:
+                lote = cursor.fetchmany(TAMANHO_LOTE_EXPORTACAO)
+                if not lote:
+                    break
+                yield lote
+        finally:
+            cursor.close()
+
+
+def _gerar_csv(query, params, colunas):
+    buffer = io.StringIO()
+    escritor = csv.writer(buffer, delimiter=';')
+
+    # BOM para o Excel reconhecer UTF-8 (acentos)
+    buffer.write('\ufeff')
+    escritor.writerow([titulo for _, titulo in colunas])
+    for lote in _linhas(query, params):
+        for row in lote:
+            escritor.writerow([_valor_csv(row[campo]) for campo, _ in colunas])
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+def _gerar_xlsx(query, params, colunas):
+    from openpyxl import Workbook
+
+    # write_only grava as linhas em disco à medida que são adicionadas
+    planilha = Workbook(write_only=True)
+    aba = planilha.create_sheet()
+    aba.append([titulo for _, titulo in colunas])
+    for lote in _linhas(query, params):
+        for row in lote:
+            aba.append([row[campo] for campo, _ in colunas])
+
+    with tempfile.TemporaryFile() as arquivo:
+        planilha.save(arquivo)
+        arquivo.seek(0)
+        while True:
+            bloco = arquivo.read(64 * 1024)
+            if not bloco:
+                break
+            yield bloco
+
+
+def resposta_exportacao(query, params, colunas, nome_arquivo, formato='csv'):
+    """Resposta que exporta o resultado da consulta como CSV ou XLSX
+
+    `colunas` é uma lista de (campo da consulta, título da coluna). O CSV é
+    gerado lote a lote a partir do cursor; o XLSX é montado em arquivo
+    temporário. Em nenhum dos casos o resultado inteiro fica em memória.
+    """
+    if formato == 'xlsx':
+        corpo = _gerar_xlsx(query, params, colunas)
+    else:
+        corpo = _gerar_csv(query, params, colunas)
+
+    response = Response(stream_with_context(corpo), mimetype=MIMETYPES[formato])
+    response.headers['Content-Disposition'] = f'attachment; filename="{nome_arquivo}.{formato}"'
+    return response
@@ -0,0 +1,120 @@
+import csv
+import io
+import json
+import re
+from utils.paginacao import MIMETYPE_NDJSON
+
+# Linhas aceitas em uma única importação
+IMPORTACAO_MAX_LINHAS = 5000
+
+# Nomes aceitos no cabeçalho do CSV para cada campo
+CABECALHOS = {
+    'ingrediente': ('ingrediente', 'ingrediente_id', 'id', 'nome'),
+    'quantidade': ('quantidade', 'qtd', 'qtde'),
+    'custo': ('custo', 'custo_unitario', 'preco', 'valor_unitario'),
+    'observacao': ('observacao', 'obs', 'documento', 'nota')
+}
+
+# Vírgula decimal com ponto de milhar opcional: 1234,5 ou 1.234,56
+NUMERO_PT_BR = re.compile(r'^[+-]?(\d+|\d{1,3}(\.\d{3})+),\d+$')
+# Um único ponto seguido de três dígitos: 1.500 pode ser 1,5 ou 1500
+MILHAR_AMBIGUO = re.compile(r'^[+-]?[1-9]\d{0,2}\.\d{3}$')
+
+
+def ler_numero(valor):
+    """Converte número em texto ou JSON (ValueError se inválido ou ambíguo)
+
+    Aceita ponto decimal (1234.56) e o formato pt-BR, com vírgula decimal e
+    ponto de milhar opcional (1.234,56). Formatos mistos ou ambíguos, como
+    1,234.56, 1,234,567 e 1.500, são recusados em vez de adivinhados.
+    """
+    if isinstance(valor, bool):
+        raise ValueError('Número inválido')
+    if isinstance(valor, (int, float)):
+        return float(valor)
+    texto = str(valor or '').strip()
+    if ',' in texto:
+        if not NUMERO_PT_BR.match(texto):
+            raise ValueError(f'Número inválido: {texto} (use 1234,56, 1.234,56 ou 1234.56)')
+        # 1.234,56 -> 1234.56
+        texto = texto.replace('.', '').replace(',', '.')
+    elif MILHAR_AMBIGUO.match(texto):
+        raise ValueError(f'Número ambíguo: {texto} (use 1500 ou 1,5)')
+    return float(texto)
+
+
+def _campos_csv(cabecalho):
+    """Posição de cada campo conhecido no cabeçalho do CSV"""
+    nomes = [nome.strip().lower() for nome in cabecalho]
+    posicoes = {}
+    for campo, aceitos in CABECALHOS.items():
+        for aceito in aceitos:
+            if aceito in nomes:
+                posicoes[campo] = nomes.index(aceito)
+                break
+    if 'ingrediente' not in posicoes or 'quantidade' not in posicoes:
+        raise ValueError('O CSV deve ter as colunas ingrediente e quantidade')
+    return posicoes
+
+
+def _linhas_csv(arquivo):
+    texto = io.TextIOWrapper(arquivo, encoding='utf-8-sig', newline='')
+    primeira = texto.readline()
+    if not primeira.strip():
+        return
+    # Excel em pt-BR exporta com ponto e vírgula
+    delimitador = ';' if primeira.count(';') > primeira.count(',') else ','
+    posicoes = _campos_csv(next(csv.reader([primeira], delimiter=delimitador)))
+
+    for numero, valores in enumerate(csv.reader(texto, delimiter=delimitador), start=1):
+        if not any(v.strip() for v in valores):
+            continue
+        yield numero, {
+            campo: valores[pos].strip() if pos < len(valores) else ''
+            for campo, pos in posicoes.items()
+        }
+
+
+def _linhas_ndjson(arquivo):
+    for numero, linha in enumerate(arquivo, start=1):
+        linha = linha.strip()
+        if not linha:
+            continue
+        try:
+            item = json.loads(linha)
+        except ValueError:
+            item = None
+        yield numero, item if isinstance(item, dict) else {'_erro': 'JSON inválido'}
+
+
+def ler_linhas_importacao(request):
+    """Itera (número da linha, dict) do corpo da requisição, sem carregá-lo inteiro
+
+    Aceita CSV (corpo text/csv ou arquivo `arquivo` em multipart), NDJSON
+    (um objeto por linha) ou JSON com uma lista / {"itens": [...]}. CSV e
+    NDJSON são lidos linha a linha do stream da requisição. ValueError se o
+    formato for inválido ou o limite de IMPORTACAO_MAX_LINHAS for excedido.
+    """
+    tipo = request.mimetype
+    if 'arquivo' in request.files:
+        linhas = _linhas_csv(request.files['arquivo'].stream)
+    elif tipo in ('text/csv', 'text/plain', 'application/csv'):
+        linhas = _linhas_csv(request.stream)
+    elif tipo == MIMETYPE_NDJSON:
+        linhas = _linhas_ndjson(request.stream)
+    elif tipo == 'application/json':
+        data = request.get_json(silent=True)
+        itens = data.get('itens') if isinstance(data, dict) else data
+        if not isinstance(itens, list):
+            raise ValueError('Informe uma lista de itens')
+        linhas = (
+            (numero, item if isinstance(item, dict) else {'_erro': 'Item inválido'})
+            for numero, item in enumerate(itens, start=1)
+        )
+    else:
+        raise ValueError('Envie CSV, NDJSON ou JSON')
+
+    for contagem, (numero, item) in enumerate(linhas, start=1):
+        if contagem > IMPORTACAO_MAX_LINHAS:
+            raise ValueError(f'Importação limitada a {IMPORTACAO_MAX_LINHAS} linhas')
+        yield numero, item
@@ -0,0 +1,73 @@
+import base64
+import json
+from flask import Response, stream_with_context
+from models.database import get_db, cursor_em_lotes
+
+# Limites da paginação por cursor (keyset)
+LIMITE_PADRAO = 100
+LIMITE_MAXIMO = 1000
+
+# Linhas lidas do banco por vez no modo streaming
+TAMANHO_LOTE_STREAM = 500
+
+MIMETYPE_NDJSON = 'application/x-ndjson'
+
+
+def ler_limite(valor, padrao=LIMITE_PADRAO, maximo=LIMITE_MAXIMO):
+    """Converte o parâmetro `limit`; ValueError se não for inteiro entre 1 e `maximo`"""
+    if valor in (None, ''):
+        return padrao
+    limite = int(valor)
+    if limite < 1 or limite > maximo:
+        raise ValueError(f'limit deve estar entre 1 e {maximo}')
+    return limite
+
+
+def codificar_cursor(*valores):
+    """Gera o token opaco do parâmetro `after` a partir da chave da última linha"""
+    texto = json.dumps(list(valores), separators=(',', ':'), default=str)
+    return base64.urlsafe_b64encode(texto.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token, campos):
+    """Lê o token de `after`; retorna a lista com `campos` valores (ValueError se inválido)"""
+    try:
+        texto = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+        valores = json.loads(texto)
+    except Exception:
+        raise ValueError('Cursor inválido')
+    if not isinstance(valores, list) or len(valores) != campos:
+        raise ValueError('Cursor inválido')
+    return valores
+
+
+def quer_ndjson(request):
+    """Indica se o cliente pediu streaming NDJSON no header Accept"""
+    melhor = request.accept_mimetypes.best_match(['application/json', MIMETYPE_NDJSON])
+    return melhor == MIMETYPE_NDJSON
+
+
+def _linhas_ndjson(query, params):
+    with get_db(readonly=True) as conn:
+        cursor = cursor_em_lotes(conn)
+        try:
+            cursor.execute(query, params)
+            while True:
+                linhas = cursor.fetchmany(TAMANHO_LOTE_STREAM)
+                if not linhas:
+                    break
+                yield ''.join(
+                    json.dumps(dict(row), ensure_ascii=False, default=str) + '\n'
+                    for row in linhas
+                )
+        finally:
+            cursor.close()
+
+
+def resposta_ndjson(query, params):
+    """Resposta que envia o resultado da consulta como NDJSON, lote a lote
+
+    A conexão fica aberta enquanto o corpo é enviado; a memória usada não
+    depende do tamanho do resultado.
+    """
+    return Response(stream_with_context(_linhas_ndjson(query, params)), mimetype=MIMETYPE_NDJSON)
@@ -0,0 +1,27 @@
+from datetime import datetime, timedelta
+
+FORMATO_DATA = '%Y-%m-%d'
+
+
+def parse_data(valor):
+    """Converte 'YYYY-MM-DD' em date (ValueError se inválida)"""
+    return datetime.strptime(valor, FORMATO_DATA).date()
+
+
+def intervalo_dias(data_inicio=None, data_fim=None):
+    """Converte um período de dias inclusivo em um intervalo semiaberto
+
+    Retorna (inicio, fim_exclusivo) como strings 'YYYY-MM-DD' (ou None),
+    para filtrar `coluna >= inicio AND coluna < fim_exclusivo` direto sobre
+    o timestamp. Sem funções sobre a coluna, o índice pode ser usado.
+    """
+    inicio = parse_data(data_inicio).strftime(FORMATO_DATA) if data_inicio else None
+    fim_exclusivo = None
+    if data_fim:
+        fim_exclusivo = (parse_data(data_fim) + timedelta(days=1)).strftime(FORMATO_DATA)
+    return inicio, fim_exclusivo
+
+
+def agora_timestamp():
+    """Timestamp UTC no mesmo formato do CURRENT_TIMESTAMP do SQLite"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
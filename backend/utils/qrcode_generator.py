@@ -1,4 +1,3 @@
-import qrcode
 import os
 from io import BytesIO
 import base64
@@ -14,6 +13,9 @@ def generate_qrcode(data, save_path=None):
     Returns:
         String base64 da imagem ou caminho do arquivo salvo
     """
+    # Import tardio: qrcode/PIL só são carregados quando um QR code é gerado
+    import qrcode
+
     qr = qrcode.QRCode(
         version=1,
         error_correction=qrcode.constants.ERROR_CORRECT_L,
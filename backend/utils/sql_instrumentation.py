@@ -0,0 +1,184 @@
+import json
+import logging
+import os
+import time
+from flask import g, has_request_context, request
+
+# Configurações de instrumentação
+SQL_INSTRUMENTATION = os.environ.get('SQL_INSTRUMENTATION', 'True').lower() == 'true'
+SQL_SLOW_MS = float(os.environ.get('SQL_SLOW_MS', 100))
+SQL_EXPLAIN_SLOW = os.environ.get('SQL_EXPLAIN_SLOW', 'False').lower() == 'true'
+
+slow_query_logger = logging.getLogger('silvess.sql.slow')
+
+
+def _normalizar_sql(sql):
+    """Compacta espaços para o SQL caber em uma linha de log"""
+    return ' '.join(sql.split())
+
+
+def _metricas_da_requisicao():
+    """Retorna o acumulador de métricas SQL da requisição atual (ou None)"""
+    if not has_request_context():
+        return None
+    metricas = g.get('_sql_metricas')
+    if metricas is None:
+        metricas = {'queries': 0, 'tempo_ms': 0.0, 'mais_lenta_ms': 0.0, 'mais_lenta_sql': None}
+        g._sql_metricas = metricas
+    return metricas
+
+
+class InstrumentedCursor:
+    """Cursor que mede o tempo de cada comando SQL da requisição"""
+
+    def __init__(self, cursor, conn, dialect):
+        self._cursor = cursor
+        self._conn = conn
+        self._dialect = dialect
+        self._sql = None
+        self._params = ()
+        self._tempo_ms = 0.0
+
+    def _iniciar(self, sql, params):
+        self._finalizar()
+        self._sql = sql
+        self._params = params
+        self._tempo_ms = 0.0
+
+    def _medir(self, func, *args):
+        inicio = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._tempo_ms += (time.perf_counter() - inicio) * 1000
+
+    def _finalizar(self):
+        """Contabiliza o comando anterior (execução + leitura das linhas)"""
+        if self._sql is None:
+            return
+        sql, params, tempo_ms = self._sql, self._params, self._tempo_ms
+        self._sql = None
+
+        metricas = _metricas_da_requisicao()
+        if metricas is not None:
+            metricas['queries'] += 1
+            metricas['tempo_ms'] += tempo_ms
+            if tempo_ms > metricas['mais_lenta_ms']:
+                metricas['mais_lenta_ms'] = tempo_ms
+                metricas['mais_lenta_sql'] = _normalizar_sql(sql)
+
+        if tempo_ms >= SQL_SLOW_MS:
+            self._registrar_lenta(sql, params, tempo_ms)
+
+    def _registrar_lenta(self, sql, params, tempo_ms):
+        registro = {
+            'evento': 'slow_query',
+            'tempo_ms': round(tempo_ms, 3),
+            'sql': _normalizar_sql(sql),
+            'parametros': len(params) if params else 0
+        }
+        if has_request_context():
+            registro['metodo'] = request.method
+            registro['rota'] = request.path
+        if SQL_EXPLAIN_SLOW:
+            registro['plano'] = self._explicar(sql, params)
+        slow_query_logger.warning(json.dumps(registro, ensure_ascii=False, default=str))
+
+    def _explicar(self, sql, params):
+        prefixo = 'EXPLAIN ' if self._dialect == 'postgres' else 'EXPLAIN QUERY PLAN '
+        try:
+            linhas = self._conn.execute(prefixo + sql, params or ()).fetchall()
+            return [' | '.join(str(valor) for valor in linha) for linha in linhas]
+        except Exception as e:
+            return [f'indisponível: {e}']
+
+    def execute(self, sql, params=()):
+        self._iniciar(sql, params)
+        self._medir(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq_params):
+        self._iniciar(sql, ())
+        self._medir(self._cursor.executemany, sql, seq_params)
+        return self
+
+    def fetchone(self):
+        return self._medir(self._cursor.fetchone)
+
+    def fetchall(self):
+        linhas = self._medir(self._cursor.fetchall)
+        self._finalizar()
+        return linhas
+
+    def fetchmany(self, *args):
+        return self._medir(self._cursor.fetchmany, *args)
+
+    def __iter__(self):
+        while True:
+            linha = self.fetchone()
+            if linha is None:
+                self._finalizar()
+                return
+            yield linha
+
+    def close(self):
+        self._finalizar()
+        self._cursor.close()
+
+    def __getattr__(self, nome):
+        # lastrowid, rowcount, description...
+        return getattr(self._cursor, nome)
+
+
+class InstrumentedConnection:
+    """Conexão cujos cursores são instrumentados"""
+
+    def __init__(self, conn, dialect):
+        self._conn = conn
+        self._dialect = dialect
+        self._cursores = []
+
+    def cursor(self, *args, **kwargs):
+        cursor = InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._conn, self._dialect)
+        self._cursores.append(cursor)
+        return cursor
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def finalizar(self):
+        """Contabiliza os comandos ainda pendentes nos cursores abertos"""
+        for cursor in self._cursores:
+            cursor._finalizar()
+        self._cursores = []
+
+    def __getattr__(self, nome):
+        # commit, rollback, in_transaction...
+        return getattr(self._conn, nome)
+
+
+def instrumentar(conn, dialect):
+    """Envolve a conexão na camada de instrumentação, se habilitada"""
+    if not SQL_INSTRUMENTATION:
+        return conn
+    return InstrumentedConnection(conn, dialect)
+
+
+def registrar_instrumentacao(app):
+    """Adiciona o header Server-Timing com as métricas SQL de cada requisição"""
+
+    @app.after_request
+    def _server_timing(response):
+        metricas = g.get('_sql_metricas')
+        if metricas and metricas['queries']:
+            response.headers.add(
+                'Server-Timing',
+                f'db;dur={metricas["tempo_ms"]:.2f};desc="{metricas["queries"]} queries"'
+            )
+            response.headers.add(
+                'Server-Timing',
+                f'db-slowest;dur={metricas["mais_lenta_ms"]:.2f}'
+            )
+        return response
+
+    return app
@@ -158,7 +158,15 @@ const DashboardService = {
     registrarVenda: (data) => api.post('/dashboard/vendas', data),
     getRelatorioVendas: (data_inicio, data_fim) => 
         api.get('/dashboard/relatorio/vendas', { data_inicio, data_fim }),
-    getRelatorioEstoque: () => api.get('/dashboard/relatorio/estoque')
+    getRelatorioEstoque: () => api.get('/dashboard/relatorio/estoque'),
+    // EventSource não envia headers: vai na query string um token curto,
+    // válido só para abrir o stream, e o último evento recebido
+    stream: async (ultimoId = null) => {
+        const { token } = await api.post('/dashboard/stream/token');
+        const params = new URLSearchParams({ token });
+        if (ultimoId) params.set('ultimo_id', ultimoId);
+        return new EventSource(`${API_BASE_URL}/dashboard/stream?${params}`);
+    }
 };
 
 // ========== UTILITÁRIOS ==========
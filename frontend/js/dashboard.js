@@ -30,6 +30,7 @@ document.addEventListener('DOMContentLoaded', () => {
     loadUserInfo();
     loadStats();
     setupEventListeners();
+    conectarStream();
 });
 
 // ========== INFORMAÇÕES DO USUÁRIO ==========
@@ -46,6 +47,7 @@ function loadUserInfo() {
 async function loadStats() {
     try {
         const stats = await API.Dashboard.getStats();
+        statsAtuais = stats;
         
         statIngredientes.textContent = stats.ingredientes.total;
         statEstoqueBaixo.textContent = stats.ingredientes.estoque_baixo;
@@ -59,6 +61,62 @@ async function loadStats() {
     }
 }
 
+// ========== ATUALIZAÇÕES EM TEMPO REAL (SSE) ==========
+let statsAtuais = null;
+let ultimoEventoId = null;
+
+async function conectarStream() {
+    if (!window.EventSource) return;
+    let stream;
+    try {
+        stream = await API.Dashboard.stream(ultimoEventoId);
+    } catch (error) {
+        setTimeout(conectarStream, 10000);
+        return;
+    }
+
+    // O token do stream expira logo: a reconexão automática do EventSource
+    // seria recusada, então reconecta com um token novo
+    stream.onerror = () => {
+        stream.close();
+        setTimeout(conectarStream, 3000);
+    };
+    const registrarId = (event) => {
+        if (event.lastEventId) ultimoEventoId = event.lastEventId;
+    };
+    ['venda', 'estoque', 'estoque_baixo', 'recarregar'].forEach(tipo =>
+        stream.addEventListener(tipo, registrarId)
+    );
+
+    // Novas vendas: soma direto nos totais do dia
+    stream.addEventListener('venda', (event) => {
+        if (!statsAtuais) return;
+        const hoje = new Date().toISOString().slice(0, 10);
+        JSON.parse(event.data).vendas
+            .filter(venda => String(venda.data_venda).slice(0, 10) === hoje)
+            .forEach(venda => {
+                statsAtuais.vendas_hoje.total += 1;
+                statsAtuais.vendas_hoje.valor_total += venda.valor_total;
+            });
+        statVendasHoje.textContent = Utils.formatCurrency(statsAtuais.vendas_hoje.valor_total);
+        statVendasHojeQtd.textContent = `${statsAtuais.vendas_hoje.total} vendas`;
+    });
+
+    // Ingrediente entrou ou saiu do estoque baixo
+    stream.addEventListener('estoque_baixo', (event) => {
+        if (!statsAtuais) return;
+        const item = JSON.parse(event.data);
+        statsAtuais.ingredientes.estoque_baixo += item.baixo ? 1 : -1;
+        statEstoqueBaixo.textContent = statsAtuais.ingredientes.estoque_baixo;
+        if (item.baixo) {
+            Utils.showAlert(`Estoque baixo: ${item.nome}`, 'warning');
+        }
+    });
+
+    // Eventos perdidos durante a desconexão: recarrega os totais
+    stream.addEventListener('recarregar', () => loadStats());
+}
+
 // ========== EVENT LISTENERS ==========
 function setupEventListeners() {
     // Mobile toggle